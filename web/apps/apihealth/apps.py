@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class ApihealthConfig(AppConfig):
     name = 'apps.apihealth'
+
+    def ready(self):
+        from apps.apihealth.db import check_connections
+        from celery.signals import task_prerun
+        from django.core.signals import request_started
+
+        # After Django's and Celery's own closing of obsolete connections.
+        request_started.connect(check_connections)
+        task_prerun.connect(check_connections)
@@ -0,0 +1,127 @@
+"""Database connection health and pool metrics.
+
+Persistent connections (`CONN_MAX_AGE`) outlive a request or a task, so a
+database or PgBouncer restart leaves them broken. Django 3.0 only finds
+out when a query fails, `check_connections` pings them when a request or
+task starts instead, as `CONN_HEALTH_CHECKS` does from Django 4.1.
+"""
+
+import time
+from typing import List, Optional
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+CONNECTION_STATS_SQL = """
+SELECT count(*),
+       count(*) FILTER (WHERE state = 'active'),
+       count(*) FILTER (WHERE state = 'idle'),
+       count(*) FILTER (
+           WHERE state IN ('idle in transaction', 'idle in transaction (aborted)')
+       ),
+       current_setting('max_connections')::int
+FROM pg_stat_activity
+WHERE datname = current_database()
+"""
+
+
+def check_connections(**kwargs) -> None:
+    """Close persistent connections that no longer work.
+
+    Connected to the request and Celery task start signals, the next query
+    then reconnects rather than fails.
+    """
+    for conn in connections.all():
+        if (
+            conn.connection is not None
+            and conn.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not conn.is_usable()
+        ):
+            conn.close()
+
+
+def pooler_pools(dsn: str, password: Optional[str] = None) -> List[dict]:
+    """`SHOW POOLS` of the PgBouncer admin console.
+
+    Args:
+        dsn(str): libpq connection string of the `pgbouncer` database.
+        password(str): Password used when the connection string has none.
+    Returns:
+        One dict per pool with its client and server connection counts.
+    """
+    params = {
+        "connect_timeout": settings.DB_HEALTH_TIMEOUT_SECONDS,
+        "password": password,
+        **parse_dsn(dsn),
+    }
+    conn = psycopg2.connect(**params)
+    try:
+        # The admin console only takes simple queries, no transactions.
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SHOW POOLS")
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def database_health(alias: str = "default") -> dict:
+    """Reachability, latency and connection counts of a database.
+
+    Args:
+        alias(str): Database alias.
+    Returns:
+        Dict with `healthy` and, when it is, the ping latency, the server
+        connections to the database by state, the connection settings of
+        this process and the PgBouncer pools when `DB_POOLER_ADMIN_DSN` is
+        set, read with the database password unless the DSN has one.
+    """
+    conn = connections[alias]
+    health = {
+        "database": alias,
+        "conn_max_age": conn.settings_dict["CONN_MAX_AGE"],
+        "health_checks": bool(conn.settings_dict.get("CONN_HEALTH_CHECKS")),
+        "server_side_cursors": not conn.settings_dict.get(
+            "DISABLE_SERVER_SIDE_CURSORS"
+        ),
+    }
+    try:
+        start = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            ping_ms = (time.perf_counter() - start) * 1000
+            cursor.execute(CONNECTION_STATS_SQL)
+            (
+                total,
+                active,
+                idle,
+                idle_in_transaction,
+                max_connections,
+            ) = cursor.fetchone()
+    except DatabaseError as e:
+        return {**health, "healthy": False, "error": str(e)}
+    pools: Optional[List[dict]] = None
+    if settings.DB_POOLER_ADMIN_DSN:
+        try:
+            pools = pooler_pools(
+                settings.DB_POOLER_ADMIN_DSN, conn.settings_dict["PASSWORD"] or None
+            )
+        except psycopg2.Error as e:
+            settings.LOGGER.error(f"Failed reading the PgBouncer pools: {e!r}")
+    return {
+        **health,
+        "healthy": True,
+        "ping_ms": round(ping_ms, 2),
+        "connections": {
+            "total": total,
+            "active": active,
+            "idle": idle,
+            "idle_in_transaction": idle_in_transaction,
+            "max": max_connections,
+            "utilization": round(total / max_connections, 4),
+        },
+        "pooler_pools": pools,
+    }
@@ -1,3 +1,117 @@
-from django.test import TestCase
+"""Tests for the api health module."""
 
-# Create your tests here.
+from unittest import mock
+
+import psycopg2
+from apps.apihealth import db
+from celery.signals import task_prerun
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+
+class DatabaseHealthTest(TestCase):
+    """Database health check and connection pool metrics."""
+
+    client_class = APIClient
+
+    def _get(self):
+        return self.client.get(reverse("database-health"), {"format": "json"})
+
+    def _login_staff(self):
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("ops", is_staff=True)
+        )
+
+    def test_healthy(self):
+        self._login_staff()
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        health = response.json()
+        self.assertTrue(health["healthy"])
+        self.assertGreaterEqual(health["connections"]["total"], 1)
+        self.assertGreater(health["connections"]["max"], 0)
+        self.assertIsNone(health["pooler_pools"])
+
+    def test_anonymous_gets_status_only(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"healthy": True})
+
+    def test_unreachable(self):
+        with mock.patch.object(
+            connection, "cursor", side_effect=OperationalError("refused")
+        ):
+            response = self._get()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"healthy": False})
+        self._login_staff()
+        with mock.patch.object(
+            connection, "cursor", side_effect=OperationalError("refused")
+        ):
+            response = self._get()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["error"], "refused")
+
+    @override_settings(DB_POOLER_ADMIN_DSN="host=pgbouncer dbname=pgbouncer")
+    def test_pooler_pools(self):
+        pooler = mock.MagicMock()
+        cursor = pooler.cursor.return_value.__enter__.return_value
+        cursor.description = [("database",), ("cl_active",), ("cl_waiting",)]
+        cursor.fetchall.return_value = [("postgres", 12, 0)]
+        with mock.patch.object(psycopg2, "connect", return_value=pooler) as connect:
+            health = db.database_health()
+        self.assertEqual(
+            connect.call_args[1],
+            {
+                "host": "pgbouncer",
+                "dbname": "pgbouncer",
+                "password": connection.settings_dict["PASSWORD"] or None,
+                "connect_timeout": db.settings.DB_HEALTH_TIMEOUT_SECONDS,
+            },
+        )
+        self.assertEqual(
+            health["pooler_pools"],
+            [{"database": "postgres", "cl_active": 12, "cl_waiting": 0}],
+        )
+        cursor.execute.assert_called_with("SHOW POOLS")
+        pooler.close.assert_called_once()
+        # An unreachable pooler leaves the database healthy.
+        with mock.patch.object(
+            psycopg2, "connect", side_effect=psycopg2.OperationalError
+        ), self.assertLogs(db.settings.LOGGER, "ERROR"):
+            health = db.database_health()
+        self.assertTrue(health["healthy"])
+        self.assertIsNone(health["pooler_pools"])
+
+
+class CheckConnectionsTest(TestCase):
+    """Closing of broken persistent connections."""
+
+    def _connection(self, usable, health_checks=True, connected=True):
+        conn = mock.Mock(connection=object() if connected else None)
+        conn.settings_dict = {"CONN_HEALTH_CHECKS": health_checks}
+        conn.is_usable.return_value = usable
+        return conn
+
+    def test_closes_unusable(self):
+        conns = [
+            self._connection(usable=False),
+            self._connection(usable=True),
+            self._connection(usable=False, health_checks=False),
+            self._connection(usable=False, connected=False),
+        ]
+        with mock.patch.object(db.connections, "all", return_value=conns):
+            db.check_connections()
+        self.assertEqual([conn.close.called for conn in conns], [1, 0, 0, 0])
+        conns[3].is_usable.assert_not_called()
+
+    def test_request_and_task_start(self):
+        conn = self._connection(usable=False)
+        with mock.patch.object(db.connections, "all", return_value=[conn]):
+            request_started.send(sender=None)
+            task_prerun.send(sender=None)
+        self.assertEqual(conn.close.call_count, 2)
@@ -4,4 +4,9 @@ from apps.apihealth import views
 
 urlpatterns = [
     path("", view=views.ApiHealthViewSet.as_view({"get": "retrieve"}), name="index"),
+    path(
+        "db/",
+        view=views.DatabaseHealthViewSet.as_view({"get": "retrieve"}),
+        name="database-health",
+    ),
 ]
@@ -1,9 +1,10 @@
 from django.contrib.auth import get_user_model
-from rest_framework import permissions
+from rest_framework import permissions, status
 from rest_framework import viewsets
 from rest_framework.decorators import permission_classes
 from rest_framework.response import Response
 
+from apps.apihealth.db import database_health
 from apps.apihealth.serializer import ApiHealthSerializer
 
 
@@ -16,3 +17,23 @@ class ApiHealthViewSet(viewsets.ViewSet):
 
     def retrieve(self, _request):
         return Response(ApiHealthSerializer().data)
+
+
+@permission_classes((permissions.AllowAny,))
+class DatabaseHealthViewSet(viewsets.ViewSet):
+    """Database health check, 503 when the database is unreachable.
+
+    Staff users also get the connection and pool metrics, others only
+    whether the database is healthy.
+    """
+
+    def retrieve(self, request):
+        health = database_health()
+        if not request.user.is_staff:
+            health = {"healthy": health["healthy"]}
+        return Response(
+            health,
+            status=status.HTTP_200_OK
+            if health["healthy"]
+            else status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
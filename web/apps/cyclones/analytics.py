@@ -0,0 +1,187 @@
+"""Vectorized track analytics of cyclones.
+
+Historic snapshots of any number of cyclones are loaded with one query
+into NumPy arrays ordered by cyclone and synoptic time. Great circle
+distances, bearings, translation speeds and intensity changes between
+points are computed over the whole arrays at once, masking the steps
+that cross from one cyclone to the next.
+"""
+
+from typing import Iterable, List, NamedTuple
+
+import numpy as np
+from apps.cyclones import geo
+from apps.cyclones.models import HistoricSnapshot
+from rest_framework import serializers
+
+# Window of the intensity change, in hours.
+INTENSITY_CHANGE_HOURS = 24
+# Per point metrics, in output order.
+METRICS = ("distance_km", "speed_kmh", "heading_deg", "intensity_change_24h")
+# Decimals kept in the output.
+DECIMALS = 2
+
+
+class TrackArrays(NamedTuple):
+    """Snapshot columns ordered by cyclone then synoptic time."""
+
+    cyclone_ids: np.ndarray
+    times: np.ndarray
+    lat: np.ndarray
+    lng: np.ndarray
+    intensity: np.ndarray
+    synoptic_times: list
+
+    @classmethod
+    def load(cls, cyclone_ids: Iterable[int]) -> "TrackArrays":
+        """Load the historic snapshots of cyclones."""
+        rows = list(
+            HistoricSnapshot.objects.filter(cyclone_id__in=list(cyclone_ids))
+            .order_by("cyclone_id", "synoptic_time")
+            .values_list("cyclone_id", "synoptic_time", "lat", "lng", "intensity")
+        )
+        count = len(rows)
+        ids, synoptic_times, lat, lng, intensity = zip(*rows) if rows else [()] * 5
+        return cls(
+            cyclone_ids=np.fromiter(ids, np.int64, count),
+            times=np.fromiter(
+                (time.timestamp() for time in synoptic_times), np.int64, count
+            ),
+            lat=np.fromiter(lat, np.float64, count),
+            lng=np.fromiter(lng, np.float64, count),
+            intensity=np.fromiter(intensity, np.float64, count),
+            synoptic_times=list(synoptic_times),
+        )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Element wise `geo.haversine_km` of degree arrays."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    d_lambda = np.radians((lng2 - lng1 + 180) % 360 - 180)
+    a = (
+        np.sin((phi2 - phi1) / 2) ** 2
+        + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    )
+    return 2 * geo.EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def bearing_deg(lat1, lng1, lat2, lng2):
+    """Element wise initial great circle bearing in [0, 360) degrees."""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    d_lambda = np.radians(lng2 - lng1)
+    y = np.sin(d_lambda) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(d_lambda)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+def intensity_change(tracks: TrackArrays, hours: float) -> np.ndarray:
+    """Intensity change of every point over the preceding `hours`.
+
+    The intensity `hours` before a point is the snapshot at that time or
+    the linear interpolation of the snapshots around it, NaN when the
+    track does not reach that far back.
+    """
+    if not len(tracks.times):
+        return np.empty(0)
+    window = int(hours * 3600)
+    # Offsetting each cyclone's times past the previous one's makes one
+    # sorted search key for all tracks.
+    group = np.cumsum(np.r_[0, tracks.cyclone_ids[1:] != tracks.cyclone_ids[:-1]])
+    span = int(tracks.times.max() - tracks.times.min()) + window + 1
+    key = group * span + (tracks.times - tracks.times.min())
+    target = key - window
+    # First point at or after the target, always of the same cyclone.
+    after = np.searchsorted(key, target)
+    exact = key[after] == target
+    before = np.maximum(after - 1, 0)
+    bracketed = ~exact & (after > 0) & (group[before] == group)
+    past = np.where(exact, tracks.intensity[after], np.nan)
+    weight = (target[bracketed] - key[before][bracketed]) / (
+        key[after][bracketed] - key[before][bracketed]
+    )
+    past[bracketed] = tracks.intensity[before][bracketed] + weight * (
+        tracks.intensity[after][bracketed] - tracks.intensity[before][bracketed]
+    )
+    return tracks.intensity - past
+
+
+def track_metrics(tracks: TrackArrays) -> dict:
+    """Per point metrics of the step from the previous point of a track.
+
+    Args:
+        tracks(TrackArrays): Snapshots of one or more cyclones.
+    Returns:
+        Dict of metric name to an array aligned with the snapshots, NaN
+        for the first point of each track, and headings of stationary
+        steps.
+    """
+    count = len(tracks.times)
+    metrics = {name: np.full(count, np.nan) for name in METRICS}
+    if count > 1:
+        steps = np.flatnonzero(tracks.cyclone_ids[1:] == tracks.cyclone_ids[:-1])
+        start, end = steps, steps + 1
+        args = (tracks.lat[start], tracks.lng[start], tracks.lat[end], tracks.lng[end])
+        distance = haversine_km(*args)
+        hours = (tracks.times[end] - tracks.times[start]) / 3600
+        metrics["distance_km"][end] = distance
+        metrics["speed_kmh"][end] = distance / hours
+        metrics["heading_deg"][end] = np.where(
+            distance > 0, bearing_deg(*args), np.nan
+        )
+    metrics["intensity_change_24h"] = intensity_change(
+        tracks, INTENSITY_CHANGE_HOURS
+    )
+    return metrics
+
+
+def _column(values: np.ndarray) -> list:
+    """Rounded python values of an array, None for NaN."""
+    column = np.round(values, DECIMALS).astype(object)
+    column[np.isnan(values)] = None
+    return column.tolist()
+
+
+def cyclone_analytics(cyclones: Iterable[dict], series: bool = False) -> List[dict]:
+    """Track analytics of cyclones.
+
+    Args:
+        cyclones(Iterable): Cyclone `.values()` rows with `id` and `name`.
+        series(bool): Whether to return every point, not only the latest.
+    Returns:
+        Per cyclone dict of its id, name, snapshot count, latest point
+        and, with `series`, all points, oldest first.
+    """
+    cyclones = list(cyclones)
+    tracks = TrackArrays.load(cyclone["id"] for cyclone in cyclones)
+    metrics = track_metrics(tracks)
+    to_time = serializers.DateTimeField().to_representation
+    columns = {
+        "synoptic_time": [to_time(time) for time in tracks.synoptic_times],
+        "lat": tracks.lat.tolist(),
+        "lng": tracks.lng.tolist(),
+        "intensity": tracks.intensity.astype(np.int64).tolist(),
+        **{name: _column(values) for name, values in metrics.items()},
+    }
+    points = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    ids, starts, counts = np.unique(
+        tracks.cyclone_ids, return_index=True, return_counts=True
+    )
+    bounds = {
+        cyclone_id: (start, start + count)
+        for cyclone_id, start, count in zip(
+            ids.tolist(), starts.tolist(), counts.tolist()
+        )
+    }
+    data = []
+    for cyclone in cyclones:
+        start, end = bounds.get(cyclone["id"], (0, 0))
+        data += [
+            {
+                "id": cyclone["id"],
+                "name": cyclone["name"],
+                "snapshots": end - start,
+                "latest": points[end - 1] if end > start else None,
+                **({"points": points[start:end]} if series else {}),
+            }
+        ]
+    return data
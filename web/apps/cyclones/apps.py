@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CyclonesConfig(AppConfig):
     name = "apps.cyclones"
+
+    def ready(self):
+        from apps.cyclones import events, models
+
+        models.tracks_ingested.connect(events.on_tracks_ingested)
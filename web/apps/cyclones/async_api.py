@@ -0,0 +1,84 @@
+"""Async read path of the cyclone list and detail.
+
+Django 3.0 has neither async views nor an async ORM, and its ASGI handler
+runs every request in a thread of the event loop's default executor from
+start to finish. This ASGI app reads requests and writes responses on the
+event loop instead, and only runs the Django view, with its cache and
+database queries, in a bounded pool of threads. A thread goes back to the
+pool as soon as the response is rendered, so slow clients hold neither a
+thread nor a database connection. Each pool thread keeps its connection
+between requests for `CONN_MAX_AGE`, the pool size bounds the connections
+of the process.
+"""
+
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signals
+from django.core.handlers.asgi import ASGIRequest
+from django.core.handlers.base import BaseHandler
+from django.urls import set_script_prefix
+
+
+class PooledHandler(BaseHandler):
+    """Django request handler whose views run in a bounded thread pool.
+
+    Requests go through the middleware and URL resolution of the project,
+    as they would under WSGI.
+
+    Args:
+        pool_size(int): Threads, hence database connections, of the pool.
+    """
+
+    def __init__(self, pool_size: int):
+        super().__init__()
+        self.load_middleware()
+        self.executor = ThreadPoolExecutor(
+            pool_size, thread_name_prefix="cyclones-read"
+        )
+
+    def handle(self, scope, request):
+        """Rendered response of a request, run in a pool thread.
+
+        The request signals reuse or close the thread's database connection
+        as the WSGI handler does around each request.
+        """
+        set_script_prefix(scope.get("root_path", "") or "/")
+        signals.request_started.send(sender=self.__class__, scope=scope)
+        response = self.get_response(request)
+        # Fires request_finished, the content is rendered already.
+        response.close()
+        return response
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            raise ValueError(f"Cannot handle a {scope['type']} connection.")
+        request = ASGIRequest(scope, io.BytesIO())
+        response = await asyncio.get_event_loop().run_in_executor(
+            self.executor, self.handle, scope, request
+        )
+        await send_response(response, send)
+
+
+async def send_response(response, send) -> None:
+    """Send a rendered, non streaming Django response to an ASGI client."""
+    headers = [
+        (name.encode("ascii"), value.encode("latin1"))
+        for name, value in response.items()
+    ] + [
+        (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+        for cookie in response.cookies.values()
+    ]
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": headers,
+        }
+    )
+    await send({"type": "http.response.body", "body": response.content})
+
+
+read_app = PooledHandler(settings.CYCLONE_ASYNC_POOL_SIZE)
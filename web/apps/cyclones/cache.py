@@ -0,0 +1,101 @@
+"""Versioned cache of cyclone list responses.
+
+Cached responses are keyed on a data version that the ingest pipeline
+bumps whenever it inserts track rows, so stale entries are never read
+again and simply expire. The version also drives the list's ETag and
+Last-Modified validators.
+"""
+
+import hashlib
+import time
+from typing import Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = "cyclones:data-version"
+# Epoch seconds of the last version bump.
+MODIFIED_KEY = "cyclones:data-modified"
+# Query parameters that only select a renderer.
+RENDER_PARAMS = ("format",)
+
+
+def data_state() -> Tuple[int, float]:
+    """Current cyclone data version and the time it was set, in one read."""
+    state = cache.get_many([VERSION_KEY, MODIFIED_KEY])
+    if len(state) < 2:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        cache.add(MODIFIED_KEY, time.time(), timeout=None)
+        state = cache.get_many([VERSION_KEY, MODIFIED_KEY])
+    return state[VERSION_KEY], state[MODIFIED_KEY]
+
+
+def data_version() -> int:
+    """Current cyclone data version."""
+    return data_state()[0]
+
+
+def bump_data_version() -> int:
+    """Invalidate cached responses by moving to the next data version."""
+    cache.add(VERSION_KEY, 1, timeout=None)
+    version = cache.incr(VERSION_KEY)
+    cache.set(MODIFIED_KEY, time.time(), timeout=None)
+    return version
+
+
+def time_bucket(now: Optional[float] = None) -> int:
+    """CYCLONE_LIST_CACHE_BUCKET seconds time bucket of `now`."""
+    now = time.time() if now is None else now
+    return int(now // settings.CYCLONE_LIST_CACHE_BUCKET)
+
+
+def list_query_digest(
+    delta_seconds: float, params: Mapping[str, str], location: str
+) -> str:
+    """Digest of a normalized cyclone list query.
+
+    Args:
+        delta_seconds(float): Normalized H/M/S/d time delta.
+        params(Mapping): Other query parameters.
+        location(str): Request host and path, part of pagination links.
+    Returns:
+        Hex digest.
+    """
+    query = repr(
+        (
+            delta_seconds,
+            location,
+            sorted(
+                (name, value)
+                for name, value in params.items()
+                if name not in RENDER_PARAMS
+            ),
+        )
+    )
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()
+
+
+def list_cache_key(version: int, digest: str, bucket: int) -> str:
+    """Cache key of a cyclone list response.
+
+    The time delta cutoff moves with the clock, so cached responses are
+    only reused within their time bucket.
+
+    Args:
+        version(int): Data version.
+        digest(str): `list_query_digest` of the query.
+        bucket(int): Time bucket.
+    Returns:
+        Key under the data version and time bucket.
+    """
+    return f"cyclones:list:{version}:{bucket}:{digest}"
+
+
+def list_etag(version: int, digest: str, renderer_format: str) -> str:
+    """Strong ETag of one representation of a list response.
+
+    Derived from the data version only, not the time bucket, so clients
+    revalidate with a 304 until the next ingest.
+    """
+    digest = hashlib.sha1(f"{version}:{digest}:{renderer_format}".encode("utf-8"))
+    return f'"{digest.hexdigest()}"'
@@ -0,0 +1,246 @@
+"""Incremental columnar export of the cyclone dataset.
+
+Track points are written to Parquet files partitioned hive style by the
+region of their cyclone and the month of their time, e.g.
+`forecasts/region=Atlantic/month=2020-11/part-20201111T120000Z.parquet`.
+Every run appends the points ingested since the previous one, tracked by
+a watermark kept with the dataset, and rewrites the small cyclone table
+whole. Part files are named after the start of the ingest window they
+cover, so a run retried after a failure replaces its own files.
+
+Requires pyarrow, see requirements_export.txt.
+"""
+
+import datetime as dt
+import itertools
+import json
+import os
+from collections import defaultdict
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from apps.cyclones.models import Cyclone, Forecast, HistoricSnapshot
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Track model -> (dataset directory, time column, exported columns).
+TRACK_DATASETS = {
+    Forecast: (
+        "forecasts",
+        "forecast_time",
+        ("id", "cyclone", "forecast_time", "forecast_hr", "lat", "lng"),
+    ),
+    HistoricSnapshot: (
+        "snapshots",
+        "synoptic_time",
+        ("id", "cyclone", "synoptic_time", "lat", "lng"),
+    ),
+}
+# Columns exported for every track model after its own.
+TRACK_COLUMNS = ("intensity", "geo_cell", "ingested_at")
+CYCLONE_COLUMNS = (
+    "id",
+    "name",
+    "region",
+    "img_src",
+    "link_page",
+    "latest_forecast_time",
+)
+CYCLONE_FILE = "cyclones.parquet"
+# Watermarks of the exported track datasets.
+STATE_FILE = "_export_state.json"
+INITIAL_PART = "part-initial.parquet"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImproperlyConfigured(
+            "The columnar export requires pyarrow, see requirements_export.txt."
+        )
+
+
+def arrow_schema(model, columns):
+    """Arrow schema of model columns.
+
+    Args:
+        model(Model): Exported model.
+        columns(Iterable): Field names.
+    Returns:
+        pyarrow Schema with the field columns as names.
+    """
+    _require_pyarrow()
+    types = {
+        "AutoField": pa.int64(),
+        "ForeignKey": pa.int64(),
+        "IntegerField": pa.int32(),
+        "FloatField": pa.float64(),
+        "CharField": pa.string(),
+        "DateTimeField": pa.timestamp("us", tz="UTC"),
+    }
+    fields = [model._meta.get_field(name) for name in columns]
+    return pa.schema(
+        [
+            pa.field(field.column, types[field.get_internal_type()], field.null)
+            for field in fields
+        ]
+    )
+
+
+def _write_table(path: str, table) -> None:
+    """Write a Parquet file atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(table, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def _rows_table(rows, schema):
+    columns = list(zip(*rows)) or [()] * len(schema)
+    return pa.Table.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def part_name(since: Optional[dt.datetime]) -> str:
+    """Part file name of the ingest window starting at `since`."""
+    if since is None:
+        return INITIAL_PART
+    return f"part-{since.astimezone(dt.timezone.utc):%Y%m%dT%H%M%SZ}.parquet"
+
+
+def export_tracks(
+    model,
+    directory: str,
+    since: Optional[dt.datetime],
+    until: dt.datetime,
+    chunk_size: int = 50000,
+) -> int:
+    """Export the track points ingested within a window.
+
+    Points are read through a server-side cursor and written a chunk at a
+    time, one row group per touched partition.
+
+    Args:
+        model(Model): Forecast or HistoricSnapshot.
+        directory(str): Dataset root directory.
+        since(datetime): Window start, inclusive, None for all points.
+        until(datetime): Window end, exclusive.
+        chunk_size(int): Rows read and written at once.
+    Returns:
+        Number of exported points.
+    """
+    _require_pyarrow()
+    name, time_column, columns = TRACK_DATASETS[model]
+    columns += TRACK_COLUMNS
+    schema = arrow_schema(model, columns)
+    time_index = columns.index(time_column)
+    points = model.objects.filter(cyclone__isnull=False, ingested_at__lt=until)
+    if since is not None:
+        points = points.filter(ingested_at__gte=since)
+    rows = (
+        points.order_by()
+        .values_list("cyclone__region", *columns)
+        .iterator(chunk_size=chunk_size)
+    )
+    filename = part_name(since)
+    writers = {}
+    exported = 0
+    try:
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            partitions = defaultdict(list)
+            for region, *row in chunk:
+                month = row[time_index].astimezone(dt.timezone.utc)
+                partitions[(region, f"{month:%Y-%m}")] += [row]
+            for (region, month), partition_rows in partitions.items():
+                if (region, month) not in writers:
+                    path = os.path.join(
+                        directory,
+                        name,
+                        f"region={quote(region, safe='')}",
+                        f"month={month}",
+                        filename,
+                    )
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writers[(region, month)] = (
+                        path,
+                        pq.ParquetWriter(f"{path}.tmp", schema),
+                    )
+                writers[(region, month)][1].write_table(
+                    _rows_table(partition_rows, schema)
+                )
+            exported += len(chunk)
+    except BaseException:
+        for path, writer in writers.values():
+            writer.close()
+            os.remove(f"{path}.tmp")
+        raise
+    for path, writer in writers.values():
+        writer.close()
+        os.replace(f"{path}.tmp", path)
+    return exported
+
+
+def export_cyclones(directory: str) -> int:
+    """Rewrite the cyclone table, returns its row count."""
+    _require_pyarrow()
+    schema = arrow_schema(Cyclone, CYCLONE_COLUMNS)
+    rows = list(Cyclone.objects.order_by("pk").values_list(*CYCLONE_COLUMNS))
+    _write_table(os.path.join(directory, CYCLONE_FILE), _rows_table(rows, schema))
+    return len(rows)
+
+
+def read_state(directory: str) -> Dict[str, dt.datetime]:
+    """Watermarks of the track datasets exported to `directory`."""
+    try:
+        with open(os.path.join(directory, STATE_FILE), encoding="utf-8") as state_f:
+            state = json.load(state_f)
+    except FileNotFoundError:
+        return {}
+    return {name: dt.datetime.fromisoformat(value) for name, value in state.items()}
+
+
+def write_state(directory: str, state: Dict[str, dt.datetime]) -> None:
+    """Atomically store the watermarks of the track datasets."""
+    path = os.path.join(directory, STATE_FILE)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as state_f:
+        json.dump({name: value.isoformat() for name, value in state.items()}, state_f)
+    os.replace(f"{path}.tmp", path)
+
+
+def export_dataset(
+    directory: str,
+    lag: dt.timedelta = dt.timedelta(0),
+    now: Optional[dt.datetime] = None,
+    chunk_size: int = 50000,
+) -> Dict[str, int]:
+    """Append the points ingested since the last export and the cyclones.
+
+    Args:
+        directory(str): Dataset root directory.
+        lag(timedelta): Only export points ingested at least that long ago,
+            so rows of transactions still in flight are not skipped.
+        now(datetime): Defaults to the current time.
+        chunk_size(int): Rows read and written at once.
+    Returns:
+        Dict of dataset names to exported row counts.
+    """
+    _require_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    until = (now or dt.datetime.now(tz=dt.timezone.utc)) - lag
+    state = read_state(directory)
+    counts = {}
+    for model, (name, _, _) in TRACK_DATASETS.items():
+        since = state.get(name)
+        if since is not None and since >= until:
+            counts[name] = 0
+            continue
+        counts[name] = export_tracks(model, directory, since, until, chunk_size)
+        state[name] = until
+        write_state(directory, state)
+    counts["cyclones"] = export_cyclones(directory)
+    return counts
@@ -0,0 +1,269 @@
+"""Server-sent events push of storm updates.
+
+Once `save_db` commits, `on_tracks_ingested` publishes one message per
+cyclone that got new forecasts or snapshots to a Redis pub/sub channel.
+Each ASGI worker process holds a single subscription to it and fans the
+messages out to its connected event stream clients, see `Broadcaster` and
+`sse_app`.
+"""
+
+import asyncio
+import json
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs
+
+from apps.cyclones.models import Cyclone, Forecast, HistoricSnapshot
+from django.conf import settings
+from redis import RedisError
+from rest_framework import serializers
+
+ENCODER = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+# Track collection -> (model, fields of a pushed point).
+TRACK_FIELDS = {
+    "forecasts": (
+        Forecast,
+        ("id", "forecast_time", "forecast_hr", "lat", "lng", "intensity"),
+    ),
+    "snapshots": (HistoricSnapshot, ("id", "synoptic_time", "lat", "lng", "intensity")),
+}
+# Seconds a blocking read of the subscription waits for a message.
+POLL_TIMEOUT = 1.0
+# Seconds before subscribing again after a Redis error, doubled on each
+# consecutive error up to MAX_RECONNECT_DELAY.
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+
+
+def _default_redis():
+    import backend
+
+    return backend.redis_instance
+
+
+def track_updates(inserted_ids: Dict[str, List[int]]) -> List[dict]:
+    """Per cyclone diffs of newly inserted track points.
+
+    Args:
+        inserted_ids(dict): Track collection name to inserted primary keys.
+    Returns:
+        One dict per cyclone with its id, name, latest forecast time and
+        the new points of each collection.
+    """
+    to_time = serializers.DateTimeField().to_representation
+    updates = {}
+    for name, (model, fields) in TRACK_FIELDS.items():
+        if not (ids := inserted_ids.get(name)):
+            continue
+        for row in (
+            model.objects.filter(pk__in=ids, cyclone__isnull=False)
+            .order_by("pk")
+            .values("cyclone_id", *fields)
+        ):
+            cyclone_id = row.pop("cyclone_id")
+            for field in fields:
+                if field.endswith("_time"):
+                    row[field] = to_time(row[field])
+            update = updates.setdefault(
+                cyclone_id, {name: [] for name in TRACK_FIELDS}
+            )
+            update[name] += [row]
+    cyclones = Cyclone.objects.filter(pk__in=updates).values(
+        "id", "name", "latest_forecast_time"
+    )
+    return [
+        {
+            **cyclone,
+            "latest_forecast_time": to_time(cyclone["latest_forecast_time"])
+            if cyclone["latest_forecast_time"]
+            else None,
+            **updates[cyclone["id"]],
+        }
+        for cyclone in cyclones.order_by("pk")
+    ]
+
+
+def publish_track_updates(inserted_ids: Dict[str, List[int]], redis=None) -> int:
+    """Publish the diffs of inserted track points, one message per cyclone.
+
+    Redis failures are logged, not raised, as the points are saved already
+    and clients catch up by polling the list.
+
+    Args:
+        inserted_ids(dict): Track collection name to inserted primary keys.
+        redis(Redis): Client, `backend.redis_instance` by default.
+    Returns:
+        Number of published messages.
+    """
+    try:
+        redis = redis or _default_redis()
+        updates = track_updates(inserted_ids)
+        pipe = redis.pipeline(transaction=False)
+        for update in updates:
+            pipe.publish(settings.CYCLONE_EVENTS_CHANNEL, ENCODER.encode(update))
+        pipe.execute()
+    except RedisError as e:
+        settings.LOGGER.error(f"Failed publishing storm updates: {e!r}")
+        return 0
+    return len(updates)
+
+
+def on_tracks_ingested(sender, inserted_ids: Dict[str, List[int]], **kwargs):
+    """`tracks_ingested` receiver publishing the new track points."""
+    publish_track_updates(inserted_ids)
+
+
+class Broadcaster:
+    """One Redis subscription fanned out to the clients of a process.
+
+    The subscription is opened with the first client and closed with the
+    last, and opened again with a backoff after Redis errors. redis-py is
+    blocking, so it is read from the default executor.
+
+    Args:
+        redis_factory(callable): Returns a Redis client.
+        channel(str): Pub/sub channel.
+    """
+
+    def __init__(self, redis_factory, channel: str):
+        self.redis_factory = redis_factory
+        self.channel = channel
+        self.queues: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        """Queue of the raw messages received from now on."""
+        queue = asyncio.Queue(maxsize=settings.CYCLONE_EVENTS_CLIENT_BACKLOG)
+        self.queues.add(queue)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._listen())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.queues.discard(queue)
+        if not self.queues:
+            # The listener stops after its pending read.
+            self.task = None
+
+    def _dispatch(self, data: bytes) -> None:
+        for queue in self.queues:
+            if queue.full():
+                # Slow client, drop its oldest message rather than block
+                # the others.
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    async def _listen(self) -> None:
+        loop = asyncio.get_event_loop()
+        task = asyncio.current_task()
+        delay = RECONNECT_DELAY
+        try:
+            while self.task is task:
+                pubsub = self.redis_factory().pubsub(ignore_subscribe_messages=True)
+                try:
+                    await loop.run_in_executor(None, pubsub.subscribe, self.channel)
+                    while self.task is task:
+                        message = await loop.run_in_executor(
+                            None, pubsub.get_message, True, POLL_TIMEOUT
+                        )
+                        delay = RECONNECT_DELAY
+                        if (
+                            self.task is task
+                            and message
+                            and message["type"] == "message"
+                        ):
+                            self._dispatch(message["data"])
+                except RedisError as e:
+                    settings.LOGGER.error(
+                        f"Storm updates subscription failed, retrying in "
+                        f"{delay}s: {e!r}"
+                    )
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                finally:
+                    pubsub.close()
+        finally:
+            # Any other failure, the next client starts a new listener.
+            if self.task is task:
+                self.task = None
+
+
+broadcaster = Broadcaster(_default_redis, settings.CYCLONE_EVENTS_CHANNEL)
+
+
+async def _disconnected(receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def format_event(data: bytes) -> bytes:
+    """`cyclone` event of a published message."""
+    return b"event: cyclone\ndata: " + data + b"\n\n"
+
+
+async def sse_app(scope, receive, send):
+    """ASGI app streaming storm updates as server-sent events.
+
+    The `cyclone` query parameter, comma separated ids, restricts the
+    stream to those cyclones. Comments are sent as keepalives while idle.
+    """
+    if scope["type"] != "http" or scope["method"] != "GET":
+        await send({"type": "http.response.start", "status": 405, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    try:
+        cyclone_ids = {
+            int(pk) for value in query.get("cyclone", []) for pk in value.split(",")
+        } or None
+    except ValueError:
+        await send({"type": "http.response.start", "status": 400, "headers": []})
+        await send({"type": "http.response.body", "body": b"Invalid cyclone ids."})
+        return
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                # Disable proxy buffering, e.g. nginx.
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+    subscription = broadcaster
+    queue = subscription.subscribe()
+    disconnect = asyncio.ensure_future(_disconnected(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b"retry: %d\n\n" % settings.CYCLONE_EVENTS_RETRY_MS,
+                "more_body": True,
+            }
+        )
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnect},
+                timeout=settings.CYCLONE_EVENTS_KEEPALIVE_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect in done:
+                message.cancel()
+                break
+            if message not in done:
+                message.cancel()
+                body = b": keepalive\n\n"
+            else:
+                data = message.result()
+                if (
+                    cyclone_ids is not None
+                    and json.loads(data)["id"] not in cyclone_ids
+                ):
+                    continue
+                body = format_event(data)
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        disconnect.cancel()
+        subscription.unsubscribe(queue)
@@ -0,0 +1,124 @@
+"""Streaming export of track points as NDJSON or GeoJSON.
+
+Points are read through a server-side cursor and encoded chunk by chunk
+into a streaming response, so memory stays flat whatever the size of the
+export.
+"""
+
+import itertools
+import json
+from typing import Iterable, Iterator, Optional
+
+from apps.cyclones import geo
+from apps.cyclones.models import Forecast, HistoricSnapshot
+from rest_framework import serializers
+
+# Track collection -> (model, time column, exported columns, index order).
+EXPORT_TRACKS = {
+    "forecasts": (
+        Forecast,
+        "forecast_time",
+        ("forecast_time", "forecast_hr", "lat", "lng", "intensity"),
+        ("cyclone", "-forecast_time", "forecast_hr"),
+    ),
+    "snapshots": (
+        HistoricSnapshot,
+        "synoptic_time",
+        ("synoptic_time", "lat", "lng", "intensity"),
+        ("cyclone", "-synoptic_time"),
+    ),
+}
+# Cyclone columns leading every exported point.
+CYCLONE_COLUMNS = (
+    ("cyclone", "cyclone_id"),
+    ("name", "cyclone__name"),
+    ("region", "cyclone__region"),
+)
+ENCODER = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+def track_points(
+    track: str,
+    cyclone_ids: Optional[Iterable[int]] = None,
+    regions: Optional[Iterable[str]] = None,
+    start=None,
+    end=None,
+):
+    """Points of a track collection with their cyclone, in index order.
+
+    Args:
+        track(str): forecasts or snapshots.
+        cyclone_ids(Iterable): Only points of these cyclones.
+        regions(Iterable): Only points of cyclones in these regions.
+        start(datetime): Only points at or after it.
+        end(datetime): Only points before it.
+    Returns:
+        `values_list` queryset, newest points first per cyclone.
+    """
+    model, time_column, columns, ordering = EXPORT_TRACKS[track]
+    queryset = model.objects.filter(cyclone__isnull=False)
+    if cyclone_ids is not None:
+        queryset = queryset.filter(cyclone_id__in=list(cyclone_ids))
+    if regions is not None:
+        queryset = queryset.filter(cyclone__region__in=list(regions))
+    if start is not None:
+        queryset = queryset.filter(**{f"{time_column}__gte": start})
+    if end is not None:
+        queryset = queryset.filter(**{f"{time_column}__lt": end})
+    return queryset.order_by(*ordering).values_list(
+        *(column for _, column in CYCLONE_COLUMNS), *columns
+    )
+
+
+def point_records(track: str, points, chunk_size: int) -> Iterator[dict]:
+    """Stream `track_points` rows as dicts through a server-side cursor."""
+    _, time_column, columns, _ = EXPORT_TRACKS[track]
+    names = [name for name, _ in CYCLONE_COLUMNS] + list(columns)
+    to_time = serializers.DateTimeField().to_representation
+    for row in points.iterator(chunk_size=chunk_size):
+        record = dict(zip(names, row))
+        record[time_column] = to_time(record[time_column])
+        yield record
+
+
+def _chunks(records: Iterable[dict], chunk_size: int) -> Iterator[list]:
+    records = iter(records)
+    while chunk := list(itertools.islice(records, chunk_size)):
+        yield chunk
+
+
+def ndjson_stream(records: Iterable[dict], chunk_size: int) -> Iterator[str]:
+    """Newline delimited JSON, one record per line."""
+    for chunk in _chunks(records, chunk_size):
+        yield "".join(ENCODER.encode(record) + "\n" for record in chunk)
+
+
+def geojson_feature(record: dict) -> dict:
+    """Point feature of a record, longitude normalized to [-180, 180)."""
+    properties = {
+        name: value for name, value in record.items() if name not in ("lat", "lng")
+    }
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [geo.normalize_lng(record["lng"]), record["lat"]],
+        },
+        "properties": properties,
+    }
+
+
+def geojson_stream(records: Iterable[dict], chunk_size: int) -> Iterator[str]:
+    """GeoJSON FeatureCollection of point features."""
+    yield '{"type":"FeatureCollection","features":['
+    separator = ""
+    for chunk in _chunks(records, chunk_size):
+        yield separator + ",".join(
+            ENCODER.encode(geojson_feature(record)) for record in chunk
+        )
+        separator = ","
+    yield "]}\n"
+
+
+# Renderer format -> stream encoder.
+STREAMS = {"ndjson": ndjson_stream, "geojson": geojson_stream}
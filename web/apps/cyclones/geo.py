@@ -0,0 +1,123 @@
+"""Grid cell spatial index of track points.
+
+Every track point is assigned a one degree latitude/longitude grid cell at
+ingest time. Bounding box and radius queries translate into a few ranges
+of cell ids, answered by a btree index, before the exact check on the
+candidate points. Longitudes are normalized to [-180, 180) first, as
+rammb forecasts use 0-360 degrees (e.g. 275.8) and track history signed
+degrees (e.g. -84.2).
+"""
+
+import math
+from typing import List, NamedTuple, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+LNG_CELLS = 360
+
+# Same cell as `geo_cell`, for rows written by SQL. Format with the
+# latitude and longitude column expressions.
+GEO_CELL_SQL = (
+    "((LEAST(GREATEST(floor({lat}), -90), 89)::integer + 90) * 360 "
+    "+ floor({lng} - 360 * floor(({lng} + 180) / 360))::integer + 180)"
+)
+
+
+def normalize_lng(lng: float) -> float:
+    """Longitude in [-180, 180)."""
+    return (lng + 180) % 360 - 180
+
+
+def geo_cell(lat: float, lng: float) -> int:
+    """Grid cell id of a point.
+
+    Args:
+        lat(float): Latitude in degrees.
+        lng(float): Longitude in degrees, signed or 0-360.
+    Returns:
+        Cell id in [0, 180 * 360).
+    """
+    row = min(max(math.floor(lat), -90), 89) + 90
+    return row * LNG_CELLS + math.floor(normalize_lng(lng)) + 180
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great circle distance between two points in kilometers."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(normalize_lng(lng2 - lng1))
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class BoundingBox(NamedTuple):
+    """Latitude/longitude box, crossing the antimeridian if west > east."""
+
+    south: float
+    west: float
+    north: float
+    east: float
+
+    @classmethod
+    def parse(cls, south, west, north, east) -> "BoundingBox":
+        """Coerce, normalize and validate raw values."""
+        south, north = float(south), float(north)
+        if not -90 <= south <= north <= 90:
+            raise ValueError("expected -90 <= south <= north <= 90")
+        west, east = float(west), float(east)
+        if east - west >= 360:
+            west, east = -180.0, 180.0
+        else:
+            west, east = normalize_lng(west), normalize_lng(east)
+            if east == -180.0:
+                east = 180.0
+        return cls(south, west, north, east)
+
+    @classmethod
+    def around(cls, lat: float, lng: float, radius_km: float) -> "BoundingBox":
+        """Box enclosing a circle."""
+        d_lat = radius_km / KM_PER_DEGREE
+        south, north = max(lat - d_lat, -90.0), min(lat + d_lat, 90.0)
+        max_lat = max(abs(south), abs(north))
+        if max_lat >= 90 or d_lat >= 90:
+            return cls(south, -180.0, north, 180.0)
+        d_lng = d_lat / math.cos(math.radians(max_lat))
+        if d_lng >= 180:
+            return cls(south, -180.0, north, 180.0)
+        return cls.parse(south, lng - d_lng, north, lng + d_lng)
+
+    def lng_spans(self) -> List[Tuple[float, float]]:
+        """Non wrapping longitude spans of the box."""
+        if self.west <= self.east:
+            return [(self.west, self.east)]
+        return [(self.west, 180.0), (-180.0, self.east)]
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """Whether the box contains a point."""
+        lng = normalize_lng(lng)
+        return self.south <= lat <= self.north and any(
+            west <= lng <= east for west, east in self.lng_spans()
+        )
+
+    def cell_ranges(self) -> List[Tuple[int, int]]:
+        """Inclusive ranges of the grid cells the box overlaps, merged."""
+        first_row = min(max(math.floor(self.south), -90), 89) + 90
+        last_row = min(max(math.floor(self.north), -90), 89) + 90
+        cells = sorted(
+            (
+                row * LNG_CELLS + math.floor(west) + 180,
+                row * LNG_CELLS + min(math.floor(east) + 180, LNG_CELLS - 1),
+            )
+            for row in range(first_row, last_row + 1)
+            for west, east in self.lng_spans()
+        )
+        ranges = []
+        for low, high in cells:
+            if ranges and low <= ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], high))
+            else:
+                ranges += [(low, high)]
+        return ranges
@@ -0,0 +1,126 @@
+"""Load test cyclone API endpoints."""
+
+import asyncio
+import math
+import time
+from typing import List, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Reported latency percentiles.
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(latencies: Sequence[float], pct: float) -> float:
+    """Nearest rank percentile of sorted latencies."""
+    if not latencies:
+        return math.nan
+    return latencies[max(math.ceil(pct / 100 * len(latencies)) - 1, 0)]
+
+
+async def fetch(url: str, headers: Sequence[str], timeout: float) -> int:
+    """GET a plain HTTP url over a new connection, returns the status code."""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, parts.port or 80), timeout
+    )
+    try:
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}", *headers]
+        writer.write(("\r\n".join(lines + ["Connection: close", "", ""])).encode())
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        # Read the whole response, the server closes the connection.
+        while await asyncio.wait_for(reader.read(65536), timeout):
+            pass
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def run_load(
+    url: str, requests: int, concurrency: int, headers: Sequence[str], timeout: float
+) -> Tuple[List[float], int, float]:
+    """Send `requests` GETs with `concurrency` clients at a time.
+
+    Returns:
+        Sorted latencies in seconds of the successful requests, the error
+        count and the elapsed seconds.
+    """
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                status = await fetch(url, headers, timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                status = None
+            if status is not None and status < 400:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return sorted(latencies), errors, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    """Management command to compare the read paths of the API."""
+
+    help = (
+        "Send GET requests to one or more urls, e.g. the cyclone list of "
+        "the WSGI and of the ASGI server, and report throughput and latency "
+        "percentiles of each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="Plain HTTP urls.")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument(
+            "--concurrency", type=int, default=50, help="Concurrent clients."
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument(
+            "--header",
+            action="append",
+            default=[],
+            dest="headers",
+            help="Request header, e.g. 'Accept: application/json'.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        for url in options["urls"]:
+            if urlsplit(url).scheme != "http":
+                raise CommandError(f"Expected a plain http url, got {url}.")
+        for url in options["urls"]:
+            latencies, errors, elapsed = asyncio.run(
+                run_load(
+                    url,
+                    options["requests"],
+                    options["concurrency"],
+                    options["headers"],
+                    options["timeout"],
+                )
+            )
+            self.stdout.write(self.report(url, latencies, errors, elapsed))
+
+    @staticmethod
+    def report(url: str, latencies: List[float], errors: int, elapsed: float) -> str:
+        """One line summary of a load test run."""
+        return (
+            f"{url}: {len(latencies) + errors} requests, {errors} errors, "
+            f"{len(latencies) / elapsed:.1f} req/s, "
+            + ", ".join(
+                f"p{pct} {percentile(latencies, pct) * 1000:.1f} ms"
+                for pct in PERCENTILES
+            )
+        )
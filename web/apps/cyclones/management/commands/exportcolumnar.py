@@ -0,0 +1,53 @@
+"""Export the cyclone dataset to columnar files."""
+
+import datetime as dt
+
+from apps.cyclones import columnar
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Management command to append to the Parquet dataset export."""
+
+    help = (
+        "Append the Forecast and HistoricSnapshot rows ingested since the "
+        "last export to Parquet files partitioned by region and month, and "
+        "rewrite the Cyclone table. Requires pyarrow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "directory",
+            nargs="?",
+            default=settings.CYCLONE_COLUMNAR_EXPORT_DIR,
+            help="Dataset directory, CYCLONE_COLUMNAR_EXPORT_DIR by default.",
+        )
+        parser.add_argument(
+            "--lag-seconds",
+            type=int,
+            default=settings.CYCLONE_COLUMNAR_EXPORT_LAG_SECONDS,
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.CYCLONE_COLUMNAR_EXPORT_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        if not options["directory"]:
+            raise CommandError("Give a directory or set CYCLONE_COLUMNAR_EXPORT_DIR.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        counts = columnar.export_dataset(
+            options["directory"],
+            lag=dt.timedelta(seconds=options["lag_seconds"]),
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Exported "
+                + ", ".join(f"{count} {name}" for name, count in counts.items())
+                + "."
+            )
+        )
@@ -0,0 +1,159 @@
+"""Bulk load archived cyclone tracks with PostgreSQL COPY."""
+
+import csv
+import datetime as dt
+import io
+import sys
+import time
+
+from apps.cyclones import partitions
+from apps.cyclones.cache import bump_data_version
+from apps.cyclones.geo import GEO_CELL_SQL
+from apps.cyclones.models import CYCLONE_STATE_SQL, Forecast, HistoricSnapshot
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+# Track kind -> (model, csv columns besides cyclone_name and region).
+TRACKS = {
+    "forecasts": (
+        Forecast,
+        ("forecast_time", "forecast_hr", "lat", "lng", "intensity"),
+    ),
+    "snapshots": (
+        HistoricSnapshot,
+        ("synoptic_time", "lat", "lng", "intensity"),
+    ),
+}
+CYCLONE_COLUMNS = ("cyclone_name", "region")
+STAGING_TABLE = "cyclones_track_staging"
+
+
+class Command(BaseCommand):
+    """Management command to backfill Forecast/HistoricSnapshot rows."""
+
+    help = (
+        "Stream a CSV of track points into a staging table with COPY and "
+        "merge it into the track tables, skipping rows that violate their "
+        "unique constraints. The CSV header names the columns: cyclone_name, "
+        "region and the track fields. The current state of the loaded "
+        "cyclones is refreshed with each batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(TRACKS))
+        parser.add_argument("path", help="CSV file, or - for stdin.")
+        parser.add_argument("--batch-size", type=int, default=50000)
+
+    def handle(self, *args, **options):
+        """Load the tracks batch by batch."""
+        model, columns = TRACKS[options["kind"]]
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+        csv_file = (
+            sys.stdin
+            if options["path"] == "-"
+            else open(options["path"], newline="", encoding="utf-8")
+        )
+        try:
+            reader = csv.reader(csv_file)
+            header = next(reader, None)
+            if header is None or set(header) != set(CYCLONE_COLUMNS + columns):
+                raise CommandError(
+                    f"Expected CSV columns {', '.join(CYCLONE_COLUMNS + columns)}."
+                )
+            self._load(model, columns, header, reader, batch_size)
+        finally:
+            if csv_file is not sys.stdin:
+                csv_file.close()
+
+    def _load(self, model, columns, header, reader, batch_size):
+        fields = [model._meta.get_field(column) for column in columns]
+        with connection.cursor() as cursor:
+            cursor.execute(self._staging_sql(fields))
+            try:
+                read = inserted = 0
+                started = time.monotonic()
+                while batch := [row for _, row in zip(range(batch_size), reader)]:
+                    inserted += self._merge(cursor, model, fields, header, batch)
+                    read += len(batch)
+                    self.stdout.write(
+                        f"{read} rows read, {inserted} inserted, "
+                        f"{read - inserted} skipped "
+                        f"({read / (time.monotonic() - started):.0f} rows/s)"
+                    )
+            finally:
+                cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        if inserted:
+            bump_data_version()
+        self.stdout.write(
+            self.style.SUCCESS(f"Loaded {inserted} {model.__name__} rows.")
+        )
+
+    @staticmethod
+    def _staging_sql(fields) -> str:
+        columns = ", ".join(
+            [f"{column} varchar(120) NOT NULL" for column in CYCLONE_COLUMNS]
+            + [f"{field.column} {field.db_type(connection)}" for field in fields]
+        )
+        return f"CREATE TEMP TABLE {STAGING_TABLE} ({columns})"
+
+    @staticmethod
+    def _merge(cursor, model, fields, header, batch) -> int:
+        """COPY one batch into staging and merge it, returns inserted rows."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cyclone_table = model._meta.get_field("cyclone").related_model._meta.db_table
+        track_columns = ", ".join(field.column for field in fields)
+        with transaction.atomic():
+            cursor.copy_expert(
+                f"COPY {STAGING_TABLE} ({', '.join(header)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            key = partitions.partition_key(model)
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', {key} AT TIME ZONE 'UTC') "
+                f"FROM {STAGING_TABLE}"
+            )
+            partitions.ensure_partitions_for(
+                model,
+                (
+                    month.replace(tzinfo=dt.timezone.utc)
+                    for (month,) in cursor.fetchall()
+                ),
+            )
+            cursor.execute(
+                f"INSERT INTO {cyclone_table} "
+                "(name, region, img_src, link_page, fingerprint) "
+                "SELECT DISTINCT ON (cyclone_name) cyclone_name, region, '', '', '' "
+                f"FROM {STAGING_TABLE} ON CONFLICT DO NOTHING"
+            )
+            cursor.execute(
+                f"INSERT INTO {model._meta.db_table} "
+                f"({track_columns}, cyclone_id, geo_cell, ingested_at) "
+                f"SELECT {', '.join('s.' + field.column for field in fields)}, c.id, "
+                f"{GEO_CELL_SQL.format(lat='s.lat', lng='s.lng')}, now() "
+                f"FROM {STAGING_TABLE} s JOIN {cyclone_table} c "
+                "ON c.name = s.cyclone_name "
+                f"ON CONFLICT ON CONSTRAINT {model._meta.constraints[0].name} "
+                "DO NOTHING"
+            )
+            inserted = cursor.rowcount
+            if model is Forecast:
+                cursor.execute(
+                    f"UPDATE {cyclone_table} c SET latest_forecast_time = s.latest "
+                    "FROM (SELECT cyclone_name, max(forecast_time) AS latest "
+                    f"FROM {STAGING_TABLE} GROUP BY cyclone_name) s "
+                    "WHERE c.name = s.cyclone_name AND ("
+                    "c.latest_forecast_time IS NULL "
+                    "OR c.latest_forecast_time < s.latest)"
+                )
+            cursor.execute(
+                CYCLONE_STATE_SQL.format(
+                    where=f"c.name IN (SELECT cyclone_name FROM {STAGING_TABLE})"
+                )
+            )
+            cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        return inserted
@@ -0,0 +1,46 @@
+"""Partition the track tables by month."""
+
+from apps.cyclones import partitions
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """Management command to convert and extend partitioned track tables."""
+
+    help = (
+        "Create the upcoming monthly partitions of partitioned track tables. "
+        "With --convert, first convert unpartitioned Forecast and "
+        "HistoricSnapshot tables into monthly range partitioned ones, "
+        "copying their rows under an exclusive lock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--convert", action="store_true")
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.CYCLONE_PARTITION_MONTHS_AHEAD,
+        )
+
+    def handle(self, *args, **options):
+        months_ahead = options["months_ahead"]
+        created = []
+        for model in partitions.track_models():
+            if partitions.is_partitioned(model):
+                continue
+            if not options["convert"]:
+                self.stdout.write(
+                    f"{model._meta.db_table} is not partitioned, "
+                    "use --convert to partition it."
+                )
+                continue
+            created += partitions.convert_to_partitioned(model, months_ahead)
+            self.stdout.write(f"Partitioned {model._meta.db_table}.")
+        created += partitions.ensure_upcoming_partitions(months_ahead)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(created)} partitions"
+                + (f": {', '.join(created)}." if created else ".")
+            )
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cyclones', '0002_auto_20201112_0643'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cyclone',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.7 on 2026-10-18 09:02
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_latest_forecast_time(apps, schema_editor):
+    Cyclone = apps.get_model('cyclones', 'Cyclone')
+    Forecast = apps.get_model('cyclones', 'Forecast')
+    Cyclone.objects.update(
+        latest_forecast_time=Subquery(
+            Forecast.objects.filter(cyclone=OuterRef('pk'))
+            .values('cyclone')
+            .annotate(latest=Max('forecast_time'))
+            .values('latest')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cyclones', '0003_cyclone_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cyclone',
+            name='latest_forecast_time',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.RunPython(
+            backfill_latest_forecast_time, migrations.RunPython.noop
+        ),
+    ]
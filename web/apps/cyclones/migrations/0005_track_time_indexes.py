@@ -0,0 +1,21 @@
+# Generated by Django 3.0.7 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cyclones', '0004_cyclone_latest_forecast_time'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forecast',
+            index=models.Index(fields=['cyclone', '-forecast_time', 'forecast_hr'], name='forecast_cyclone_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicsnapshot',
+            index=models.Index(fields=['cyclone', '-synoptic_time'], name='snapshot_cyclone_time_idx'),
+        ),
+    ]
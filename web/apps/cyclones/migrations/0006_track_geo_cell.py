@@ -0,0 +1,46 @@
+# Generated by Django 3.0.7 on 2026-10-18 09:01
+
+import apps.cyclones.models
+from django.db import migrations, models
+
+# Cell id of apps.cyclones.geo.geo_cell at the time of this migration.
+BACKFILL_SQL = (
+    'UPDATE {table} SET geo_cell = '
+    '((LEAST(GREATEST(floor(lat), -90), 89)::integer + 90) * 360 '
+    '+ floor(lng - 360 * floor((lng + 180) / 360))::integer + 180)'
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cyclones', '0005_track_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecast',
+            name='geo_cell',
+            field=apps.cyclones.models.GeoCellField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicsnapshot',
+            name='geo_cell',
+            field=apps.cyclones.models.GeoCellField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            BACKFILL_SQL.format(table='cyclones_forecast'), migrations.RunSQL.noop
+        ),
+        migrations.RunSQL(
+            BACKFILL_SQL.format(table='cyclones_historicsnapshot'),
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='forecast',
+            index=models.Index(fields=['geo_cell', 'cyclone', 'lat', 'lng'], name='forecast_geo_cell_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicsnapshot',
+            index=models.Index(fields=['geo_cell', 'cyclone', 'lat', 'lng'], name='snapshot_geo_cell_idx'),
+        ),
+    ]
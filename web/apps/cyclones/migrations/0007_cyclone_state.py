@@ -0,0 +1,86 @@
+# Generated by Django 3.0.7 on 2026-10-18 09:07
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+# apps.cyclones.models.CYCLONE_STATE_SQL at the time of this migration.
+BACKFILL_SQL = """
+INSERT INTO cyclones_cyclonestate (
+    cyclone_id, name, region, synoptic_time, lat, lng, intensity,
+    forecast_time, forecasts, snapshot_count, first_synoptic_time,
+    max_intensity, updated_at
+)
+SELECT
+    c.id, c.name, c.region, s.synoptic_time, s.lat, s.lng, s.intensity,
+    c.latest_forecast_time,
+    COALESCE(
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'forecast_hr', f.forecast_hr, 'lat', f.lat, 'lng', f.lng,
+                    'intensity', f.intensity
+                )
+                ORDER BY f.forecast_hr
+            )
+            FROM cyclones_forecast f
+            WHERE f.cyclone_id = c.id AND f.forecast_time = c.latest_forecast_time
+        ),
+        '[]'
+    ),
+    h.snapshot_count, h.first_synoptic_time, h.max_intensity, now()
+FROM cyclones_cyclone c
+LEFT JOIN LATERAL (
+    SELECT synoptic_time, lat, lng, intensity FROM cyclones_historicsnapshot
+    WHERE cyclone_id = c.id ORDER BY synoptic_time DESC LIMIT 1
+) s ON TRUE
+CROSS JOIN LATERAL (
+    SELECT count(*) AS snapshot_count, min(synoptic_time) AS first_synoptic_time,
+        max(intensity) AS max_intensity
+    FROM cyclones_historicsnapshot WHERE cyclone_id = c.id
+) h
+WHERE TRUE
+ON CONFLICT (cyclone_id) DO UPDATE SET
+    name = EXCLUDED.name, region = EXCLUDED.region,
+    synoptic_time = EXCLUDED.synoptic_time, lat = EXCLUDED.lat,
+    lng = EXCLUDED.lng, intensity = EXCLUDED.intensity,
+    forecast_time = EXCLUDED.forecast_time, forecasts = EXCLUDED.forecasts,
+    snapshot_count = EXCLUDED.snapshot_count,
+    first_synoptic_time = EXCLUDED.first_synoptic_time,
+    max_intensity = EXCLUDED.max_intensity, updated_at = EXCLUDED.updated_at
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cyclones', '0006_track_geo_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycloneState',
+            fields=[
+                ('cyclone', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='state', serialize=False, to='cyclones.Cyclone')),
+                ('name', models.CharField(max_length=120)),
+                ('region', models.CharField(max_length=120)),
+                ('synoptic_time', models.DateTimeField(null=True)),
+                ('lat', models.FloatField(null=True)),
+                ('lng', models.FloatField(null=True)),
+                ('intensity', models.IntegerField(null=True)),
+                ('forecast_time', models.DateTimeField(null=True)),
+                ('forecasts', django.contrib.postgres.fields.jsonb.JSONField(default=list)),
+                ('snapshot_count', models.IntegerField(default=0)),
+                ('first_synoptic_time', models.DateTimeField(null=True)),
+                ('max_intensity', models.IntegerField(null=True)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cyclonestate',
+            index=models.Index(fields=['forecast_time', 'cyclone'], name='state_forecast_time_idx'),
+        ),
+        migrations.RunSQL(
+            BACKFILL_SQL, migrations.RunSQL.noop
+        ),
+    ]
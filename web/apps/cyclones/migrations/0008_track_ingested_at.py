@@ -0,0 +1,34 @@
+# Generated by Django 3.0.7 on 2026-10-18 09:13
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cyclones', '0007_cyclone_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forecast',
+            name='ingested_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='historicsnapshot',
+            name='ingested_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='forecast',
+            index=models.Index(fields=['ingested_at'], name='forecast_ingested_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historicsnapshot',
+            index=models.Index(fields=['ingested_at'], name='snapshot_ingested_at_idx'),
+        ),
+    ]
@@ -1,10 +1,16 @@
 """Cyclone models."""
 
+import functools
+import hashlib
 import itertools
-from typing import List
+from typing import Dict, Iterable, List, NamedTuple, Optional
 
+from apps.cyclones import cache, geo, partitions, track
 from backend import utils
-from django.db import models
+from django.contrib.postgres.fields import JSONField
+from django.db import connection, connections, models, transaction
+from django.db.models import F
+from django.dispatch import Signal
 
 
 class Cyclone(models.Model):
@@ -12,6 +18,10 @@ class Cyclone(models.Model):
     region = models.CharField(blank=False, null=False, max_length=120)
     img_src = models.URLField(blank=True)
     link_page = models.URLField(blank=True)
+    # Digest of the last persisted forecast cycle and history tip.
+    fingerprint = models.CharField(blank=True, default="", max_length=64)
+    # Most recent Forecast.forecast_time, kept in step by the writers.
+    latest_forecast_time = models.DateTimeField(null=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -25,6 +35,98 @@ class Cyclone(models.Model):
         ]
 
 
+class IngestResult(NamedTuple):
+    """Outcome of a bulk ingest."""
+
+    inserted_ids: List[int]
+    total: int
+
+    @property
+    def inserted(self) -> int:
+        return len(self.inserted_ids)
+
+    @property
+    def skipped(self) -> int:
+        return self.total - len(self.inserted_ids)
+
+
+class TrackQuerySet(models.QuerySet):
+    """Queryset of track point models."""
+
+    def bulk_ingest(
+        self,
+        objs: Iterable[models.Model],
+        constraint: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> IngestResult:
+        """Insert objects, skipping those that violate a unique constraint.
+
+        One `INSERT ... ON CONFLICT ON CONSTRAINT ... DO NOTHING` statement
+        is issued per batch, duplicates within the batch included. The
+        monthly partitions of the rows are created first when the table is
+        partitioned.
+
+        Args:
+            objs(Iterable): Unsaved model instances.
+            constraint(str): Unique constraint name, defaults to the
+                model's first one.
+            batch_size(int): Rows per statement.
+        Returns:
+            IngestResult with the primary keys of the inserted rows.
+        """
+        opts = self.model._meta
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        constraint = constraint or opts.constraints[0].name
+        fields = [field for field in opts.concrete_fields if field != opts.pk]
+        row_sql = "(%s)" % ", ".join(["%s"] * len(fields))
+        sql = (
+            "INSERT INTO %s (%s) VALUES %%s "
+            "ON CONFLICT ON CONSTRAINT %s DO NOTHING RETURNING %s"
+        ) % (
+            quote_name(opts.db_table),
+            ", ".join(quote_name(field.column) for field in fields),
+            quote_name(constraint),
+            quote_name(opts.pk.column),
+        )
+        objs = list(objs)
+        key = opts.get_field(partitions.partition_key(self.model))
+        partitions.ensure_partitions_for(
+            self.model, (key.to_python(getattr(obj, key.attname)) for obj in objs)
+        )
+        inserted_ids = []
+        with connection.cursor() as cursor:
+            for start in range(0, len(objs), batch_size):
+                batch = objs[start : start + batch_size]
+                cursor.execute(
+                    sql % ", ".join([row_sql] * len(batch)),
+                    [
+                        field.get_db_prep_save(field.pre_save(obj, True), connection)
+                        for obj in batch
+                        for field in fields
+                    ],
+                )
+                inserted_ids += [row[0] for row in cursor.fetchall()]
+        return IngestResult(inserted_ids, len(objs))
+
+
+class GeoCellField(models.IntegerField):
+    """Grid cell of the instance's lat/lng, see `apps.cyclones.geo`.
+
+    Computed whenever the instance is written, bulk inserts included.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("null", True)
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        value = geo.geo_cell(model_instance.lat, model_instance.lng)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
 class Forecast(models.Model):
     forecast_hr = models.IntegerField(blank=False, default=0)
     lat = models.FloatField(blank=False, null=False)
@@ -34,6 +136,10 @@ class Forecast(models.Model):
     cyclone = models.ForeignKey(
         Cyclone, related_name="forecasts", null=True, on_delete=models.SET_NULL
     )
+    geo_cell = GeoCellField()
+    ingested_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TrackQuerySet.as_manager()
 
     class Meta:
         constraints = [
@@ -49,6 +155,20 @@ class Forecast(models.Model):
                 name="uniq_forecast_time_forecast_hr_cyclone_fkey",
             )
         ]
+        # Match the latest forecasts per cyclone and spatial access paths
+        # of the API, the latter answered from the index alone, and the
+        # incremental columnar export.
+        indexes = [
+            models.Index(
+                fields=["cyclone", "-forecast_time", "forecast_hr"],
+                name="forecast_cyclone_time_idx",
+            ),
+            models.Index(
+                fields=["geo_cell", "cyclone", "lat", "lng"],
+                name="forecast_geo_cell_idx",
+            ),
+            models.Index(fields=["ingested_at"], name="forecast_ingested_at_idx"),
+        ]
 
 
 class HistoricSnapshot(models.Model):
@@ -59,6 +179,10 @@ class HistoricSnapshot(models.Model):
     cyclone = models.ForeignKey(
         Cyclone, related_name="snapshots", null=True, on_delete=models.SET_NULL
     )
+    geo_cell = GeoCellField()
+    ingested_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TrackQuerySet.as_manager()
 
     class Meta:
         constraints = [
@@ -67,13 +191,159 @@ class HistoricSnapshot(models.Model):
                 name="uniq_synoptic_time_cyclone_fkey",
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["cyclone", "-synoptic_time"],
+                name="snapshot_cyclone_time_idx",
+            ),
+            models.Index(
+                fields=["geo_cell", "cyclone", "lat", "lng"],
+                name="snapshot_geo_cell_idx",
+            ),
+            models.Index(fields=["ingested_at"], name="snapshot_ingested_at_idx"),
+        ]
 
 
-def save_db(list_dict: List[dict]):
+class CycloneState(models.Model):
+    """Current state of a cyclone, maintained by the writers.
+
+    Holds the latest historic snapshot, the points of the latest forecast
+    cycle and a summary of the historic track, so the current state of
+    all cyclones is read from this table alone.
+    """
+
+    cyclone = models.OneToOneField(
+        Cyclone, primary_key=True, related_name="state", on_delete=models.CASCADE
+    )
+    name = models.CharField(max_length=120)
+    region = models.CharField(max_length=120)
+    # Latest historic snapshot.
+    synoptic_time = models.DateTimeField(null=True)
+    lat = models.FloatField(null=True)
+    lng = models.FloatField(null=True)
+    intensity = models.IntegerField(null=True)
+    # Latest forecast cycle, its points ordered by forecast hour.
+    forecast_time = models.DateTimeField(null=True)
+    forecasts = JSONField(default=list)
+    # Historic track summary.
+    snapshot_count = models.IntegerField(default=0)
+    first_synoptic_time = models.DateTimeField(null=True)
+    max_intensity = models.IntegerField(null=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["forecast_time", "cyclone"], name="state_forecast_time_idx"
+            )
+        ]
+
+
+# Upsert of the current state of the cyclones matching `{where}`, with
+# `c` the cyclone table.
+CYCLONE_STATE_SQL = """
+INSERT INTO cyclones_cyclonestate (
+    cyclone_id, name, region, synoptic_time, lat, lng, intensity,
+    forecast_time, forecasts, snapshot_count, first_synoptic_time,
+    max_intensity, updated_at
+)
+SELECT
+    c.id, c.name, c.region, s.synoptic_time, s.lat, s.lng, s.intensity,
+    c.latest_forecast_time,
+    COALESCE(
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'forecast_hr', f.forecast_hr, 'lat', f.lat, 'lng', f.lng,
+                    'intensity', f.intensity
+                )
+                ORDER BY f.forecast_hr
+            )
+            FROM cyclones_forecast f
+            WHERE f.cyclone_id = c.id AND f.forecast_time = c.latest_forecast_time
+        ),
+        '[]'
+    ),
+    h.snapshot_count, h.first_synoptic_time, h.max_intensity, now()
+FROM cyclones_cyclone c
+LEFT JOIN LATERAL (
+    SELECT synoptic_time, lat, lng, intensity FROM cyclones_historicsnapshot
+    WHERE cyclone_id = c.id ORDER BY synoptic_time DESC LIMIT 1
+) s ON TRUE
+CROSS JOIN LATERAL (
+    SELECT count(*) AS snapshot_count, min(synoptic_time) AS first_synoptic_time,
+        max(intensity) AS max_intensity
+    FROM cyclones_historicsnapshot WHERE cyclone_id = c.id
+) h
+WHERE {where}
+ON CONFLICT (cyclone_id) DO UPDATE SET
+    name = EXCLUDED.name, region = EXCLUDED.region,
+    synoptic_time = EXCLUDED.synoptic_time, lat = EXCLUDED.lat,
+    lng = EXCLUDED.lng, intensity = EXCLUDED.intensity,
+    forecast_time = EXCLUDED.forecast_time, forecasts = EXCLUDED.forecasts,
+    snapshot_count = EXCLUDED.snapshot_count,
+    first_synoptic_time = EXCLUDED.first_synoptic_time,
+    max_intensity = EXCLUDED.max_intensity, updated_at = EXCLUDED.updated_at
+"""
+
+
+def refresh_cyclone_states(cyclone_ids: Iterable[int]) -> int:
+    """Recompute the current state of cyclones from their tracks.
+
+    Args:
+        cyclone_ids(Iterable): Cyclone primary keys.
+    Returns:
+        Number of states written.
+    """
+    cyclone_ids = list(cyclone_ids)
+    if not cyclone_ids:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(CYCLONE_STATE_SQL.format(where="c.id = ANY(%s)"), [cyclone_ids])
+        return cursor.rowcount
+
+
+def storm_fingerprint(
+    forecast_time,
+    forecasts: Optional[List[track.ForecastPoint]],
+    snapshot: Optional[track.HistoryPoint],
+) -> str:
+    """Digest of what `save_db` persists for one storm.
+
+    Args:
+        forecast_time: Time of latest forecast.
+        forecasts(list): Forecast track points.
+        snapshot(HistoryPoint): Latest track history point.
+    Returns:
+        Hex digest.
+    """
+    if forecast_time is not None:
+        forecast_time = track.parse_time(forecast_time)
+    return hashlib.sha256(
+        repr((forecast_time, forecasts, snapshot)).encode("utf-8")
+    ).hexdigest()
+
+
+# Sent by `save_db` once committed, when it inserted track points, with
+# `inserted_ids`, track collection name to inserted primary keys.
+tracks_ingested = Signal()
+
+
+@transaction.atomic
+def save_db(list_dict: List[dict]) -> Dict[str, IngestResult]:
     """Batch saves cyclone data.
 
+    Storms whose fingerprint matches the stored one are skipped without
+    building any model. The others advance `Cyclone.latest_forecast_time`
+    and have their `CycloneState` refreshed in the same transaction.
+    Inserting any row bumps the cached data version and sends
+    `tracks_ingested` once committed.
+
     Args:
-        list_dict(list): List of cyclone data dictionary.
+        list_dict(list): List of cyclone data dictionary, with tracks in the
+            compact wire encoding of `apps.cyclones.track`.
+    Returns:
+        IngestResult of forecasts and snapshots.
     """
     cyclones = {}
     forecast_track = None
@@ -82,6 +352,7 @@ def save_db(list_dict: List[dict]):
     forecast_list = []
     snapshot_list = []
     all_cyclones = []
+    changed_cyclones = []
     for data in list_dict:
         if (
             "result" in data
@@ -101,26 +372,58 @@ def save_db(list_dict: List[dict]):
                 cyclone_dict = {
                     **cyclone_dict,
                     **{
-                        "forecasts": forecast_track,
+                        "forecasts": track.decode_track(
+                            forecast_track, track.ForecastPoint
+                        ),
                     },
                     **{"forecast_time": scraped_data["forecast_time"]},
                 }
             if (history_track := scraped_data["history_track"]) :
                 cyclone_dict = {
                     **cyclone_dict,
-                    **{"snapshots": history_track[0]},
+                    **{
+                        "snapshots": track.decode_track(
+                            history_track[:1], track.HistoryPoint
+                        )[0]
+                    },
                 }
+            if "forecast_time" in cyclone_dict:
+                cyclone.latest_forecast_time = track.parse_time(
+                    cyclone_dict["forecast_time"]
+                )
+            cyclone.fingerprint = storm_fingerprint(
+                cyclone_dict.get("forecast_time"),
+                cyclone_dict.get("forecasts"),
+                cyclone_dict.get("snapshots"),
+            )
             cyclones = {
                 **cyclones,
                 **{cyclone.name: cyclone_dict},
             }
-    existing_cyclones = utils.filter_existing_queryset(Cyclone, cyclones.keys(), "name")
-    all_cyclones += [existing_cyclones]
+    existing_cyclones = list(
+        utils.filter_existing_queryset(Cyclone, cyclones.keys(), "name")
+    )
+    for each_cyclone in existing_cyclones:
+        scraped_cyclone = cyclones[each_cyclone.name]["cyclone"]
+        if each_cyclone.fingerprint != scraped_cyclone.fingerprint:
+            each_cyclone.fingerprint = scraped_cyclone.fingerprint
+            each_cyclone.latest_forecast_time = max(
+                filter(
+                    None,
+                    (
+                        each_cyclone.latest_forecast_time,
+                        scraped_cyclone.latest_forecast_time,
+                    ),
+                ),
+                default=None,
+            )
+            changed_cyclones += [each_cyclone]
+    all_cyclones += [changed_cyclones]
     if (
         new_cyclones_dict := {
             ckey: cyclones[ckey]["cyclone"]
             for ckey in set(cyclones)
-            - set(existing_cyclones.values_list("name", flat=True))
+            - {each_cyclone.name for each_cyclone in existing_cyclones}
         }
     ) :
         new_cyclones = Cyclone.objects.bulk_create(new_cyclones_dict.values())
@@ -137,7 +440,7 @@ def save_db(list_dict: List[dict]):
                 forecast_list += [
                     Forecast(
                         **{
-                            **forecast_entry,
+                            **forecast_entry._asdict(),
                             **{"forecast_time": forecast_time},
                             **cyclone_fkey,
                         }
@@ -145,34 +448,63 @@ def save_db(list_dict: List[dict]):
                     for forecast_entry in forecasts
                 ]
             if (snapshots := cyclone_dict.get("snapshots")) :
-                snapshot_list += [HistoricSnapshot(**{**snapshots, **cyclone_fkey})]
-    if forecast_list:
-        # bulk create non duplicate entries.
-        non_dup_forecasts = set()
-        filtered_lazylists = filter(
-            utils.check_unique_constraint,
-            utils.filter_non_duplicate_entry(
-                forecast_list,
-                "forecast_hr",
-                "forecast_time",
-                "lat",
-                "lng",
-                "intensity",
-                "cyclone__id",
-                non_dup=non_dup_forecasts,
-            ),
+                snapshot_list += [
+                    HistoricSnapshot(**{**snapshots._asdict(), **cyclone_fkey})
+                ]
+    results = {
+        "forecasts": Forecast.objects.bulk_ingest(forecast_list),
+        "snapshots": HistoricSnapshot.objects.bulk_ingest(snapshot_list),
+    }
+    if changed_cyclones:
+        Cyclone.objects.bulk_update(
+            changed_cyclones, ["fingerprint", "latest_forecast_time"]
         )
-        Forecast.objects.bulk_create(filtered_lazylists)
-    if snapshot_list:
-        # bulk create non duplicate entries.
-        non_dup_snapshots = set()
-        filtered_lazylist = filter(
-            utils.check_unique_constraint,
-            utils.filter_non_duplicate_entry(
-                snapshot_list,
-                "synoptic_time",
-                "cyclone__id",
-                non_dup=non_dup_snapshots,
-            ),
+    refresh_cyclone_states(
+        each_cyclone.pk for each_cyclone in itertools.chain(*all_cyclones)
+    )
+    if any(result.inserted for result in results.values()):
+        transaction.on_commit(cache.bump_data_version)
+        transaction.on_commit(
+            functools.partial(
+                tracks_ingested.send,
+                sender=Cyclone,
+                inserted_ids={
+                    name: result.inserted_ids for name, result in results.items()
+                },
+            )
         )
-        HistoricSnapshot.objects.bulk_create(filtered_lazylist)
+    return results
+
+
+def prune_superseded_forecasts(
+    cutoff, batch_size: int = 5000, max_batches: Optional[int] = None
+) -> int:
+    """Compact forecast cycles superseded by a newer cycle of their cyclone.
+
+    Only the analysis point (forecast hour 0) of each superseded cycle
+    older than `cutoff` is kept. Rows are deleted in batches, each its own
+    short statement, so the track tables are never locked for long.
+
+    Args:
+        cutoff(datetime): Only cycles issued before it are compacted.
+        batch_size(int): Rows deleted per statement.
+        max_batches(int): Stop after that many batches, if given.
+    Returns:
+        Number of deleted forecasts.
+    """
+    superseded = Forecast.objects.filter(
+        forecast_time__lt=cutoff,
+        cyclone__latest_forecast_time__gt=F("forecast_time"),
+    ).exclude(forecast_hr=0)
+    deleted = batches = 0
+    while max_batches is None or batches < max_batches:
+        count, _ = Forecast.objects.filter(
+            pk__in=superseded.values("pk")[:batch_size]
+        ).delete()
+        deleted += count
+        batches += 1
+        if count < batch_size:
+            break
+    if deleted:
+        cache.bump_data_version()
+    return deleted
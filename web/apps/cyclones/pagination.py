@@ -0,0 +1,28 @@
+"""Pagination for cyclone views."""
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class CycloneCursorPagination(CursorPagination):
+    """Keyset pagination in the order of the paged list.
+
+    Views give that order as `cursor_ordering`, the cyclone primary key
+    otherwise. Its first field is the cursor position, read from the paged
+    `.values()` rows, ties are paged through by offset.
+    """
+
+    # The list pages `.values()` rows, which carry `id` but not `pk`.
+    ordering = "id"
+    page_size = settings.CYCLONE_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.CYCLONE_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "cursor_ordering", None) or self.ordering
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+    def is_requested(self, request) -> bool:
+        """Whether the client opted into paging."""
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
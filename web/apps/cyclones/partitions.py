@@ -0,0 +1,321 @@
+"""Optional monthly range partitioning of the track tables.
+
+Forecast and HistoricSnapshot tables can be converted in place into
+PostgreSQL tables partitioned by month on their time column. Constraint
+and index names are kept, so `ON CONFLICT ON CONSTRAINT` ingestion and
+later migrations see the same schema. The primary key becomes
+(id, <time column>), as partitioned tables require the partition key in
+every unique constraint. A DEFAULT partition takes the rows of months
+without a partition yet, e.g. backfilled seasons, and monthly partitions
+created later take over their rows.
+"""
+
+import datetime as dt
+import re
+from typing import Iterable, List, Optional
+
+from apps.cyclones import models
+from django.db import connection, transaction
+
+# Track model name -> partition key column.
+PARTITION_KEYS = {
+    "Forecast": "forecast_time",
+    "HistoricSnapshot": "synoptic_time",
+}
+# Per process state of the ingest path, see `ensure_partitions_for`: table
+# -> whether it is partitioned, and the monthly partitions known to exist.
+_partitioned_tables = {}
+_known_partitions = set()
+
+
+def track_models() -> list:
+    """Partitionable track models."""
+    return [getattr(models, name) for name in PARTITION_KEYS]
+
+
+def partition_key(model) -> str:
+    """Partition key column of a track model."""
+    return PARTITION_KEYS[model.__name__]
+
+
+def month_start(value: dt.datetime) -> dt.datetime:
+    """First instant of the UTC month of `value`."""
+    value = value.astimezone(dt.timezone.utc)
+    return dt.datetime(value.year, value.month, 1, tzinfo=dt.timezone.utc)
+
+
+def add_months(month: dt.datetime, months: int) -> dt.datetime:
+    """Month start `months` after `month`."""
+    year, month_index = divmod(month.month - 1 + months, 12)
+    return month.replace(year=month.year + year, month=month_index + 1)
+
+
+def partition_name(table: str, month: dt.datetime) -> str:
+    """Name of the partition of `table` holding `month`."""
+    return f"{table}_p{month:%Y_%m}"
+
+
+def default_partition_name(table: str) -> str:
+    """Name of the DEFAULT partition of `table`."""
+    return f"{table}_pdefault"
+
+
+def is_partitioned(model) -> bool:
+    """Whether the model's table is partitioned."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+            "WHERE partrelid = %s::regclass)",
+            [model._meta.db_table],
+        )
+        return cursor.fetchone()[0]
+
+
+def ensure_default_partition(model) -> List[str]:
+    """Create the DEFAULT partition of a partitioned track model if missing.
+
+    Returns:
+        Name of the partition created, if any.
+    """
+    table = model._meta.db_table
+    name = default_partition_name(table)
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NULL", [name])
+        if not cursor.fetchone()[0]:
+            return []
+        cursor.execute(
+            f"CREATE TABLE {quote_name(name)} PARTITION OF "
+            f"{quote_name(table)} DEFAULT"
+        )
+    return [name]
+
+
+def _create_partition(cursor, model, month: dt.datetime) -> str:
+    table = model._meta.db_table
+    key = partition_key(model)
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    quote_name = connection.ops.quote_name
+    bounds = [month, add_months(month, 1)]
+    cursor.execute("SELECT to_regclass(%s) IS NULL", [default])
+    if cursor.fetchone()[0]:
+        cursor.execute(
+            f"CREATE TABLE {quote_name(name)} PARTITION OF "
+            f"{quote_name(table)} FOR VALUES FROM (%s) TO (%s)",
+            bounds,
+        )
+        return name
+    # The month's rows already in the DEFAULT partition would fail creating
+    # its partition, they are moved into a new table attached as such.
+    cursor.execute(
+        f"CREATE TABLE {quote_name(name)} "
+        f"(LIKE {quote_name(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {quote_name(default)} "
+        f"WHERE {quote_name(key)} >= %s AND {quote_name(key)} < %s "
+        f"RETURNING *) INSERT INTO {quote_name(name)} SELECT * FROM moved",
+        bounds,
+    )
+    cursor.execute(
+        f"ALTER TABLE {quote_name(table)} ATTACH PARTITION {quote_name(name)} "
+        "FOR VALUES FROM (%s) TO (%s)",
+        bounds,
+    )
+    return name
+
+
+@transaction.atomic
+def ensure_partitions(
+    model, first_month: dt.datetime, last_month: dt.datetime
+) -> List[str]:
+    """Create the missing monthly partitions between two months.
+
+    Rows of those months held by the DEFAULT partition move to them.
+
+    Args:
+        model(Model): Partitioned track model.
+        first_month(datetime): First month start, inclusive.
+        last_month(datetime): Last month start, inclusive.
+    Returns:
+        Names of the partitions created.
+    """
+    table = model._meta.db_table
+    created = []
+    with connection.cursor() as cursor:
+        month = month_start(first_month)
+        while month <= last_month:
+            cursor.execute(
+                "SELECT to_regclass(%s) IS NULL", [partition_name(table, month)]
+            )
+            if cursor.fetchone()[0]:
+                created += [_create_partition(cursor, model, month)]
+            month = add_months(month, 1)
+    return created
+
+
+def clear_partition_cache() -> None:
+    """Forget the partitioning state cached by `ensure_partitions_for`."""
+    _partitioned_tables.clear()
+    _known_partitions.clear()
+
+
+def ensure_partitions_for(model, times: Iterable[dt.datetime]) -> List[str]:
+    """Create the monthly partitions of rows about to be inserted.
+
+    Does nothing unless the model's table is partitioned. Whether it is and
+    the partitions found are cached per process until
+    `ensure_upcoming_partitions` next runs, so repeated batches run no
+    catalog query. A stale cache only leaves rows in the DEFAULT partition.
+
+    Args:
+        model(Model): Track model.
+        times(Iterable): Partition key values of the rows.
+    Returns:
+        Names of the partitions created.
+    """
+    table = model._meta.db_table
+    months = [
+        month
+        for month in sorted({month_start(time) for time in times})
+        if partition_name(table, month) not in _known_partitions
+    ]
+    if not months:
+        return []
+    if table not in _partitioned_tables:
+        _partitioned_tables[table] = is_partitioned(model)
+    if not _partitioned_tables[table]:
+        return []
+    created = []
+    for month in months:
+        created += ensure_partitions(model, month, month)
+        _known_partitions.add(partition_name(table, month))
+    return created
+
+
+def ensure_upcoming_partitions(
+    months_ahead: int, now: Optional[dt.datetime] = None
+) -> List[str]:
+    """Create partitions up to `months_ahead` months for partitioned tables.
+
+    Args:
+        months_ahead(int): Months after the current one to cover.
+        now(datetime): Defaults to the current time.
+    Returns:
+        Names of the partitions created.
+    """
+    # Also picks up a conversion done by another process.
+    clear_partition_cache()
+    current = month_start(now or dt.datetime.now(tz=dt.timezone.utc))
+    created = []
+    for model in track_models():
+        if is_partitioned(model):
+            created += ensure_default_partition(model)
+            created += ensure_partitions(
+                model, current, add_months(current, months_ahead)
+            )
+    return created
+
+
+@transaction.atomic
+def convert_to_partitioned(
+    model, months_ahead: int, now: Optional[dt.datetime] = None
+) -> List[str]:
+    """Convert a track table into a monthly range partitioned table.
+
+    The table is renamed aside, an identically named partitioned table is
+    created with the same columns, constraints and indexes, rows are
+    copied into monthly partitions spanning the data and the old table is
+    dropped, all in one transaction. A DEFAULT partition catches rows of
+    months without a partition.
+
+    Args:
+        model(Model): Track model.
+        months_ahead(int): Months after the current one to cover.
+        now(datetime): Defaults to the current time.
+    Returns:
+        Names of the partitions created.
+    """
+    clear_partition_cache()
+    table = model._meta.db_table
+    key = partition_key(model)
+    old_table = f"{table}_unpartitioned"
+    quote_name = connection.ops.quote_name
+    pk_column = model._meta.pk.column
+    with connection.cursor() as cursor:
+        # Deferred foreign key checks would block altering the table.
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"LOCK TABLE {quote_name(table)} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) "
+            "FROM pg_constraint WHERE conrelid = %s::regclass "
+            "ORDER BY contype = 'f'",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint "
+            "WHERE conrelid = %s::regclass)",
+            [table, table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            f"SELECT pg_get_serial_sequence(%s, %s), min({quote_name(key)}), "
+            f"max({quote_name(key)}) FROM {quote_name(table)}",
+            [table, pk_column],
+        )
+        sequence, first_time, last_time = cursor.fetchone()
+        # Free the names for the partitioned table.
+        cursor.execute(
+            f"ALTER TABLE {quote_name(table)} RENAME TO {quote_name(old_table)}"
+        )
+        for name, _, _ in reversed(constraints):
+            cursor.execute(
+                f"ALTER TABLE {quote_name(old_table)} "
+                f"DROP CONSTRAINT {quote_name(name)}"
+            )
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX {quote_name(name)}")
+        cursor.execute(
+            f"CREATE TABLE {quote_name(table)} "
+            f"(LIKE {quote_name(old_table)} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE ({quote_name(key)})"
+        )
+        if sequence:
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence} OWNED BY "
+                f"{quote_name(table)}.{quote_name(pk_column)}"
+            )
+        for name, contype, definition in constraints:
+            if contype == "p":
+                definition = (
+                    f"PRIMARY KEY ({quote_name(pk_column)}, {quote_name(key)})"
+                )
+            cursor.execute(
+                f"ALTER TABLE {quote_name(table)} "
+                f"ADD CONSTRAINT {quote_name(name)} {definition}"
+            )
+        for _, definition in indexes:
+            cursor.execute(
+                re.sub(
+                    r" ON (ONLY )?\S+ USING ",
+                    f" ON {quote_name(table)} USING ",
+                    definition,
+                    count=1,
+                )
+            )
+    current = month_start(now or dt.datetime.now(tz=dt.timezone.utc))
+    first_month = min(month_start(first_time), current) if first_time else current
+    last_month = max(month_start(last_time), current) if last_time else current
+    created = ensure_default_partition(model)
+    created += ensure_partitions(
+        model, first_month, add_months(last_month, months_ahead)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote_name(table)} SELECT * FROM {quote_name(old_table)}"
+        )
+        cursor.execute(f"DROP TABLE {quote_name(old_table)}")
+    return created
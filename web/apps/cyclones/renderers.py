@@ -0,0 +1,79 @@
+"""Renderers for cyclone views."""
+
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Responses built by `CycloneValuesSerializer` hold plain python values
+# only, so the C encoder needs no `default` hook.
+COMPACT_ENCODER = json.JSONEncoder(
+    ensure_ascii=False, allow_nan=False, separators=(",", ":")
+)
+
+
+def encode_compact(data) -> bytes:
+    """Compact UTF-8 JSON of `data`, with orjson when it is installed.
+
+    Values orjson does not serialize the way `JSONRenderer` does, such as
+    datetimes and decimals, go through DRF's encoder.
+
+    Raises:
+        TypeError: `data` holds a value neither encoder knows.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            data,
+            default=JSONEncoder().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+    return COMPACT_ENCODER.encode(data).encode("utf-8")
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Compact JSON renderer encoding with orjson when it is installed.
+
+    Falls back to `JSONRenderer` when indentation is asked for or the data
+    holds values the encoders do not know.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if data is None or indent:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = encode_compact(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escapes as JSONRenderer, these are invalid in javascript.
+        return content.replace("\u2028".encode(), b"\\u2028").replace(
+            "\u2029".encode(), b"\\u2029"
+        )
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON.
+
+    Exports stream their body themselves, see `apps.cyclones.export`, this
+    renders the other responses, such as errors, as a single line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return (COMPACT_ENCODER.encode(data) + "\n").encode("utf-8")
+
+
+class GeoJSONRenderer(JSONRenderer):
+    """GeoJSON, rendering non-streamed responses as plain JSON."""
+
+    media_type = "application/geo+json"
+    format = "geojson"
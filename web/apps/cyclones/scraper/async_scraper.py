@@ -0,0 +1,142 @@
+"""Asyncio crawl engine for active cyclones.
+
+Drop-in alternative to `scraper.scrape_page`: the basin index and every
+storm page are fetched concurrently on one event loop while parsing and
+dispatch run on a small thread pool, producing the same result dicts.
+"""
+
+import asyncio
+from concurrent import futures
+from typing import Callable, Optional, Tuple
+
+import aiohttp
+from apps.cyclones.scraper import scraper
+from django.conf import settings
+
+
+async def fetch_page(
+    session: aiohttp.ClientSession,
+    url: str,
+    page_cache: Optional[scraper.PageCache] = None,
+) -> Optional[bytes]:
+    """Fetch a page, conditionally if a page cache is given.
+
+    Args:
+        session(aiohttp.ClientSession): Pooled http session.
+        url(str): Page url.
+        page_cache(PageCache): Validators and digests of previous fetches.
+    Returns:
+        Page body or None if the page is unchanged since the last fetch. A
+        changed page is only stored in the cache by `PageCache.commit`.
+    """
+    headers = page_cache.request_headers(url) if page_cache is not None else {}
+    async with session.get(url, headers=headers) as response:
+        if response.status == 304:
+            return None
+        response.raise_for_status()
+        body = await response.read()
+    if page_cache is not None and not page_cache.check(url, response.headers, body):
+        return None
+    return body
+
+
+def _parse_and_dispatch(
+    tag_attrs: Tuple[str], cyclone_page: bytes, fetch_result_cb: Callable
+):
+    """Parse a cyclone page and hand the result to the callback."""
+    fetch_result_cb(scraper.parse_cyclone_page(tag_attrs, cyclone_page))
+
+
+async def scrape_storm(
+    session: aiohttp.ClientSession,
+    executor: futures.Executor,
+    tag_attrs: Tuple[str],
+    fetch_result_cb: Callable,
+    page_cache: Optional[scraper.PageCache] = None,
+):
+    """Fetch one storm page on the loop and parse it off the loop.
+
+    Args:
+        session(aiohttp.ClientSession): Pooled http session.
+        executor(futures.Executor): Pool running parsing and dispatch.
+        tag_attrs(Tuple[str]): Storm attributes as returned by `scrape_tag`.
+        fetch_result_cb(Callable): A callback task scheduler.
+        page_cache(PageCache): If given, skip unchanged pages.
+    """
+    link = tag_attrs[-1]
+    cyclone_page = await fetch_page(session, link, page_cache)
+    if cyclone_page is None:
+        settings.LOGGER.info(f"Unchanged cyclone page {link}")
+        return
+    await asyncio.get_running_loop().run_in_executor(
+        executor, _parse_and_dispatch, tag_attrs, cyclone_page, fetch_result_cb
+    )
+    if page_cache is not None:
+        page_cache.commit(link)
+
+
+def _basin_storms(page: bytes):
+    """Storm attributes of every storm listed on the basin index."""
+    return [scraper.scrape_tag(tag) for tag in scraper.basin_storm_tags(page)]
+
+
+async def crawl(
+    fetch_result_cb: Callable,
+    conditional: bool = False,
+    max_workers: Optional[int] = None,
+    url: Optional[str] = None,
+):
+    """Crawl the basin index and all storm pages on the running loop.
+
+    Args:
+        fetch_result_cb(Callable): A callback task scheduler.
+        conditional(bool): Skip storm pages unchanged since the last crawl.
+        max_workers(int): Parser pool size, defaults to
+            CYCLONE_SCRAPER_WORKERS.
+        url(str): Basin index url, defaults to `scraper.URL`.
+    """
+    page_cache = scraper.PAGE_CACHE if conditional else None
+    connect_timeout, read_timeout = settings.CYCLONE_SCRAPER_TIMEOUT
+    connector = aiohttp.TCPConnector(
+        limit_per_host=settings.CYCLONE_SCRAPER_HOST_CONNECTIONS
+    )
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=connect_timeout, sock_read=read_timeout
+    )
+    loop = asyncio.get_running_loop()
+    with futures.ThreadPoolExecutor(
+        max_workers=max_workers or settings.CYCLONE_SCRAPER_WORKERS,
+        thread_name_prefix="cyclone-parser",
+    ) as executor:
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            page = await fetch_page(session, url or scraper.URL)
+            storms = await loop.run_in_executor(executor, _basin_storms, page)
+            results = await asyncio.gather(
+                *(
+                    scrape_storm(
+                        session, executor, tag_attrs, fetch_result_cb, page_cache
+                    )
+                    for tag_attrs in storms
+                ),
+                return_exceptions=True,
+            )
+    for tag_attrs, error in zip(storms, results):
+        if error is not None:
+            settings.LOGGER.error(f"ERRORed on link {tag_attrs[-1]}: {error!r}")
+
+
+def scrape_page(
+    fetch_result_cb: Callable,
+    conditional: bool = False,
+    max_workers: Optional[int] = None,
+):
+    """Blocking entry point with the signature of `scraper.scrape_page`.
+
+    Args:
+        fetch_result_cb(Callable): A callback task scheduler.
+        conditional(bool): Skip storm pages unchanged since the last crawl.
+        max_workers(int): Parser pool size.
+    """
+    asyncio.run(crawl(fetch_result_cb, conditional, max_workers))
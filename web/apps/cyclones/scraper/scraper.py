@@ -1,17 +1,21 @@
 """Scraper function for active cyclones."""
 
+import datetime as dt
 import functools
-import queue
+import hashlib
+import io
 import re
 import threading
-from typing import Callable, Dict, Tuple, Generator
+from concurrent import futures
+from typing import Callable, Dict, List, Optional, Tuple, Generator
 
 import requests
-import scraperwiki
+from apps.cyclones import track
 from bs4 import BeautifulSoup, SoupStrainer
 from dateutil import parser as dateparser
 from dateutil.tz import gettz
 from django.conf import settings
+from lxml import etree
 
 URL = "https://rammb-data.cira.colostate.edu/tc_realtime/index.asp"
 SITE_URI, _ = requests.urllib3.util.parse_url(URL).url.rsplit("/", 1)
@@ -26,62 +30,357 @@ TZINFOS = {"CST": gettz("America/Chicago")}
 FORECAST_HEADER = ("forecast_hr", "lat", "lng", "intensity")
 HISTORY_HEADER = ("synoptic_time", "lat", "lng", "intensity")
 
+PRODUCT_WRAPPER_CLASS = "text_product_wrapper"
 
-def worker(qthread: queue.Queue):
-    """Thread safe worker queue.
+
+class PageCache:
+    """Thread safe store of per-URL HTTP validators and body digests.
+
+    Backs the conditional crawl mode: `request_headers` turns the stored
+    ETag/Last-Modified of a page into conditional request headers and
+    `check` tells whether a freshly fetched body differs from the last one.
+    A changed page is only stored by `commit`, once it has been parsed and
+    dispatched, so a page failing either is processed again next crawl.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+        self._pending: Dict[str, Tuple[Optional[str], Optional[str], str]] = {}
+
+    def request_headers(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for a previously seen url.
+
+        Args:
+            url(str): Page url.
+        Returns:
+            Dictionary of `If-None-Match`/`If-Modified-Since` headers.
+        """
+        with self._lock:
+            etag, last_modified, _ = self._entries.get(url, (None, None, None))
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def check(self, url: str, headers: dict, body: bytes) -> bool:
+        """Compare a fetched page with the stored one.
+
+        Validators of an unchanged page are stored right away, those of a
+        changed page are held until `commit`.
+
+        Args:
+            url(str): Page url.
+            headers(dict): Response headers.
+            body(bytes): Response body.
+        Returns:
+            bool, True if the body changed since the last committed fetch.
+        """
+        entry = (
+            headers.get("ETag"),
+            headers.get("Last-Modified"),
+            hashlib.sha256(body).hexdigest(),
+        )
+        with self._lock:
+            _, _, last_digest = self._entries.get(url, (None, None, None))
+            if entry[2] == last_digest:
+                self._entries[url] = entry
+                return False
+            self._pending[url] = entry
+        return True
+
+    def commit(self, url: str) -> None:
+        """Store the page last found changed by `check`, once processed."""
+        with self._lock:
+            if (entry := self._pending.pop(url, None)) is not None:
+                self._entries[url] = entry
+
+    def clear(self):
+        """Forget every stored page."""
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+
+# Validators survive between beat ticks for the lifetime of the worker.
+PAGE_CACHE = PageCache()
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process wide keep-alive session pooled to the rammb host.
+
+    Returns:
+        requests.Session shared by every scraper thread.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            session.mount(
+                HOST_URI,
+                requests.adapters.HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.CYCLONE_SCRAPER_WORKERS,
+                ),
+            )
+            _SESSION = session
+    return _SESSION
+
+
+def fetch_page(
+    url: str,
+    session: requests.Session,
+    page_cache: Optional[PageCache] = None,
+) -> Optional[bytes]:
+    """Fetch a page, conditionally if a page cache is given.
 
     Args:
-        qthread: queue.Queue, thread safe FIFO queue.
+        url(str): Page url.
+        session(requests.Session): Pooled http session.
+        page_cache(PageCache): Validators and digests of previous fetches.
+    Returns:
+        Page body or None if the page is unchanged since the last fetch. A
+        changed page is only stored in the cache by `PageCache.commit`.
     """
-    while thread := qthread.get():
-        settings.LOGGER.info(f"**Running thread** {thread}")
-        qthread.task_done()
+    headers = page_cache.request_headers(url) if page_cache is not None else {}
+    response = session.get(
+        url, headers=headers, timeout=settings.CYCLONE_SCRAPER_TIMEOUT
+    )
+    if response.status_code == requests.codes.not_modified:
+        return None
+    response.raise_for_status()
+    if page_cache is not None and not page_cache.check(
+        url, response.headers, response.content
+    ):
+        return None
+    return response.content
 
 
-def scrape_page(fetch_result_cb: Callable):
+def scrape_page(
+    fetch_result_cb: Callable,
+    conditional: bool = False,
+    max_workers: Optional[int] = None,
+):
     """Multi-threaded scraper.
 
+    Storm pages are scraped on a bounded thread pool; returns once every
+    page has been fetched, parsed and dispatched.
+
     Args:
         fetch_result_cb(Callable): A callback task scheduler.
+        conditional(bool): Skip storm pages unchanged since the last crawl.
+        max_workers(int): Pool size, defaults to CYCLONE_SCRAPER_WORKERS.
+    """
+    session = get_session()
+    page = fetch_page(URL, session)
+    page_cache = PAGE_CACHE if conditional else None
+
+    with futures.ThreadPoolExecutor(
+        max_workers=max_workers or settings.CYCLONE_SCRAPER_WORKERS,
+        thread_name_prefix="cyclone-scraper",
+    ) as executor:
+        jobs = {
+            executor.submit(
+                scrape_data,
+                tag,
+                fetch_result_cb,
+                page_cache=page_cache,
+                session=session,
+            ): tag
+            for tag in basin_storm_tags(page)
+        }
+        for job in futures.as_completed(jobs):
+            if (error := job.exception()) is not None:
+                settings.LOGGER.error(f"ERRORed on tag {jobs[job]}: {error!r}")
+
+
+def basin_storm_tags(page: bytes) -> List[BeautifulSoup]:
+    """Parse the storm image tags out of the basin index page.
+
+    Args:
+        page(bytes): Basin index page.
+    Returns:
+        List of BeautifulSoup img tags, one per active storm.
     """
-    page = scraperwiki.scrape(URL)
-    qthread = queue.Queue(maxsize=20)
     soup = BeautifulSoup(
         page,
         features="lxml",
         parse_only=SoupStrainer("div", attrs={"class": "basin_storms"}),
     )
-
-    t = threading.Thread(target=worker, args=(qthread,))
-    t.start()
-
-    for tag in soup.select("div>ul>li>a>img"):
-        t = threading.Thread(
-            target=scrape_data,
-            args=(
-                tag,
-                fetch_result_cb,
-            ),
-        )
-        qthread.put(t)
-        t.start()
-    qthread.join()
+    return soup.select("div>ul>li>a>img")
 
 
-def scrape_data(bs4_tag: BeautifulSoup, fetch_result_cb: Callable):
+def scrape_data(
+    bs4_tag: BeautifulSoup,
+    fetch_result_cb: Callable,
+    page_cache: Optional[PageCache] = None,
+    session: Optional[requests.Session] = None,
+):
     """Scraper to parse cyclone page.
 
     Args:
         bs4_tag(BeautifulSoup): BeautifulSoup DOM tag.
         fetch_result_cb(Callable): An async celery callback to proces data.
+        page_cache(PageCache): If given, fetch conditionally and skip
+            parsing and dispatch of unchanged pages.
+        session(requests.Session): Pooled http session, defaults to the
+            process wide one.
+    """
+    tag_attrs = scrape_tag(bs4_tag)
+    link = tag_attrs[-1]
+    cyclone_page = fetch_page(link, session or get_session(), page_cache)
+    if cyclone_page is None:
+        settings.LOGGER.info(f"Unchanged cyclone page {link}")
+        return
+    fetch_result_cb(parse_cyclone_page(tag_attrs, cyclone_page))
+    if page_cache is not None:
+        page_cache.commit(link)
+
+
+def _in_product_wrapper(element: etree.ElementBase) -> bool:
+    """Whether an element sits inside a `text_product_wrapper` div."""
+    return any(
+        PRODUCT_WRAPPER_CLASS in (div.get("class") or "").split()
+        for div in element.iterancestors("div")
+    )
+
+
+def table_rows(
+    strings: List[str], row_count: int, width: int = 4
+) -> List[Tuple[str, ...]]:
+    """Slice a table's strings into row tuples, skipping the header row.
+
+    Mirrors `tbl_to_sliced_dicts(strings, width, width, row_count, header)`.
+
+    Args:
+        strings(List[str]): Stripped strings of the table.
+        row_count(int): Number of `tr` in the table.
+        width(int): Number of columns.
+    Returns:
+        List of row tuples.
+    """
+    end = min(len(strings), width * row_count)
+    return [tuple(strings[i : min(i + width, end)]) for i in range(width, end, width)]
+
+
+def extract_product(
+    cyclone_page: bytes,
+) -> Tuple[Optional[str], List[List[Tuple[str, ...]]]]:
+    """Single pass lxml extraction of the text product of a cyclone page.
+
+    Args:
+        cyclone_page(bytes): Cyclone page body.
+    Returns:
+        Text of the first product `h4` (or None) and the rows of every
+        product table.
+    """
+    heading = None
+    tables = []
+    for _, element in etree.iterparse(
+        io.BytesIO(cyclone_page), events=("end",), tag=("h4", "table"), html=True
+    ):
+        if not _in_product_wrapper(element):
+            continue
+        if element.tag == "h4":
+            if heading is None:
+                heading = "".join(element.xpath(".//text()"))
+            continue
+        strings = [s for s in map(str.strip, element.xpath(".//text()")) if s]
+        tables += [table_rows(strings, sum(1 for _ in element.iter("tr")))]
+        element.clear()
+    return heading, tables
+
+
+def cyclone_result(
+    tag_attrs: Tuple[str],
+    forecast_time: Optional[dt.datetime],
+    forecast_rows: Optional[List[Tuple[str, ...]]],
+    history_rows: Optional[List[Tuple[str, ...]]],
+) -> dict:
+    """Build the result handed to `fetch_result_cb`.
+
+    Table rows are parsed into typed track points once, here, and travel
+    in their compact wire encoding.
+
+    Args:
+        tag_attrs(Tuple[str]): Storm attributes as returned by `scrape_tag`.
+        forecast_time(datetime): Time of latest forecast.
+        forecast_rows(list): Forecast table rows.
+        history_rows(list): Track history table rows.
+    Returns:
+        Scraped cyclone dictionary.
+    """
+    img_src, cyclone_heading, region, cyclone_name, link = tag_attrs
+    return {
+        "region": region,
+        "img_src": img_src,
+        "cyclone_name": f"{cyclone_heading}-{cyclone_name}",
+        "link": link,
+        "forecast_time": forecast_time,
+        "forecast_track": (
+            track.encode_track(track.parse_rows(forecast_rows, track.ForecastPoint))
+            if forecast_rows is not None
+            else None
+        ),
+        "history_track": (
+            track.encode_track(track.parse_rows(history_rows, track.HistoryPoint))
+            if history_rows is not None
+            else None
+        ),
+    }
+
+
+def parse_cyclone_page(tag_attrs: Tuple[str], cyclone_page: bytes) -> dict:
+    """Parse a cyclone page into the result handed to `fetch_result_cb`.
+
+    Args:
+        tag_attrs(Tuple[str]): Storm attributes as returned by `scrape_tag`.
+        cyclone_page(bytes): Cyclone page body.
+    Returns:
+        Scraped cyclone dictionary.
+    """
+    forecast_rows = None
+    history_rows = None
+    forecast_time = None
+
+    forecast_heading, tables = extract_product(cyclone_page)
+    if forecast_heading is not None:
+        forecast_time, _ = dateparser.parse(
+            forecast_heading,
+            fuzzy_with_tokens=True,
+            tzinfos=TZINFOS,
+        )
+        forecast_time = forecast_time.replace(tzinfo=TZINFOS["CST"])
+
+    if tables and len(tables) == 2:
+        forecast_rows, history_rows = tables
+    elif tables and forecast_heading is not None:
+        [forecast_rows] = tables
+    elif tables and forecast_heading is None:
+        [history_rows] = tables
+
+    return cyclone_result(tag_attrs, forecast_time, forecast_rows, history_rows)
+
+
+def parse_cyclone_page_soup(tag_attrs: Tuple[str], cyclone_page: bytes) -> dict:
+    """BeautifulSoup reference parser of `parse_cyclone_page`.
+
+    Args:
+        tag_attrs(Tuple[str]): Storm attributes as returned by `scrape_tag`.
+        cyclone_page(bytes): Cyclone page body.
+    Returns:
+        Scraped cyclone dictionary.
     """
     forecast_tbl = None
     track_history_tbl = None
     forecast_time = None
 
-    img_src, cyclone_heading, region, cyclone_name, link = scrape_tag(bs4_tag)
-    cyclone_page = scraperwiki.scrape(link)
-
+    link = tag_attrs[-1]
     data_res = BeautifulSoup(
         cyclone_page,
         features="lxml",
@@ -133,16 +432,15 @@ def scrape_data(bs4_tag: BeautifulSoup, fetch_result_cb: Callable):
         if track_history_tbl
         else None
     )
-    fetch_result_cb(
-        {
-            "region": region,
-            "img_src": img_src,
-            "cyclone_name": f"{cyclone_heading}-{cyclone_name}",
-            "link": link,
-            "forecast_time": forecast_time,
-            "forecast_track": forecast_data,
-            "history_track": history_data,
-        }
+    return cyclone_result(
+        tag_attrs,
+        forecast_time,
+        [tuple(row.values()) for row in forecast_data]
+        if forecast_data is not None
+        else None,
+        [tuple(row.values()) for row in history_data]
+        if history_data is not None
+        else None,
     )
 
 
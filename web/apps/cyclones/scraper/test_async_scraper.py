@@ -0,0 +1,111 @@
+"""Async crawl engine tests against a local HTTP stub."""
+
+import http.server
+import threading
+from unittest import mock
+
+from apps.cyclones.scraper import async_scraper, scraper
+from apps.cyclones.scraper.test_scraper import (
+    HTML_FILE,
+    MULTIPLE_BASINS_HTML_FILE,
+)
+from django.conf import settings
+from django.test import TestCase
+
+ROUTES = {
+    "/tc_realtime/index.asp": MULTIPLE_BASINS_HTML_FILE,
+    "/tc_realtime/storm.asp": HTML_FILE,
+}
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the rammb fixtures with an ETag per fixture."""
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path not in ROUTES:
+            self.send_error(404)
+            return
+        etag = f'"{path}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        with open(ROUTES[path], "rb") as html_f:
+            body = html_f.read()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class AsyncScraperTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever)
+        cls.server_thread.start()
+        cls.site_uri = "http://127.0.0.1:%d/tc_realtime" % cls.server.server_port
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.server_thread.join()
+        super().tearDownClass()
+
+    def setUp(self):
+        for name, value in (
+            ("URL", f"{self.site_uri}/index.asp"),
+            ("SITE_URI", self.site_uri),
+            ("HOST_URI", self.site_uri),
+        ):
+            patcher = mock.patch.object(scraper, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(scraper, "PAGE_CACHE", scraper.PageCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _by_name(results):
+        return sorted(results, key=lambda result: result["cyclone_name"])
+
+    def test_results_match_threaded_engine(self):
+        threaded, asynced = [], []
+        with mock.patch.object(scraper, "_SESSION", None):
+            scraper.scrape_page(threaded.append)
+        async_scraper.scrape_page(asynced.append)
+        self.assertEqual(len(asynced), 3)
+        self.assertListEqual(self._by_name(threaded), self._by_name(asynced))
+
+    def test_conditional_crawl_skips_unchanged_pages(self):
+        results = []
+        async_scraper.scrape_page(results.append, conditional=True)
+        async_scraper.scrape_page(results.append, conditional=True)
+        self.assertEqual(len(results), 3)
+
+    def test_conditional_crawl_retries_failed_dispatch(self):
+        results = []
+
+        def fail_once(result):
+            if result["cyclone_name"] == failing and not failed:
+                failed.append(result)
+                raise RuntimeError("dispatch failed")
+            results.append(result)
+
+        failed = []
+        async_scraper.scrape_page(results.append)
+        failing = results[0]["cyclone_name"]
+        results.clear()
+        with self.assertLogs(settings.LOGGER, "ERROR"):
+            async_scraper.scrape_page(fail_once, conditional=True)
+        self.assertEqual(len(results), 2)
+        results.clear()
+        async_scraper.scrape_page(fail_once, conditional=True)
+        self.assertEqual([result["cyclone_name"] for result in results], [failing])
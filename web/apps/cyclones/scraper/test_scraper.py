@@ -23,33 +23,14 @@ TEXT = [
 ]
 HEADERS = ("c1", "c2")
 
+# Compact wire encoding of the fixture tracks.
 FORECAST_TRACK = [
-    {
-        "forecast_hr": "0",
-        "lat": "24.5",
-        "lng": "275.8",
-        "intensity": "60",
-    },
-    {
-        "forecast_hr": "12",
-        "lat": "26.4",
-        "lng": "276.1",
-        "intensity": "65",
-    },
+    [0, 24.5, 275.8, 60],
+    [12, 26.4, 276.1, 65],
 ]
 HISTORY_TRACK = [
-    {
-        "synoptic_time": "2020-11-11 12:00",
-        "lat": "25.8",
-        "lng": "-83.8",
-        "intensity": "65",
-    },
-    {
-        "synoptic_time": "2020-11-11 06:00",
-        "lat": "24.5",
-        "lng": "-84.2",
-        "intensity": "60",
-    },
+    [1605096000, 25.8, -83.8, 65],
+    [1605074400, 24.5, -84.2, 60],
 ]
 
 
@@ -58,6 +39,17 @@ def string_slice_generator(text):
         yield line
 
 
+def mock_session(body: str, status_code: int = 200, headers: dict = None):
+    """A pooled session mock answering every GET with `body`."""
+    response = mock.MagicMock(name="response")
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.content = body.encode("utf-8")
+    session = mock.MagicMock(name="session")
+    session.get.return_value = response
+    return session
+
+
 class MockPatcherTestCase(TestCase):
     def _mock_patch_cleanup(
         self, mock_object: object, module: str, **kwargs
@@ -115,12 +107,55 @@ class ScraperSlicedTblTest(TestCase):
         )
 
 
+class ParserDifferentialTest(TestCase):
+    """The lxml fast path must match the BeautifulSoup reference parser."""
+
+    TAG_ATTRS = ("img", "Tropical Storm ETA", "Atlantic", "AL292020", "link")
+
+    def setUp(self):
+        with open(HTML_FILE, encoding="utf-8") as html_f:
+            self.html_body = html_f.read()
+
+    def _assert_same_parse(self, html_body: str):
+        page = html_body.encode("utf-8")
+        expected = scraper.parse_cyclone_page_soup(self.TAG_ATTRS, page)
+        result = scraper.parse_cyclone_page(self.TAG_ATTRS, page)
+        self.assertEqual(expected, result, "Should be {} got {}".format(expected, result))
+
+    def test_fixture(self):
+        self._assert_same_parse(self.html_body)
+
+    def test_history_only(self):
+        start = self.html_body.index("<h4>")
+        end = self.html_body.index("</table>") + len("</table>")
+        self._assert_same_parse(self.html_body[:start] + self.html_body[end:])
+
+    def test_markup_outside_product_wrapper(self):
+        self._assert_same_parse(
+            self.html_body.replace(
+                "<body>",
+                "<body><h4>Updated 2019-01-01 00:00</h4>"
+                "<table><tr><td>a</td></tr><tr><td>b</td></tr></table>",
+            )
+        )
+
+    def test_ragged_rows(self):
+        self._assert_same_parse(
+            self.html_body.replace("<td>276.1</td>", "<td> </td>")
+        )
+
+    def test_table_rows_matches_sliced_dicts(self):
+        expected = list(scraper.tbl_to_sliced_dicts(iter(TEXT), 2, 2, 3, HEADERS))
+        result = [dict(zip(HEADERS, row)) for row in scraper.table_rows(TEXT, 3, 2)]
+        self.assertEqual(expected, result)
+
+
 class ScrapeSingleDataTest(MockPatcherTestCase):
     def setUp(self):
         with open(HTML_FILE, encoding="utf-8") as html_f:
-            html_body = html_f.read()
-            self.mock_scraperwiki = self._mock_patch_cleanup(scraper, "scraperwiki")
-            self.mock_scraperwiki.scrape.side_effect = lambda _: html_body
+            self.mock_session = mock_session(html_f.read())
+        self.mock_get_session = self._mock_patch_cleanup(scraper, "get_session")
+        self.mock_get_session.return_value = self.mock_session
         self.mock_tag = mock.MagicMock(name="bs4_tag")
         self.img_dct = {"src": "some_img_src"}
         self.mock_tag.__getitem__.side_effect = self.img_dct.__getitem__
@@ -159,88 +194,121 @@ class ScrapeSingleDataTest(MockPatcherTestCase):
         self.mock_tag.__getitem__.assert_called_once_with("src")
         self.mock_tag.parent.parent.parent.parent.h3.get_text.assert_called_once()
         self.mock_tag.parent.__getitem__.assert_called_once_with("href")
-        self.mock_scraperwiki.scrape.assert_called_once()
+        self.mock_session.get.assert_called_once()
 
 
-class MockThreads(mock.MagicMock):
-    """A mock for Thread class in ScrapeDataHomePageTest."""
+class ConditionalScrapeDataTest(MockPatcherTestCase):
+    def setUp(self):
+        with open(HTML_FILE, encoding="utf-8") as html_f:
+            self.html_body = html_f.read()
+        self.mock_session = mock_session(self.html_body)
+        self.mock_tag = mock.MagicMock(name="bs4_tag")
+        self.mock_tag.__getitem__.side_effect = {"src": "some_img_src"}.__getitem__
+        self.mock_tag.parent.__getitem__.side_effect = {"href": "some_href"}.__getitem__
+        self.mock_tag.parent.parent.parent.parent.h3.get_text.return_value = (
+            "REGION"
+        )
+        self.mock_tag.parent.get_text.return_value = "AL292020 - Tropical Storm ETA\n \n"
+        self.page_cache = scraper.PageCache()
+        self.results = []
+
+    def _response(self, status_code=200, headers=None):
+        return mock_session(self.html_body, status_code, headers).get.return_value
+
+    def _scrape(self):
+        scraper.scrape_data(
+            self.mock_tag,
+            self.results.append,
+            page_cache=self.page_cache,
+            session=self.mock_session,
+        )
+
+    def test_unchanged_digest_skips_dispatch(self):
+        self.mock_session.get.return_value = self._response()
+        self._scrape()
+        self._scrape()
+        self.assertEqual(len(self.results), 1)
+
+    def test_not_modified_skips_dispatch(self):
+        self.mock_session.get.return_value = self._response(
+            headers={"ETag": '"abc"', "Last-Modified": "Wed, 11 Nov 2020 12:00:00 GMT"}
+        )
+        self._scrape()
+        self.mock_session.get.return_value = self._response(status_code=304)
+        self._scrape()
+        self.assertEqual(len(self.results), 1)
+        _, kwargs = self.mock_session.get.call_args
+        self.assertDictEqual(
+            kwargs["headers"],
+            {
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Wed, 11 Nov 2020 12:00:00 GMT",
+            },
+        )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._instance = None
-        self._mock_thread(*args, **kwargs)
+    def test_changed_page_dispatches(self):
+        self.mock_session.get.return_value = self._response()
+        self._scrape()
+        self.html_body += "<!-- updated -->"
+        self.mock_session.get.return_value = self._response()
+        self._scrape()
+        self.assertEqual(len(self.results), 2)
 
-    def _mock_thread(self, instance: object, target=None, args=None):
-        self._instance = instance
-        instance._thread_calls += 1
-        if target and args and len(args) == 2 and (tag := args[0]):
-            instance._thread_tags += [tag]
 
-    def start(self):
-        if self._instance:
-            self._instance._start_thread_calls += 1
-        return mock.MagicMock()
+    def test_failed_dispatch_reprocesses_page(self):
+        self.mock_session.get.return_value = self._response(headers={"ETag": '"abc"'})
+        with mock.patch.object(
+            self, "results", mock.Mock(append=mock.Mock(side_effect=RuntimeError))
+        ), self.assertRaises(RuntimeError):
+            self._scrape()
+        self._scrape()
+        self.assertEqual(len(self.results), 1)
+        # Not conditional, as the failed fetch was never committed.
+        _, kwargs = self.mock_session.get.call_args
+        self.assertDictEqual(kwargs["headers"], {})
+        self._scrape()
+        _, kwargs = self.mock_session.get.call_args
+        self.assertDictEqual(kwargs["headers"], {"If-None-Match": '"abc"'})
+        self.assertEqual(len(self.results), 1)
 
 
 class ScrapeDataHomePageTest(MockPatcherTestCase):
     def setUp(self):
         with open(MULTIPLE_BASINS_HTML_FILE, encoding="utf-8") as html_f:
-            html_body = html_f.read()
-            self.mock_scraperwiki = self._mock_patch_cleanup(scraper, "scraperwiki")
-            self.mock_scraperwiki.scrape.side_effect = lambda _: html_body
-        self.mock_queue = self._mock_patch_cleanup(scraper, "queue")
-        self.mock_qthread_instance = mock.MagicMock
-        self.mock_queue.Queue = mock.MagicMock(side_effect=self.mock_qthread_instance)
-
-        self.mock_threading = self._mock_patch_cleanup(scraper, "threading")
+            self.mock_session = mock_session(html_f.read())
+        self.mock_get_session = self._mock_patch_cleanup(scraper, "get_session")
+        self.mock_get_session.return_value = self.mock_session
+        self.mock_scrape_data = self._mock_patch_cleanup(scraper, "scrape_data")
         self._thread_tags = []
-        self._thread_calls = 0
-        self._start_thread_calls = 0
-        self.mock_threading.Thread.side_effect = lambda target, args: MockThreads(
-            self, target=target, args=args
+        self.mock_scrape_data.side_effect = (
+            lambda tag, *args, **kwargs: self._thread_tags.append(tag)
         )
 
-    def tearDown(self) -> None:
-        self._thread_tags.clear()
-        self._thread_calls = 0
-        self._start_thread_calls = 0
-
     def test_scrape_data_regional_multiple_cyclones(self):
-        scraper.scrape_page(lambda _: _)
-        expected_qthread_put_calls = 3
-        expected_thread_calls = 4
-        expected_thread_start_calls = 4
-        expected_thread_tags_len = 3
+        scraper.scrape_page(lambda _: _, max_workers=2)
         expected = [
             ('Atlantic', 'Tropical Storm ETA', 'AL292020'),
             ('Atlantic', 'Tropical Storm THETA', 'AL302020'),
             ('Atlantic', 'INVEST', 'AL982020'),
         ]
-        self.mock_scraperwiki.scrape.assert_called_once()
-        self.mock_queue.Queue.assert_called_once_with(maxsize=20)
-        self.assertEqual(
-            expected_thread_calls,
-            self._thread_calls,
-            "Expected %d but got %d" % (expected_thread_calls, self._thread_calls),
-        )
-        self.assertEqual(
-            expected_thread_start_calls,
-            self._start_thread_calls,
-            "Expected %d but got %d"
-            % (expected_thread_start_calls, self._start_thread_calls),
-        )
-        thread_tags_len = len(self._thread_tags)
-        self.assertEqual(
-            expected_thread_tags_len,
-            thread_tags_len,
-            "Expected %d but got %d" % (expected_thread_tags_len, thread_tags_len),
-        )
-        result = [
+        self.mock_session.get.assert_called_once()
+        self.assertEqual(self.mock_scrape_data.call_count, len(expected))
+        for _, kwargs in self.mock_scrape_data.call_args_list:
+            self.assertIsNone(kwargs["page_cache"])
+            self.assertIs(kwargs["session"], self.mock_session)
+        result = sorted(
             (region, heading, name)
             for _, heading, region, name, _ in map(
                 scraper.scrape_tag, self._thread_tags
             )
-        ]
-        self.assertListEqual(expected, result, "Expected {} Got {}".format(
+        )
+        self.assertListEqual(sorted(expected), result, "Expected {} Got {}".format(
             expected, result
         ))
+
+    def test_scrape_page_waits_for_failing_storms(self):
+        self.mock_scrape_data.side_effect = RuntimeError("storm page down")
+        scraper.scrape_page(lambda _: _, conditional=True)
+        self.assertEqual(self.mock_scrape_data.call_count, 3)
+        for _, kwargs in self.mock_scrape_data.call_args_list:
+            self.assertIs(kwargs["page_cache"], scraper.PAGE_CACHE)
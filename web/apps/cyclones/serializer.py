@@ -1,6 +1,7 @@
 """Serializer for views."""
 
-from apps.cyclones.models import Cyclone, Forecast, HistoricSnapshot
+from apps.cyclones.models import Cyclone, CycloneState, Forecast, HistoricSnapshot
+from django.db.models import F
 from rest_framework import serializers
 
 
@@ -9,7 +10,7 @@ class ForecastSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Forecast
-        fields = "__all__"
+        exclude = ("geo_cell", "ingested_at")
 
 
 class HistoricSnapshotSerializer(serializers.ModelSerializer):
@@ -17,11 +18,17 @@ class HistoricSnapshotSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = HistoricSnapshot
-        fields = "__all__"
+        exclude = ("geo_cell", "ingested_at")
 
 
 class CycloneSerializer(serializers.ModelSerializer):
-    """Serializer for cyclone model."""
+    """Serializer for cyclone model.
+
+    The `fields` and `include` context entries, when set, restrict the
+    output to those cyclone fields and nested track collections.
+    """
+
+    TRACKS = ("forecasts", "snapshots")
 
     forecasts = ForecastSerializer(many=True, read_only=True, required=False)
     snapshots = HistoricSnapshotSerializer(
@@ -30,4 +37,139 @@ class CycloneSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Cyclone
-        fields = "__all__"
+        exclude = ("fingerprint",)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get("fields")
+        include = self.context.get("include")
+        return {
+            name: field
+            for name, field in fields.items()
+            if (
+                include is None or name in include
+                if name in self.TRACKS
+                else selected is None or name in selected
+            )
+        }
+
+
+class CycloneStateSerializer(serializers.ModelSerializer):
+    """Serializer for cyclone current state model, with the cyclone id."""
+
+    id = serializers.IntegerField(source="cyclone_id", read_only=True)
+
+    class Meta:
+        model = CycloneState
+        exclude = ("cyclone",)
+
+
+def _row_representation(fields):
+    """Build a `.values()` row to representation function.
+
+    Only fields whose representation differs from the database value are
+    converted, through the serializer field itself.
+    """
+    names = list(fields)
+    converters = [
+        (name, field.to_representation)
+        for name, field in fields.items()
+        if isinstance(field, serializers.DateTimeField)
+    ]
+
+    def to_representation(row):
+        data = {name: row[name] for name in names}
+        for name, convert in converters:
+            if data[name] is not None:
+                data[name] = convert(data[name])
+        return data
+
+    return to_representation
+
+
+class CycloneValuesSerializer:
+    """Read-only `CycloneSerializer` equivalent over `.values()` rows.
+
+    Tracks of all listed cyclones are fetched with one query per nested
+    collection and grouped per cyclone in a single pass, without a
+    serializer instance per row. Honors the same `fields` and `include`
+    context entries.
+
+    Args:
+        cyclones(Iterable): Cyclone `.values()` rows, with `id`.
+        tracks(dict): Related name to the track queryset listed under it.
+        context(dict): Serializer context.
+    """
+
+    def __init__(self, cyclones, tracks=None, context=None):
+        self.cyclones = cyclones
+        self.tracks = tracks or {}
+        self.context = context or {}
+
+    @classmethod
+    def value_fields(cls, context=None):
+        """Cyclone fields to select for the given context."""
+        fields = CycloneSerializer(context=context or {}).fields
+        return ["id"] + [
+            name
+            for name in fields
+            if name != "id" and name not in CycloneSerializer.TRACKS
+        ]
+
+    @property
+    def data(self):
+        fields = CycloneSerializer(context=self.context).fields
+        cyclones = list(self.cyclones)
+        cyclone_ids = [cyclone["id"] for cyclone in cyclones]
+        grouped = {}
+        for name in CycloneSerializer.TRACKS:
+            if name not in fields:
+                continue
+            track_fields = fields[name].child.fields
+            to_representation = _row_representation(track_fields)
+            grouped[name] = by_cyclone = {cyclone_id: [] for cyclone_id in cyclone_ids}
+            for row in (
+                self.tracks[name]
+                .filter(cyclone__in=cyclone_ids)
+                .values(*track_fields, "cyclone_id")
+            ):
+                by_cyclone[row["cyclone_id"]].append(to_representation(row))
+        to_representation = _row_representation(
+            {name: field for name, field in fields.items() if name not in grouped}
+        )
+        data = []
+        for cyclone in cyclones:
+            representation = to_representation(cyclone)
+            data += [
+                {
+                    name: grouped[name][cyclone["id"]]
+                    if name in grouped
+                    else representation[name]
+                    for name in fields
+                }
+            ]
+        return data
+
+
+class CycloneStateValuesSerializer:
+    """Read-only `CycloneStateSerializer` equivalent over `.values()` rows.
+
+    Args:
+        states(Iterable): `CycloneState` rows of `values()`.
+    """
+
+    def __init__(self, states):
+        self.states = states
+
+    @staticmethod
+    def values(queryset):
+        """`.values()` of a `CycloneState` queryset in representation order."""
+        return queryset.values(
+            *(name for name in CycloneStateSerializer().fields if name != "id"),
+            id=F("cyclone_id"),
+        )
+
+    @property
+    def data(self):
+        to_representation = _row_representation(CycloneStateSerializer().fields)
+        return [to_representation(state) for state in self.states]
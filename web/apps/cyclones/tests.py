@@ -1,8 +1,33 @@
 """Tests for cyclone module."""
 
+import asyncio
 import datetime as dt
+import importlib
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipUnless
 
 import apps.cyclones.models as models
+import backend
+import fakeredis
+import redis
+from apps.cyclones import (
+    analytics,
+    async_api,
+    cache,
+    columnar,
+    events,
+    geo,
+    partitions,
+    renderers,
+    track,
+    views,
+)
 from apps.cyclones.factory.factory import (
     CycloneFactory,
     ForecastFactory,
@@ -12,9 +37,22 @@ from apps.cyclones.factory.factory import (
     LAT,
     LNG,
 )
-from apps.cyclones.models import Cyclone, Forecast, HistoricSnapshot
+from apps.cyclones.models import Cyclone, CycloneState, Forecast, HistoricSnapshot
+from apps.cyclones.serializer import CycloneSerializer, CycloneValuesSerializer
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from backend import asgi
+from django.conf import settings
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.core.cache import cache as django_cache
+from django.core.management.base import CommandError
 from django.db.models import Q
-from django.test import TestCase
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
 
 FAKE_DATA = [
     dict(
@@ -107,3 +145,1590 @@ class CycloneModelTest(TestCase):
         )
         self.assertFalse(cyclone_rel_f)
         self.assertFalse(cyclone_rel_s)
+
+
+class TrackPointTest(TestCase):
+    """Typed track points and their wire encoding."""
+
+    def test_round_trip(self):
+        points = track.parse_rows(
+            [("2020-11-11 12:00", "25.8", "-83.8", "65")], track.HistoryPoint
+        )
+        wire = track.encode_track(points)
+        self.assertEqual(wire, [[1605096000, 25.8, -83.8, 65]])
+        self.assertEqual(track.decode_track(wire, track.HistoryPoint), points)
+
+    def test_invalid_rows_dropped(self):
+        points = track.parse_rows(
+            [("0", "24.5", "275.8", "60"), ("12", "124.5", "275.8", "60"), ("x",)],
+            track.ForecastPoint,
+        )
+        self.assertEqual(points, [track.ForecastPoint(0, 24.5, 275.8, 60)])
+
+    def test_save_db_wire_encoded(self):
+        models.save_db(
+            [
+                dict(
+                    result=dict(
+                        cyclone_name="wire_cyclone",
+                        region="Atlantic",
+                        img_src="",
+                        link="",
+                        forecast_time="2020-11-11T06:00:00-06:00",
+                        forecast_track=[[0, 24.5, 275.8, 60], [12, 26.4, 276.1, 65]],
+                        history_track=[[1605096000, 25.8, -83.8, 65]],
+                    )
+                )
+            ]
+        )
+        cyclone = Cyclone.objects.get(name="wire_cyclone")
+        self.assertEqual(cyclone.forecasts.count(), 2)
+        snapshot = cyclone.snapshots.get()
+        self.assertEqual(
+            snapshot.synoptic_time,
+            dt.datetime(2020, 11, 11, 12, tzinfo=dt.timezone.utc),
+        )
+
+
+class StormFingerprintTest(TestCase):
+    """Unchanged storms skip the write path."""
+
+    def setUp(self):
+        self.data = [
+            dict(
+                result=dict(
+                    cyclone_name="steady_cyclone",
+                    region="Atlantic",
+                    img_src="",
+                    link="",
+                    forecast_time="2020-11-11T06:00:00-06:00",
+                    forecast_track=[[0, 24.5, 275.8, 60]],
+                    history_track=[[1605096000, 25.8, -83.8, 65]],
+                )
+            )
+        ]
+
+    def test_unchanged_storm_is_noop(self):
+        models.save_db(self.data)
+        fingerprint = Cyclone.objects.get(name="steady_cyclone").fingerprint
+        self.assertTrue(fingerprint)
+        with self.assertNumQueries(3):
+            # savepoint, cyclone lookup, release.
+            models.save_db(self.data)
+
+    def test_changed_storm_is_saved(self):
+        models.save_db(self.data)
+        self.data[0]["result"]["history_track"] = [[1605117600, 26.4, -83.1, 70]]
+        models.save_db(self.data)
+        cyclone = Cyclone.objects.get(name="steady_cyclone")
+        self.assertEqual(cyclone.snapshots.count(), 2)
+        self.assertEqual(cyclone.forecasts.count(), 1)
+
+
+class BulkIngestTest(TestCase):
+    """Set based conflict-ignoring inserts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cyclone = CycloneFactory()
+
+    def test_bulk_ingest_skips_conflicts(self):
+        synoptic_time = dt.datetime(2020, 11, 11, 12, tzinfo=dt.timezone.utc)
+        HistoricSnapshot.objects.create(
+            synoptic_time=synoptic_time, lat=1, lng=2, intensity=3, cyclone=self.cyclone
+        )
+        snapshots = [
+            HistoricSnapshot(
+                synoptic_time=synoptic_time + dt.timedelta(hours=hours),
+                lat=1,
+                lng=2,
+                intensity=3,
+                cyclone=self.cyclone,
+            )
+            for hours in (0, 6, 6, 12)
+        ]
+        partitions.clear_partition_cache()
+        # The partitioning check, then one INSERT.
+        with self.assertNumQueries(2):
+            result = HistoricSnapshot.objects.bulk_ingest(snapshots)
+        self.assertEqual((result.inserted, result.skipped), (2, 2))
+        # The check is cached.
+        with self.assertNumQueries(1):
+            HistoricSnapshot.objects.bulk_ingest(snapshots)
+        self.assertEqual(
+            sorted(result.inserted_ids),
+            sorted(
+                HistoricSnapshot.objects.filter(
+                    synoptic_time__gt=synoptic_time
+                ).values_list("pk", flat=True)
+            ),
+        )
+
+
+class LoadTracksCommandTest(TestCase):
+    """COPY based backfill loader."""
+
+    def setUp(self):
+        # Conversions roll back with the test.
+        self.addCleanup(partitions.clear_partition_cache)
+
+    def _load(self, kind, rows, **options):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_f:
+            csv_f.write("\n".join(rows) + "\n")
+        self.addCleanup(os.remove, csv_f.name)
+        out = io.StringIO()
+        call_command("loadtracks", kind, csv_f.name, stdout=out, **options)
+        return out.getvalue()
+
+    def test_load_snapshots_in_batches(self):
+        output = self._load(
+            "snapshots",
+            [
+                "cyclone_name,region,synoptic_time,lat,lng,intensity",
+                "INVEST-AL982020,Atlantic,2020-11-11 06:00+00,24.5,-84.2,60",
+                "INVEST-AL982020,Atlantic,2020-11-11 12:00+00,25.8,-83.8,65",
+                "INVEST-AL982020,Atlantic,2020-11-11 12:00+00,25.8,-83.8,65",
+                "ETA-AL292020,Atlantic,2020-11-11 12:00+00,25.8,-83.8,65",
+            ],
+            batch_size=2,
+        )
+        self.assertIn("4 rows read, 3 inserted, 1 skipped", output)
+        self.assertEqual(
+            HistoricSnapshot.objects.filter(cyclone__name="INVEST-AL982020").count(), 2
+        )
+        self.assertEqual(Cyclone.objects.filter(region="Atlantic").count(), 2)
+
+    def test_load_forecasts(self):
+        self._load(
+            "forecasts",
+            [
+                "cyclone_name,region,forecast_time,forecast_hr,lat,lng,intensity",
+                "ETA-AL292020,Atlantic,2020-11-11 06:00-06,0,24.5,275.8,60",
+                "ETA-AL292020,Atlantic,2020-11-11 06:00-06,12,26.4,276.1,65",
+            ],
+        )
+        self.assertEqual(
+            Forecast.objects.filter(cyclone__name="ETA-AL292020").count(), 2
+        )
+        self.assertEqual(
+            Cyclone.objects.get(name="ETA-AL292020").latest_forecast_time,
+            dt.datetime(2020, 11, 11, 12, tzinfo=dt.timezone.utc),
+        )
+
+    def test_rejects_unknown_columns(self):
+        with self.assertRaises(CommandError):
+            self._load("snapshots", ["cyclone_name,region,when,lat,lng,intensity"])
+
+    def test_load_archived_season_into_partitions(self):
+        partitions.convert_to_partitioned(HistoricSnapshot, months_ahead=0)
+        self._load(
+            "snapshots",
+            [
+                "cyclone_name,region,synoptic_time,lat,lng,intensity",
+                "KATRINA-AL122005,Atlantic,2005-08-29 12:00+00,29.5,-89.6,110",
+            ],
+        )
+        table = HistoricSnapshot._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {table}")
+            self.assertEqual(cursor.fetchall(), [(f"{table}_p2005_08",)])
+
+
+class CycloneViewSetTest(TestCase):
+    """Listing of cyclones with forecasts older than a time delta."""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = dt.datetime.now(tz=TZINFO)
+        cls.stale, cls.recent, cls.empty = CycloneFactory.create_batch(3)
+        for cyclone, hours in ((cls.stale, (48, 24)), (cls.recent, (3, 0))):
+            for hour in hours:
+                for forecast_hr in (0, 12, 24):
+                    ForecastFactory(
+                        forecast_hr=forecast_hr,
+                        forecast_time=now - dt.timedelta(hours=hour),
+                        cyclone=cyclone,
+                    )
+        Cyclone.objects.update(latest_forecast_time=None)
+        importlib.import_module(
+            "apps.cyclones.migrations.0004_cyclone_latest_forecast_time"
+        ).backfill_latest_forecast_time(django_apps, None)
+
+    def setUp(self):
+        django_cache.clear()
+        # Keep requests of a test in one cache time bucket.
+        patcher = mock.patch.object(cache, "time")
+        patcher.start().time.return_value = 0
+        self.addCleanup(patcher.stop)
+
+    def _get(self, status_code=200, **params):
+        response = self.client.get(
+            reverse("cyclones"), params, HTTP_ACCEPT="application/vnd.oai.openapi+json"
+        )
+        self.assertEqual(response.status_code, status_code)
+        return json.loads(response.content)
+
+    def _names(self, **params):
+        return [cyclone["name"] for cyclone in self._get(**params)]
+
+    def test_track_point_keys(self):
+        HistoricSnapshotFactory(cyclone=self.stale)
+        cyclone = next(
+            cyclone for cyclone in self._get(H=12) if cyclone["id"] == self.stale.pk
+        )
+        detail = self.client.get(
+            reverse("cyclones-detail", args=[self.stale.pk]), {"format": "json"}
+        ).json()
+        for data in (cyclone, detail):
+            self.assertEqual(
+                set(data["forecasts"][0]),
+                {
+                    "id",
+                    "forecast_time",
+                    "forecast_hr",
+                    "lat",
+                    "lng",
+                    "intensity",
+                    "cyclone",
+                },
+            )
+            self.assertEqual(
+                set(data["snapshots"][0]),
+                {"id", "synoptic_time", "lat", "lng", "intensity", "cyclone"},
+            )
+
+    def test_detail_without_forecasts(self):
+        response = self.client.get(
+            reverse("cyclones-detail", args=[self.empty.pk]), {"format": "json"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["forecasts"], [])
+        response = self.client.get(
+            reverse("cyclones-detail", args=[0]), {"format": "json"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_backfilled_latest_forecast_time(self):
+        self.assertEqual(
+            Cyclone.objects.get(pk=self.stale.pk).latest_forecast_time,
+            Forecast.objects.filter(cyclone=self.stale).latest("forecast_time")
+            .forecast_time,
+        )
+        self.assertIsNone(Cyclone.objects.get(pk=self.empty.pk).latest_forecast_time)
+
+    def test_list_once_per_cyclone(self):
+        with self.assertNumQueries(3):
+            names = self._names()
+        self.assertEqual(names, [self.stale.name, self.recent.name])
+
+    def test_list_filters_by_delta(self):
+        self.assertEqual(self._names(H=12), [self.stale.name])
+        self.assertEqual(self._names(d=3), [])
+
+    def _save_forecast(self, forecast_time):
+        with mock.patch.object(
+            transaction, "on_commit", lambda func: func()
+        ), mock.patch.object(backend, "redis_instance", create=True):
+            return models.save_db(
+                [
+                    dict(
+                        result=dict(
+                            cyclone_name=self.stale.name,
+                            region=self.stale.region,
+                            img_src="",
+                            link="",
+                            forecast_track=[[0, 24.5, 275.8, 60]],
+                            forecast_time=forecast_time.isoformat(),
+                            history_track=[],
+                        )
+                    )
+                ]
+            )
+
+    def test_save_db_advances_latest_forecast_time(self):
+        forecast_time = dt.datetime.now(tz=TZINFO) + dt.timedelta(hours=6)
+        self._save_forecast(forecast_time)
+        self.assertEqual(
+            Cyclone.objects.get(pk=self.stale.pk).latest_forecast_time, forecast_time
+        )
+
+    def test_cached_until_data_version_bump(self):
+        names = self._names(H=12, format="openapi-json")
+        with self.assertNumQueries(0):
+            self.assertEqual(self._names(H="12", M=0), names)
+        forecast_time = dt.datetime.now(tz=TZINFO) - dt.timedelta(days=1)
+        version = cache.data_version()
+        self._save_forecast(forecast_time)
+        self.assertEqual(cache.data_version(), version + 1)
+        self._save_forecast(forecast_time)
+        self.assertEqual(cache.data_version(), version + 1)
+        with self.assertNumQueries(3):
+            self._names(H=12)
+
+    def test_cache_key_normalized(self):
+        digest = cache.list_query_digest(3600, {"include": ""}, "testserver")
+        self.assertEqual(
+            digest,
+            cache.list_query_digest(
+                3600, {"include": "", "format": "json"}, "testserver"
+            ),
+        )
+        self.assertNotEqual(digest, cache.list_query_digest(3600, {}, "testserver"))
+        key = cache.list_cache_key(1, digest, 0)
+        for other in ((2, digest, 0), (1, digest, 1)):
+            self.assertNotEqual(key, cache.list_cache_key(*other))
+
+    def test_conditional_get(self):
+        response = self.client.get(reverse("cyclones"), {"format": "json"})
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn("Last-Modified", response)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse("cyclones"), {"format": "json"}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        # Still valid in a later time bucket while the data is unchanged.
+        with mock.patch.object(
+            views, "time_bucket", return_value=cache.time_bucket() + 1
+        ):
+            response = self.client.get(
+                reverse("cyclones"), {"format": "json"}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            reverse("cyclones"), {"format": "openapi-json"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self._save_forecast(dt.datetime.now(tz=TZINFO) - dt.timedelta(days=1))
+        response = self.client.get(
+            reverse("cyclones"), {"format": "json"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_pagination(self):
+        page = self._get(page_size=1)
+        self.assertEqual(
+            [cyclone["name"] for cyclone in page["results"]], [self.stale.name]
+        )
+        self.assertIsNone(page["previous"])
+        page = self.client.get(
+            page["next"], HTTP_ACCEPT="application/vnd.oai.openapi+json"
+        ).json()
+        self.assertEqual(
+            [cyclone["name"] for cyclone in page["results"]], [self.recent.name]
+        )
+        self.assertIsNone(page["next"])
+
+    def test_pages_follow_list_order(self):
+        # Created last, with the oldest forecasts.
+        oldest = CycloneFactory(
+            latest_forecast_time=dt.datetime.now(tz=TZINFO) - dt.timedelta(days=3)
+        )
+        ForecastFactory(forecast_time=oldest.latest_forecast_time, cyclone=oldest)
+        names = self._names(include="")
+        self.assertEqual(names[0], oldest.name)
+        paged = []
+        page = self._get(page_size=1, include="")
+        while True:
+            paged += [cyclone["name"] for cyclone in page["results"]]
+            if not page["next"]:
+                break
+            page = self.client.get(
+                page["next"], HTTP_ACCEPT="application/vnd.oai.openapi+json"
+            ).json()
+        self.assertEqual(paged, names)
+
+    def test_metadata_only(self):
+        with self.assertNumQueries(1):
+            cyclones = self._get(include="", fields="id,name")
+        self.assertEqual(
+            cyclones,
+            [
+                {"id": self.stale.pk, "name": self.stale.name},
+                {"id": self.recent.pk, "name": self.recent.name},
+            ],
+        )
+
+    def test_latest_n_tracks(self):
+        for day in range(1, 4):
+            HistoricSnapshotFactory(
+                synoptic_time=dt.datetime(2020, 11, day, tzinfo=TZINFO),
+                cyclone=self.stale,
+            )
+        cyclones = self._get(
+            include="forecasts,snapshots", forecasts_limit=2, snapshots_limit=1
+        )
+        latest = Forecast.objects.filter(cyclone=self.stale).latest("forecast_time")
+        self.assertEqual(len(cyclones[0]["forecasts"]), 2)
+        self.assertEqual(
+            {forecast["forecast_time"] for forecast in cyclones[0]["forecasts"]},
+            {latest.forecast_time.isoformat().replace("+00:00", "Z")},
+        )
+        self.assertEqual(len(cyclones[0]["snapshots"]), 1)
+        self.assertEqual(
+            cyclones[0]["snapshots"][0]["id"],
+            HistoricSnapshot.objects.filter(cyclone=self.stale)
+            .latest("synoptic_time")
+            .pk,
+        )
+
+    def test_invalid_selection(self):
+        self._get(status_code=400, include="hurricanes")
+        self._get(status_code=400, fields="fingerprint")
+        self._get(status_code=400, snapshots_limit=0)
+
+
+class CycloneValuesSerializerTest(TestCase):
+    """The `.values()` path matches CycloneSerializer output."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for day in range(1, 4):
+            cyclone = CycloneFactory(
+                latest_forecast_time=dt.datetime(2020, 11, day, tzinfo=TZINFO)
+            )
+            for forecast_hr in (0, 12, 24):
+                ForecastFactory(
+                    forecast_hr=forecast_hr,
+                    forecast_time=dt.datetime(2020, 11, day, tzinfo=TZINFO),
+                    cyclone=cyclone,
+                )
+            for hour in range(0, 24, 6):
+                HistoricSnapshotFactory(
+                    synoptic_time=dt.datetime(2020, 11, day, hour, tzinfo=TZINFO),
+                    cyclone=cyclone,
+                )
+
+    @staticmethod
+    def _sorted(cyclones):
+        return json.loads(
+            json.dumps(
+                [
+                    {
+                        name: sorted(value, key=lambda point: point["id"])
+                        if name in CycloneSerializer.TRACKS
+                        else value
+                        for name, value in cyclone.items()
+                    }
+                    for cyclone in cyclones
+                ]
+            )
+        )
+
+    def _assert_same(self, include=None, fields=None, limits=None):
+        limits = limits or {}
+        context = {"include": include, "fields": fields}
+        related = [
+            name
+            for name in CycloneSerializer.TRACKS
+            if include is None or name in include
+        ]
+        cyclones = Cyclone.objects.order_by("id")
+        expected = CycloneSerializer(
+            cyclones.prefetch_related(
+                *(
+                    views.latest_track_prefetch(name, limits.get(name))
+                    for name in related
+                )
+            ),
+            many=True,
+            context=context,
+        ).data
+        with self.assertNumQueries(1 + len(related)):
+            data = CycloneValuesSerializer(
+                cyclones.values(*CycloneValuesSerializer.value_fields(context)),
+                tracks={
+                    name: views.track_queryset(name, limits.get(name))
+                    for name in related
+                },
+                context=context,
+            ).data
+        self.assertEqual(self._sorted(data), self._sorted(expected))
+        self.assertEqual(
+            [list(cyclone) for cyclone in data],
+            [list(cyclone) for cyclone in expected],
+        )
+
+    def test_full_representation(self):
+        self._assert_same()
+
+    def test_selected_fields(self):
+        self._assert_same(
+            include={"snapshots"}, fields={"name", "latest_forecast_time"}
+        )
+        self._assert_same(include=set(), fields={"id"})
+
+    def test_latest_points(self):
+        self._assert_same(limits={"forecasts": 2, "snapshots": 1})
+
+    def test_fast_json_renderer(self):
+        data = CycloneValuesSerializer(
+            Cyclone.objects.values(*CycloneValuesSerializer.value_fields()),
+            tracks={
+                name: views.track_queryset(name) for name in CycloneSerializer.TRACKS
+            },
+        ).data
+        values = {
+            "when": dt.datetime(2020, 11, 1, 6, 0, 0, 123456, tzinfo=dt.timezone.utc),
+            "name": "ETA\u2028",
+        }
+        for orjson in {renderers.orjson, None}:
+            with self.subTest(orjson=orjson), mock.patch.object(
+                renderers, "orjson", orjson
+            ):
+                content = renderers.FastJSONRenderer().render(data)
+                self.assertNotIn(b", ", content)
+                self.assertEqual(json.loads(content), data)
+                self.assertEqual(
+                    renderers.FastJSONRenderer().render(values),
+                    JSONRenderer().render(values),
+                )
+
+
+class PartitionTracksCommandTest(TestCase):
+    """Monthly range partitioning of the track tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cyclone = CycloneFactory()
+        for month in (9, 11):
+            ForecastFactory(
+                forecast_time=dt.datetime(2020, month, 2, tzinfo=dt.timezone.utc),
+                cyclone=cls.cyclone,
+            )
+            HistoricSnapshotFactory(
+                synoptic_time=dt.datetime(2020, month, 2, tzinfo=dt.timezone.utc),
+                cyclone=cls.cyclone,
+            )
+
+    def setUp(self):
+        # Conversions roll back with the test.
+        self.addCleanup(partitions.clear_partition_cache)
+
+    def _partitiontracks(self, *args):
+        out = io.StringIO()
+        call_command("partitiontracks", *args, "--months-ahead=1", stdout=out)
+        return out.getvalue()
+
+    @staticmethod
+    def _constraint_names(model):
+        with connection.cursor() as cursor:
+            return set(
+                connection.introspection.get_constraints(
+                    cursor, model._meta.db_table
+                )
+            )
+
+    def test_requires_convert(self):
+        self.assertIn("not partitioned", self._partitiontracks())
+        self.assertFalse(partitions.is_partitioned(Forecast))
+
+    def test_convert_keeps_rows_and_constraints(self):
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        constraints = {
+            model: self._constraint_names(model)
+            for model in (Forecast, HistoricSnapshot)
+        }
+        self._partitiontracks("--convert")
+        for model, name in (
+            (Forecast, "cyclones_forecast_p2020_10"),
+            (HistoricSnapshot, "cyclones_historicsnapshot_p2020_09"),
+        ):
+            self.assertTrue(partitions.is_partitioned(model))
+            self.assertEqual(model.objects.count(), 2)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+                self.assertTrue(cursor.fetchone()[0])
+            self.assertEqual(self._constraint_names(model), constraints[model])
+        month_after = partitions.add_months(partitions.month_start(now), 2)
+        self.assertEqual(partitions.ensure_upcoming_partitions(1, now=now), [])
+        self.assertEqual(
+            partitions.ensure_upcoming_partitions(2, now=now),
+            [
+                partitions.partition_name(model._meta.db_table, month_after)
+                for model in (Forecast, HistoricSnapshot)
+            ],
+        )
+        forecast = Forecast.objects.get(forecast_time__month=11)
+        duplicate = Forecast(
+            forecast_hr=forecast.forecast_hr,
+            lat=forecast.lat,
+            lng=forecast.lng,
+            intensity=forecast.intensity,
+            forecast_time=forecast.forecast_time,
+            cyclone=self.cyclone,
+        )
+        later = Forecast(
+            forecast_hr=96,
+            lat=forecast.lat,
+            lng=forecast.lng,
+            intensity=forecast.intensity,
+            forecast_time=now,
+            cyclone=self.cyclone,
+        )
+        result = Forecast.objects.bulk_ingest([duplicate, later])
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(
+            Forecast.objects.get(pk=result.inserted_ids[0]).forecast_hr, 96
+        )
+        self.assertIn("Created 0 partitions", self._partitiontracks())
+
+    @staticmethod
+    def _partition_of(model, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {model._meta.db_table} "
+                "WHERE id = %s",
+                [pk],
+            )
+            return cursor.fetchone()[0]
+
+    def test_out_of_range_months(self):
+        self._partitiontracks("--convert")
+        table = Forecast._meta.db_table
+        # A month before the partitioned range lands in the DEFAULT partition.
+        old = ForecastFactory(
+            forecast_time=dt.datetime(2015, 3, 2, tzinfo=dt.timezone.utc),
+            cyclone=self.cyclone,
+        )
+        self.assertEqual(
+            self._partition_of(Forecast, old.pk),
+            partitions.default_partition_name(table),
+        )
+        # Creating its partition moves the row out of the DEFAULT one.
+        march = dt.datetime(2015, 3, 1, tzinfo=dt.timezone.utc)
+        self.assertEqual(
+            partitions.ensure_partitions(Forecast, march, march),
+            [partitions.partition_name(table, march)],
+        )
+        self.assertEqual(
+            self._partition_of(Forecast, old.pk),
+            partitions.partition_name(table, march),
+        )
+        # Ingesting creates the partitions of its months on demand.
+        result = Forecast.objects.bulk_ingest(
+            [
+                Forecast(
+                    forecast_hr=0,
+                    lat=10,
+                    lng=20,
+                    intensity=30,
+                    forecast_time=dt.datetime(2016, 7, 4, tzinfo=dt.timezone.utc),
+                    cyclone=self.cyclone,
+                )
+            ]
+        )
+        self.assertEqual(
+            self._partition_of(Forecast, result.inserted_ids[0]),
+            f"{table}_p2016_07",
+        )
+        self.assertEqual(Forecast.objects.count(), 4)
+
+
+class PruneSupersededForecastsTest(TestCase):
+    """Compaction of superseded forecast cycles."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = dt.datetime.now(tz=dt.timezone.utc)
+        cls.cyclone = CycloneFactory(latest_forecast_time=cls.now)
+        for days in (30, 20, 10, 0):
+            for forecast_hr in (0, 12, 24):
+                ForecastFactory(
+                    forecast_hr=forecast_hr,
+                    forecast_time=cls.now - dt.timedelta(days=days),
+                    cyclone=cls.cyclone,
+                )
+        # Its only cycle is the latest one, however old.
+        cls.stalled = CycloneFactory(
+            latest_forecast_time=cls.now - dt.timedelta(days=30)
+        )
+        for forecast_hr in (0, 12):
+            ForecastFactory(
+                forecast_hr=forecast_hr,
+                lat=1.0,
+                forecast_time=cls.now - dt.timedelta(days=30),
+                cyclone=cls.stalled,
+            )
+
+    def test_prune_in_batches(self):
+        version = cache.data_version()
+        deleted = models.prune_superseded_forecasts(
+            self.now - dt.timedelta(days=15), batch_size=1, max_batches=3
+        )
+        self.assertEqual(deleted, 3)
+        deleted += models.prune_superseded_forecasts(
+            self.now - dt.timedelta(days=15), batch_size=1
+        )
+        self.assertEqual(deleted, 4)
+        self.assertGreater(cache.data_version(), version)
+        self.assertEqual(
+            sorted(
+                Forecast.objects.filter(cyclone=self.cyclone).values_list(
+                    "forecast_hr", flat=True
+                )
+            ),
+            [0, 0, 0, 0, 12, 12, 24, 24],
+        )
+        self.assertEqual(Forecast.objects.filter(cyclone=self.stalled).count(), 2)
+        self.assertEqual(
+            models.prune_superseded_forecasts(self.now - dt.timedelta(days=15)), 0
+        )
+
+
+class GeoCellTest(TestCase):
+    """Grid cells of signed and 0-360 longitudes."""
+
+    POINTS = (
+        (24.5, 275.8),
+        (24.5, -84.2),
+        (-12.0, 179.9),
+        (-12.0, -180.0),
+        (90, 0),
+    )
+
+    def test_longitude_conventions_share_cells(self):
+        self.assertEqual(geo.geo_cell(24.5, 275.8), geo.geo_cell(24.5, -84.2))
+        self.assertAlmostEqual(geo.haversine_km(24.5, 275.8, 24.5, -84.2), 0)
+
+    def test_sql_matches_python(self):
+        with connection.cursor() as cursor:
+            for lat, lng in self.POINTS:
+                cursor.execute(
+                    "SELECT "
+                    + geo.GEO_CELL_SQL.format(
+                        lat="%(lat)s::float", lng="%(lng)s::float"
+                    ),
+                    {"lat": lat, "lng": lng},
+                )
+                self.assertEqual(cursor.fetchone()[0], geo.geo_cell(lat, lng))
+
+    def test_antimeridian_box(self):
+        box = geo.BoundingBox.parse(10, 175, 20, 185)
+        self.assertEqual(box, geo.BoundingBox(10, 175, 20, -175))
+        self.assertTrue(box.contains(15, -179.5))
+        self.assertFalse(box.contains(15, 170))
+        cells = [geo.geo_cell(15, -179.5), geo.geo_cell(15, 179.5)]
+        for cell in cells:
+            self.assertTrue(
+                any(low <= cell <= high for low, high in box.cell_ranges())
+            )
+
+    def test_saved_points_get_cells(self):
+        forecast = ForecastFactory(lat=24.5, lng=275.8)
+        self.assertEqual(forecast.geo_cell, geo.geo_cell(24.5, -84.2))
+
+
+class CycloneGeoViewTest(TestCase):
+    """Bounding box and radius cyclone lists."""
+
+    @classmethod
+    def setUpTestData(cls):
+        forecast_time = dt.datetime(2020, 11, 11, tzinfo=dt.timezone.utc)
+        cls.cyclones = {}
+        for name, forecast, snapshot in (
+            ("gulf", (30.0, 270.0), (29.5, -90.5)),
+            ("florida", (24.5, 275.8), (25.8, -83.8)),
+            ("dateline", (15.0, 170.0), (16.0, -179.5)),
+            ("europe", (50.0, 10.0), (50.5, 10.5)),
+        ):
+            cyclone = cls.cyclones[name] = CycloneFactory(
+                latest_forecast_time=forecast_time
+            )
+            ForecastFactory(
+                lat=forecast[0],
+                lng=forecast[1],
+                forecast_time=forecast_time,
+                cyclone=cyclone,
+            )
+            HistoricSnapshotFactory(
+                lat=snapshot[0], lng=snapshot[1], cyclone=cyclone
+            )
+
+    def setUp(self):
+        django_cache.clear()
+
+    def _names(self, url_name, status_code=200, **params):
+        response = self.client.get(reverse(url_name), {"format": "json", **params})
+        self.assertEqual(response.status_code, status_code)
+        if status_code != 200:
+            return None
+        by_pk = {cyclone.pk: name for name, cyclone in self.cyclones.items()}
+        return [by_pk[cyclone["id"]] for cyclone in response.json()]
+
+    def test_within_bbox(self):
+        self.assertEqual(
+            self._names("cyclones-within", bbox="20,-92,31,-80"), ["gulf", "florida"]
+        )
+        self.assertEqual(
+            self._names("cyclones-within", bbox="20,275,26,277"), ["florida"]
+        )
+
+    def test_within_bbox_across_antimeridian(self):
+        self.assertEqual(
+            self._names("cyclones-within", bbox="10,175,20,-175"), ["dateline"]
+        )
+        self.assertEqual(
+            self._names(
+                "cyclones-within", bbox="10,175,20,-175", tracks="forecasts"
+            ),
+            [],
+        )
+
+    def test_near_nearest_first(self):
+        self.assertEqual(
+            self._names("cyclones-near", point="24,-84", radius_km=1000),
+            ["florida", "gulf"],
+        )
+        self.assertEqual(
+            self._names("cyclones-near", point="24,-84", radius_km=200), ["florida"]
+        )
+
+    def test_near_pages_nearest_first(self):
+        params = {"format": "json", "point": "24,-84", "radius_km": 1000}
+        by_pk = {cyclone.pk: name for name, cyclone in self.cyclones.items()}
+        page = self.client.get(reverse("cyclones-near"), {**params, "page_size": 1})
+        names = []
+        while True:
+            page = page.json()
+            names += [by_pk[cyclone["id"]] for cyclone in page["results"]]
+            if not page["next"]:
+                break
+            page = self.client.get(page["next"])
+        self.assertEqual(names, ["florida", "gulf"])
+
+    def test_near_queries(self):
+        self._names("cyclones-near", point="24,-84", radius_km=1000)
+        django_cache.clear()
+        # Cyclones, both track lookups by cell and the nested tracks.
+        with self.assertNumQueries(5):
+            self._names("cyclones-near", point="24,-84", radius_km=1000)
+
+    def test_invalid_geo_params(self):
+        self._names("cyclones-within", status_code=400)
+        self._names("cyclones-within", status_code=400, bbox="30,0,20,10")
+        self._names("cyclones-near", status_code=400, point="24", radius_km=10)
+        self._names("cyclones-near", status_code=400, point="24,-84", radius_km=1e6)
+
+    def test_track_output_has_no_cells(self):
+        response = self.client.get(reverse("cyclones"), {"format": "json"})
+        self.assertNotIn("geo_cell", response.json()[0]["forecasts"][0])
+
+
+class TrackAnalyticsTest(TestCase):
+    """Vectorized speed, heading and intensity change of tracks."""
+
+    START = dt.datetime(2020, 11, 1, tzinfo=dt.timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.north = CycloneFactory(latest_forecast_time=cls.START)
+        cls.east = CycloneFactory(latest_forecast_time=cls.START)
+        for cyclone, points in (
+            # Northward 1 degree every 6 hours.
+            (
+                cls.north,
+                [(0, 10.0, -80.0, 30), (6, 11.0, -80.0, 35), (12, 12.0, -80.0, 40)]
+                + [(24, 14.0, -80.0, 55), (30, 15.0, -80.0, 60)],
+            ),
+            # Eastward across the antimeridian, then stationary.
+            (
+                cls.east,
+                [(0, 0.0, 179.5, 20), (12, 0.0, -179.5, 40)]
+                + [(48, 0.0, -179.5, 80)],
+            ),
+        ):
+            ForecastFactory(
+                forecast_time=cls.START, forecast_hr=cyclone.pk, cyclone=cyclone
+            )
+            for hours, lat, lng, intensity in points:
+                HistoricSnapshotFactory(
+                    synoptic_time=cls.START + dt.timedelta(hours=hours),
+                    lat=lat,
+                    lng=lng,
+                    intensity=intensity,
+                    cyclone=cyclone,
+                )
+
+    def setUp(self):
+        django_cache.clear()
+
+    def _metrics(self, cyclone):
+        tracks = analytics.TrackArrays.load([self.north.pk, self.east.pk])
+        metrics = analytics.track_metrics(tracks)
+        rows = tracks.cyclone_ids == cyclone.pk
+        return {name: values[rows].tolist() for name, values in metrics.items()}
+
+    def test_speed_and_heading(self):
+        metrics = self._metrics(self.north)
+        degree_km = geo.haversine_km(10, -80, 11, -80)
+        self.assertTrue(all(map(math.isnan, metrics["speed_kmh"][:1])))
+        for speed in metrics["speed_kmh"][1:]:
+            self.assertAlmostEqual(speed, degree_km / 6, places=6)
+        self.assertEqual(metrics["heading_deg"][1:], [0.0] * 4)
+
+    def test_across_antimeridian_and_stationary(self):
+        metrics = self._metrics(self.east)
+        self.assertAlmostEqual(
+            metrics["distance_km"][1], geo.haversine_km(0, 179.5, 0, -179.5)
+        )
+        self.assertAlmostEqual(metrics["heading_deg"][1], 90.0)
+        self.assertEqual(metrics["speed_kmh"][2], 0.0)
+        self.assertTrue(math.isnan(metrics["heading_deg"][2]))
+
+    def test_intensity_change(self):
+        north = self._metrics(self.north)["intensity_change_24h"]
+        self.assertTrue(all(map(math.isnan, north[:3])))
+        self.assertEqual(north[3:], [25.0, 25.0])
+        # 24 hours before the last point lies between the first two.
+        east = self._metrics(self.east)["intensity_change_24h"]
+        self.assertAlmostEqual(east[2], 80 - (40 + 40 / 3))
+
+    def test_empty(self):
+        self.assertEqual(analytics.cyclone_analytics([]), [])
+        metrics = analytics.track_metrics(analytics.TrackArrays.load([]))
+        self.assertEqual([len(values) for values in metrics.values()], [0] * 4)
+
+    def test_analytics_view(self):
+        url = reverse("cyclones-analytics")
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"format": "json"})
+        self.assertEqual(response.status_code, 200)
+        data = {cyclone["id"]: cyclone for cyclone in response.json()}
+        self.assertEqual(data[self.north.pk]["snapshots"], 5)
+        latest = data[self.north.pk]["latest"]
+        self.assertEqual(latest["intensity_change_24h"], 25.0)
+        self.assertEqual(latest["heading_deg"], 0.0)
+        self.assertIsNone(data[self.east.pk]["latest"]["heading_deg"])
+        self.assertNotIn("points", latest)
+        # Cached per data version.
+        with self.assertNumQueries(0):
+            self.client.get(url, {"format": "json"})
+
+    def test_analytics_view_series_of_ids(self):
+        response = self.client.get(
+            reverse("cyclones-analytics"),
+            {"format": "json", "ids": str(self.east.pk), "series": "true"},
+        )
+        (cyclone,) = response.json()
+        self.assertEqual(cyclone["id"], self.east.pk)
+        self.assertEqual(len(cyclone["points"]), 3)
+        self.assertIsNone(cyclone["points"][0]["speed_kmh"])
+        self.assertEqual(cyclone["points"][-1], cyclone["latest"])
+
+    def test_analytics_view_invalid_ids(self):
+        response = self.client.get(
+            reverse("cyclones-analytics"), {"format": "json", "ids": "1,x"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CycloneStateTest(TestCase):
+    """Current state maintained by the writers."""
+
+    def setUp(self):
+        django_cache.clear()
+        self.result = dict(
+            cyclone_name="ETA-AL292020",
+            region="Atlantic",
+            img_src="",
+            link="",
+            forecast_time="2020-11-11T06:00:00-06:00",
+            forecast_track=[[12, 26.4, 276.1, 65], [0, 24.5, 275.8, 60]],
+            history_track=[[1605096000, 25.8, -83.8, 65]],
+        )
+
+    def _state(self):
+        return CycloneState.objects.get(cyclone__name="ETA-AL292020")
+
+    def test_save_db_maintains_state(self):
+        models.save_db([{"result": self.result}])
+        state = self._state()
+        self.assertEqual((state.name, state.region), ("ETA-AL292020", "Atlantic"))
+        self.assertEqual(
+            (state.synoptic_time, state.lat, state.lng, state.intensity),
+            (dt.datetime(2020, 11, 11, 12, tzinfo=dt.timezone.utc), 25.8, -83.8, 65),
+        )
+        self.assertEqual(
+            state.forecast_time, dt.datetime(2020, 11, 11, 12, tzinfo=dt.timezone.utc)
+        )
+        self.assertEqual([point["forecast_hr"] for point in state.forecasts], [0, 12])
+        self.assertEqual(state.snapshot_count, 1)
+
+    def test_save_db_advances_state(self):
+        models.save_db([{"result": self.result}])
+        # A newer forecast cycle with an older, stronger history point.
+        self.result["forecast_time"] = "2020-11-11T12:00:00-06:00"
+        self.result["forecast_track"] = [[0, 25.0, 276.0, 55]]
+        self.result["history_track"] = [[1605074400, 24.9, -84.5, 70]]
+        models.save_db([{"result": self.result}])
+        state = self._state()
+        self.assertEqual(state.intensity, 65)
+        self.assertEqual(state.snapshot_count, 2)
+        self.assertEqual(state.max_intensity, 70)
+        self.assertEqual(
+            state.first_synoptic_time,
+            dt.datetime(2020, 11, 11, 6, tzinfo=dt.timezone.utc),
+        )
+        self.assertEqual(
+            state.forecasts,
+            [{"forecast_hr": 0, "lat": 25.0, "lng": 276.0, "intensity": 55}],
+        )
+
+    def test_loadtracks_refreshes_state(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as csv_f:
+            csv_f.write(
+                "cyclone_name,region,synoptic_time,lat,lng,intensity\n"
+                "ETA-AL292020,Atlantic,2020-11-11 06:00+00,24.5,-84.2,60\n"
+            )
+        self.addCleanup(os.remove, csv_f.name)
+        call_command("loadtracks", "snapshots", csv_f.name, stdout=io.StringIO())
+        state = self._state()
+        self.assertEqual((state.snapshot_count, state.intensity), (1, 60))
+        self.assertIsNone(state.forecast_time)
+        self.assertEqual(state.forecasts, [])
+
+    def test_current_view(self):
+        models.save_db([{"result": self.result}])
+        CycloneFactory()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("cyclones-current"), {"format": "json"})
+        self.assertEqual(response.status_code, 200)
+        (state,) = response.json()
+        self.assertEqual(state["id"], Cyclone.objects.get(name="ETA-AL292020").pk)
+        self.assertEqual(state["synoptic_time"], "2020-11-11T12:00:00Z")
+        self.assertEqual(len(state["forecasts"]), 2)
+
+    def test_current_view_paginated(self):
+        models.save_db([{"result": self.result}])
+        response = self.client.get(
+            reverse("cyclones-current"), {"format": "json", "page_size": 1}
+        )
+        self.assertEqual(len(response.json()["results"]), 1)
+
+
+class TrackExportTest(TestCase):
+    """Streaming NDJSON and GeoJSON track downloads."""
+
+    START = dt.datetime(2020, 11, 11, tzinfo=dt.timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.eta = CycloneFactory(name="ETA-AL292020", region="Atlantic")
+        cls.goni = CycloneFactory(name="GONI-WP222020", region="Pacific")
+        for cyclone, lng in ((cls.eta, 275.8), (cls.goni, 125.0)):
+            for hours in (0, 6, 12):
+                HistoricSnapshotFactory(
+                    synoptic_time=cls.START + dt.timedelta(hours=hours),
+                    lat=20.0 + hours,
+                    lng=lng,
+                    intensity=60,
+                    cyclone=cyclone,
+                )
+            ForecastFactory(
+                forecast_time=cls.START,
+                forecast_hr=12,
+                lat=25.0,
+                lng=lng,
+                intensity=65,
+                cyclone=cyclone,
+            )
+
+    def _export(self, track, status_code=200, **params):
+        response = self.client.get(
+            reverse("cyclones-export", kwargs={"track": track}), params
+        )
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def _lines(self, track, **params):
+        response = self._export(track, **params)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        content = b"".join(response.streaming_content).decode()
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_ndjson_snapshots(self):
+        lines = self._lines("snapshots", cyclone=str(self.eta.pk))
+        self.assertEqual(
+            lines[0],
+            {
+                "cyclone": self.eta.pk,
+                "name": "ETA-AL292020",
+                "region": "Atlantic",
+                "synoptic_time": "2020-11-11T12:00:00Z",
+                "lat": 32.0,
+                "lng": 275.8,
+                "intensity": 60,
+            },
+        )
+        self.assertEqual(len(lines), 3)
+
+    def test_filters(self):
+        self.assertEqual(len(self._lines("snapshots")), 6)
+        self.assertEqual(
+            {line["name"] for line in self._lines("forecasts", region="Pacific")},
+            {"GONI-WP222020"},
+        )
+        lines = self._lines(
+            "snapshots", start="2020-11-11T06:00:00Z", end="2020-11-11T12:00:00"
+        )
+        self.assertEqual(
+            {line["synoptic_time"] for line in lines}, {"2020-11-11T06:00:00Z"}
+        )
+
+    def test_geojson_feature_collection(self):
+        response = self._export("forecasts", format="geojson")
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        collection = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(collection["type"], "FeatureCollection")
+        feature = next(
+            feature
+            for feature in collection["features"]
+            if feature["properties"]["name"] == "ETA-AL292020"
+        )
+        self.assertEqual(feature["geometry"]["coordinates"][1], 25.0)
+        self.assertAlmostEqual(feature["geometry"]["coordinates"][0], -84.2)
+        self.assertEqual(feature["properties"]["forecast_hr"], 12)
+        self.assertNotIn("lat", feature["properties"])
+
+    @override_settings(CYCLONE_EXPORT_CHUNK_SIZE=2)
+    def test_streams_in_chunks(self):
+        response = self._export("snapshots", format="geojson")
+        chunks = list(response.streaming_content)
+        # Header, three chunks of features and the footer.
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(len(json.loads(b"".join(chunks))["features"]), 6)
+
+    def test_invalid_params(self):
+        self._export("snapshots", status_code=400, start="yesterday")
+        self._export("snapshots", status_code=400, cyclone="eta")
+        self._export("tracks", status_code=404)
+
+
+@skipUnless(columnar.pa, "requires pyarrow")
+class ColumnarExportTest(TestCase):
+    """Incremental Parquet export of the dataset."""
+
+    START = dt.datetime(2020, 11, 11, tzinfo=dt.timezone.utc)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.eta = CycloneFactory(name="ETA-AL292020", region="North Atlantic")
+        cls.goni = CycloneFactory(name="GONI-WP222020", region="Pacific")
+        for cyclone, lat, days in ((cls.eta, 20.0, (0, 25)), (cls.goni, 10.0, (0,))):
+            for day in days:
+                HistoricSnapshotFactory(
+                    synoptic_time=cls.START + dt.timedelta(days=day),
+                    lat=lat,
+                    cyclone=cyclone,
+                )
+        ForecastFactory(forecast_time=cls.START, forecast_hr=12, cyclone=cls.eta)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _export(self, now=None):
+        return columnar.export_dataset(
+            self.directory, now=now or dt.datetime.now(tz=dt.timezone.utc)
+        )
+
+    def _dataset(self, name):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetDataset(
+            os.path.join(self.directory, name), partitioning="hive"
+        ).read()
+
+    def test_partitioned_by_region_and_month(self):
+        counts = self._export()
+        self.assertEqual(counts, {"forecasts": 1, "snapshots": 3, "cyclones": 2})
+        parts = sorted(
+            os.path.relpath(os.path.join(root, name), self.directory)
+            for root, _, names in os.walk(self.directory)
+            for name in names
+            if name.endswith(".parquet") and root != self.directory
+        )
+        self.assertEqual(
+            parts,
+            [
+                "forecasts/region=North%20Atlantic/month=2020-11/part-initial.parquet",
+                "snapshots/region=North%20Atlantic/month=2020-11/part-initial.parquet",
+                "snapshots/region=North%20Atlantic/month=2020-12/part-initial.parquet",
+                "snapshots/region=Pacific/month=2020-11/part-initial.parquet",
+            ],
+        )
+        snapshots = self._dataset("snapshots")
+        self.assertEqual(
+            sorted(snapshots.column("cyclone_id").to_pylist()),
+            sorted([self.eta.pk, self.eta.pk, self.goni.pk]),
+        )
+        self.assertIn("ingested_at", snapshots.column_names)
+        self.assertEqual(
+            self._dataset(columnar.CYCLONE_FILE).column("name").to_pylist(),
+            ["ETA-AL292020", "GONI-WP222020"],
+        )
+
+    def test_appends_since_watermark(self):
+        first = dt.datetime.now(tz=dt.timezone.utc)
+        self._export(now=first)
+        self.assertEqual(
+            columnar.read_state(self.directory),
+            {"forecasts": first, "snapshots": first},
+        )
+        HistoricSnapshotFactory(
+            synoptic_time=self.START + dt.timedelta(hours=6),
+            lat=11.0,
+            cyclone=self.goni,
+        )
+        counts = self._export()
+        self.assertEqual((counts["forecasts"], counts["snapshots"]), (0, 1))
+        self.assertEqual(self._dataset("snapshots").num_rows, 4)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(
+                    self.directory,
+                    "snapshots/region=Pacific/month=2020-11",
+                    columnar.part_name(first),
+                )
+            )
+        )
+
+    def test_lag_holds_back_recent_rows(self):
+        counts = columnar.export_dataset(self.directory, lag=dt.timedelta(hours=1))
+        self.assertEqual((counts["forecasts"], counts["snapshots"]), (0, 0))
+
+    def test_command_requires_directory(self):
+        with self.settings(CYCLONE_COLUMNAR_EXPORT_DIR=""):
+            with self.assertRaises(CommandError):
+                call_command("exportcolumnar", stdout=io.StringIO())
+        out = io.StringIO()
+        call_command("exportcolumnar", self.directory, lag_seconds=0, stdout=out)
+        self.assertIn("3 snapshots", out.getvalue())
+
+
+class StormEventsTest(TestCase):
+    """Storm updates published through Redis and streamed over SSE."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.eta = CycloneFactory(name="ETA-AL292020")
+        cls.goni = CycloneFactory(name="GONI-WP222020")
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        patcher = mock.patch.object(events, "POLL_TIMEOUT", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.result = dict(
+            cyclone_name="ETA-AL292020",
+            region=self.eta.region,
+            img_src="",
+            link="",
+            forecast_time="2020-11-11T06:00:00-06:00",
+            forecast_track=[[0, 24.5, 275.8, 60]],
+            history_track=[[1605096000, 25.8, -83.8, 65]],
+        )
+
+    def _save_db(self):
+        callbacks = []
+        with mock.patch.object(transaction, "on_commit", callbacks.append):
+            models.save_db([{"result": self.result}])
+        with mock.patch.object(backend, "redis_instance", self.redis, create=True):
+            for callback in callbacks:
+                callback()
+
+    def test_save_db_publishes_new_points(self):
+        pubsub = self.redis.pubsub()
+        pubsub.subscribe(settings.CYCLONE_EVENTS_CHANNEL)
+        self.assertEqual(pubsub.get_message(timeout=1)["type"], "subscribe")
+        self._save_db()
+        message = pubsub.get_message(timeout=1)
+        update = json.loads(message["data"])
+        self.assertEqual((update["id"], update["name"]), (self.eta.pk, "ETA-AL292020"))
+        self.assertEqual(update["latest_forecast_time"], "2020-11-11T12:00:00Z")
+        self.assertEqual([point["forecast_hr"] for point in update["forecasts"]], [0])
+        self.assertEqual(
+            update["snapshots"][0]["synoptic_time"], "2020-11-11T12:00:00Z"
+        )
+        # An unchanged storm saves and publishes nothing.
+        self._save_db()
+        self.assertIsNone(pubsub.get_message(timeout=0.1))
+
+    def test_publish_failure_is_logged(self):
+        self.redis.pipeline = mock.Mock(side_effect=redis.ConnectionError)
+        with self.assertLogs(settings.LOGGER, "ERROR"):
+            self.assertEqual(
+                events.publish_track_updates({"forecasts": [1]}, redis=self.redis),
+                0,
+            )
+
+    def _stream(self, query_string=b""):
+        """Event stream response messages while publishing both cyclones."""
+
+        async def stream():
+            communicator = ApplicationCommunicator(
+                asgi.application,
+                {
+                    "type": "http",
+                    "method": "GET",
+                    "path": "/cyclones/events/",
+                    "query_string": query_string,
+                    "headers": [],
+                },
+            )
+            await communicator.send_input({"type": "http.request", "body": b""})
+            outputs = [await communicator.receive_output(1)]
+            outputs += [await communicator.receive_output(1)]
+            for cyclone in (self.goni, self.eta):
+                data = json.dumps({"id": cyclone.pk, "name": cyclone.name})
+                # Retry until the listener subscribed.
+                while not self.redis.publish(settings.CYCLONE_EVENTS_CHANNEL, data):
+                    await asyncio.sleep(0.01)
+            outputs += [await communicator.receive_output(1)]
+            await communicator.send_input({"type": "http.disconnect"})
+            await communicator.wait(1)
+            return outputs
+
+        broadcaster = events.Broadcaster(
+            lambda: self.redis, settings.CYCLONE_EVENTS_CHANNEL
+        )
+        with mock.patch.object(events, "broadcaster", broadcaster):
+            outputs = async_to_sync(stream)()
+        self.assertIsNone(broadcaster.task)
+        return outputs
+
+    def test_event_stream_resubscribes_after_redis_error(self):
+        pubsubs = []
+        redis_pubsub = self.redis.pubsub
+
+        def pubsub(**kwargs):
+            pubsubs.append(redis_pubsub(**kwargs))
+            if len(pubsubs) == 1:
+                pubsubs[0].subscribe = mock.Mock(side_effect=redis.ConnectionError)
+            return pubsubs[-1]
+
+        self.redis.pubsub = pubsub
+        with mock.patch.object(events, "RECONNECT_DELAY", 0.01), self.assertLogs(
+            settings.LOGGER, "ERROR"
+        ):
+            _, _, event = self._stream()
+        self.assertEqual(len(pubsubs), 2)
+        self.assertTrue(event["body"].startswith(b"event: cyclone\n"))
+
+    def test_listener_failure_allows_restart(self):
+        broadcaster = events.Broadcaster(
+            mock.Mock(side_effect=RuntimeError), settings.CYCLONE_EVENTS_CHANNEL
+        )
+
+        async def subscribe():
+            broadcaster.subscribe()
+            with self.assertRaises(RuntimeError):
+                await broadcaster.task
+            self.assertIsNone(broadcaster.task)
+
+        async_to_sync(subscribe)()
+
+    def test_event_stream(self):
+        start, retry, event = self._stream()
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), start["headers"])
+        self.assertTrue(retry["body"].startswith(b"retry: "))
+        self.assertEqual(
+            event["body"],
+            b"event: cyclone\ndata: "
+            + json.dumps({"id": self.goni.pk, "name": self.goni.name}).encode()
+            + b"\n\n",
+        )
+
+    def test_event_stream_of_cyclones(self):
+        _, _, event = self._stream(f"cyclone={self.eta.pk}".encode())
+        self.assertIn(b'"ETA-AL292020"', event["body"])
+
+    @override_settings(CYCLONE_EVENTS_KEEPALIVE_SECONDS=0)
+    def test_event_stream_keepalive(self):
+        _, _, event = self._stream(f"cyclone={self.eta.pk}".encode())
+        self.assertEqual(event["body"], b": keepalive\n\n")
+
+    def test_event_stream_rejects_invalid_ids(self):
+        communicator = ApplicationCommunicator(
+            asgi.application,
+            {
+                "type": "http",
+                "method": "GET",
+                "path": "/cyclones/events/",
+                "query_string": b"cyclone=eta",
+                "headers": [],
+            },
+        )
+        start = async_to_sync(communicator.receive_output)(1)
+        self.assertEqual(start["status"], 400)
+
+
+class AsyncReadPathTest(TransactionTestCase):
+    """Cyclone list and detail served by the ASGI read path.
+
+    Views run in pool threads with their own database connections, so the
+    test data is committed.
+    """
+
+    def setUp(self):
+        django_cache.clear()
+        patcher = mock.patch.object(cache, "time")
+        patcher.start().time.return_value = 0
+        self.addCleanup(patcher.stop)
+        self.cyclone = CycloneFactory()
+        forecast_time = dt.datetime.now(tz=TZINFO) - dt.timedelta(hours=3)
+        ForecastFactory(cyclone=self.cyclone, forecast_time=forecast_time)
+        Cyclone.objects.update(latest_forecast_time=forecast_time)
+
+    def _get(
+        self,
+        path,
+        query_string=b"format=json",
+        headers=(),
+        method="GET",
+        application=asgi.application,
+    ):
+        async def get():
+            communicator = ApplicationCommunicator(
+                application,
+                {
+                    "type": "http",
+                    "method": method,
+                    "path": path,
+                    "root_path": "",
+                    "query_string": query_string,
+                    "headers": [(b"host", b"testserver"), *headers],
+                },
+            )
+            await communicator.send_input({"type": "http.request", "body": b""})
+            start = await communicator.receive_output(5)
+            body = await communicator.receive_output(5)
+            await communicator.wait(5)
+            return start["status"], dict(start["headers"]), body["body"]
+
+        return async_to_sync(get)()
+
+    def test_list_matches_wsgi(self):
+        status, headers, body = self._get("/cyclones/")
+        response = self.client.get(reverse("cyclones"), {"format": "json"})
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), response.json())
+        self.assertEqual(headers[b"ETag"].decode(), response["ETag"])
+        # Validated by the cached data version.
+        status, _, body = self._get(
+            "/cyclones/", headers=[(b"if-none-match", headers[b"ETag"])]
+        )
+        self.assertEqual((status, body), (304, b""))
+
+    def test_detail(self):
+        status, _, body = self._get(f"/cyclones/{self.cyclone.pk}/")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["name"], self.cyclone.name)
+        self.assertEqual(len(json.loads(body)["forecasts"]), 1)
+        status, _, _ = self._get(f"/cyclones/{self.cyclone.pk + 1}/")
+        self.assertEqual(status, 404)
+
+    def test_read_app_sends_view_response(self):
+        status, headers, body = self._get(
+            f"/cyclones/{self.cyclone.pk}/", application=async_api.read_app
+        )
+        response = self.client.get(
+            reverse("cyclones-detail", args=[self.cyclone.pk]), {"format": "json"}
+        )
+        self.assertEqual(status, response.status_code)
+        self.assertEqual(headers[b"Content-Type"].decode(), response["Content-Type"])
+        self.assertEqual(body, response.content)
+
+    def test_send_response_sets_cookies(self):
+        response = HttpResponse(b"ok", status=201)
+        response.set_cookie("seen", "1")
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(async_api.send_response)(response, send)
+        start, body = messages
+        self.assertEqual(start["status"], 201)
+        self.assertIn((b"Set-Cookie", b"seen=1; Path=/"), start["headers"])
+        self.assertEqual(body, {"type": "http.response.body", "body": b"ok"})
+
+    def test_writes_fall_through_to_django(self):
+        with mock.patch.object(asgi, "read_app") as read_app:
+            status, _, _ = self._get("/cyclones/", method="POST")
+        read_app.assert_not_called()
+        self.assertEqual(
+            status, self.client.post(reverse("cyclones"), {}).status_code
+        )
+
+    def test_views_run_in_pool(self):
+        threads = []
+        list_view = views.CycloneViewSet.list
+
+        def list_in_thread(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return list_view(*args, **kwargs)
+
+        with mock.patch.object(views.CycloneViewSet, "list", list_in_thread):
+            self._get("/cyclones/")
+            self._get("/cyclones/within/", b"format=json&bbox=-10,-10,10,10")
+        self.assertEqual(len(threads), 2)
+        self.assertTrue(threads[0].startswith("cyclones-read"))
+        # Other endpoints are served by Django's ASGI handler.
+        self.assertFalse(threads[1].startswith("cyclones-read"))
+
+
+class BenchApiCommandTest(TestCase):
+    """Load testing of API endpoints."""
+
+    def test_percentile(self):
+        from apps.cyclones.management.commands.benchapi import percentile
+
+        latencies = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(latencies, 50), 50)
+        self.assertEqual(percentile(latencies, 99), 99)
+        self.assertEqual(percentile(latencies[:1], 90), 1)
+        self.assertTrue(math.isnan(percentile([], 50)))
+
+    def test_load(self):
+        paths = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                paths.append(self.path)
+                self.send_response(200 if self.path == "/cyclones/" else 500)
+                self.end_headers()
+                self.wfile.write(b"[]")
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        base = f"http://127.0.0.1:{server.server_port}"
+        out = io.StringIO()
+        call_command(
+            "benchapi",
+            f"{base}/cyclones/",
+            f"{base}/missing/",
+            requests=20,
+            concurrency=4,
+            stdout=out,
+        )
+        ok, failed = out.getvalue().splitlines()
+        self.assertIn("20 requests, 0 errors", ok)
+        self.assertIn("20 requests, 20 errors", failed)
+        self.assertEqual(paths.count("/cyclones/"), 20)
+
+    def test_rejects_https(self):
+        with self.assertRaises(CommandError):
+            call_command("benchapi", "https://example.com/cyclones/")
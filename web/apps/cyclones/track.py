@@ -0,0 +1,129 @@
+"""Typed cyclone track points and their compact wire encoding.
+
+Track rows are parsed and validated once at scrape time. On the wire
+(Celery JSON, redis) a point is a plain list in field order, with
+synoptic times as epoch seconds, e.g. `[0, 24.5, 275.8, 60]`.
+"""
+
+import datetime as dt
+from typing import Iterable, List, Mapping, NamedTuple, Sequence, Type, Union
+
+from django.conf import settings
+
+LAT_RANGE = (-90.0, 90.0)
+# rammb forecasts use 0-360 degree longitudes, track history signed ones.
+LNG_RANGE = (-180.0, 360.0)
+
+
+def _validate(lat: float, lng: float, intensity: int):
+    if not LAT_RANGE[0] <= lat <= LAT_RANGE[1]:
+        raise ValueError(f"latitude {lat} out of range")
+    if not LNG_RANGE[0] <= lng <= LNG_RANGE[1]:
+        raise ValueError(f"longitude {lng} out of range")
+    if intensity < 0:
+        raise ValueError(f"negative intensity {intensity}")
+
+
+def parse_time(value: Union[str, int, float, dt.datetime]) -> dt.datetime:
+    """Parse a synoptic time into an aware UTC datetime.
+
+    Args:
+        value: Epoch seconds, ISO formatted string or datetime.
+    Returns:
+        Timezone aware datetime.
+    """
+    if isinstance(value, (int, float)):
+        return dt.datetime.fromtimestamp(value, tz=dt.timezone.utc)
+    if not isinstance(value, dt.datetime):
+        value = dt.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return value
+
+
+class ForecastPoint(NamedTuple):
+    """A forecast track point."""
+
+    forecast_hr: int
+    lat: float
+    lng: float
+    intensity: int
+
+    @classmethod
+    def parse(cls, forecast_hr, lat, lng, intensity) -> "ForecastPoint":
+        """Coerce and validate raw values."""
+        point = cls(int(forecast_hr), float(lat), float(lng), int(intensity))
+        _validate(point.lat, point.lng, point.intensity)
+        if point.forecast_hr < 0:
+            raise ValueError(f"negative forecast hour {point.forecast_hr}")
+        return point
+
+    def to_wire(self) -> list:
+        """Compact list encoding."""
+        return list(self)
+
+
+class HistoryPoint(NamedTuple):
+    """A track history point."""
+
+    synoptic_time: dt.datetime
+    lat: float
+    lng: float
+    intensity: int
+
+    @classmethod
+    def parse(cls, synoptic_time, lat, lng, intensity) -> "HistoryPoint":
+        """Coerce and validate raw values."""
+        point = cls(parse_time(synoptic_time), float(lat), float(lng), int(intensity))
+        _validate(point.lat, point.lng, point.intensity)
+        return point
+
+    def to_wire(self) -> list:
+        """Compact list encoding."""
+        return [int(self.synoptic_time.timestamp()), self.lat, self.lng, self.intensity]
+
+
+TrackPoint = Union[ForecastPoint, HistoryPoint]
+
+
+def parse_rows(
+    rows: Iterable[Sequence[str]], point_cls: Type[TrackPoint]
+) -> List[TrackPoint]:
+    """Parse scraped table rows, dropping invalid ones.
+
+    Args:
+        rows(Iterable): Row tuples of stripped strings.
+        point_cls(Type): ForecastPoint or HistoryPoint.
+    Returns:
+        List of track points.
+    """
+    points = []
+    for row in rows:
+        try:
+            points += [point_cls.parse(*row)]
+        except (TypeError, ValueError) as e:
+            settings.LOGGER.warning(f"Dropped {point_cls.__name__} row {row}: {e}")
+    return points
+
+
+def encode_track(points: Iterable[TrackPoint]) -> List[list]:
+    """Encode track points for the wire."""
+    return [point.to_wire() for point in points]
+
+
+def decode_track(
+    rows: Iterable[Union[Sequence, Mapping]], point_cls: Type[TrackPoint]
+) -> List[TrackPoint]:
+    """Decode wire rows into track points.
+
+    Args:
+        rows(Iterable): Wire lists, or field mappings as sent before the
+            compact encoding.
+        point_cls(Type): ForecastPoint or HistoryPoint.
+    Returns:
+        List of track points.
+    """
+    return [
+        point_cls.parse(**row) if isinstance(row, Mapping) else point_cls.parse(*row)
+        for row in rows
+    ]
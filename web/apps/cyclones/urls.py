@@ -15,4 +15,34 @@ urlpatterns = [
         ),
         name="cyclones",
     ),
+    path(
+        "<int:pk>/",
+        views.CycloneViewSet.as_view({"get": "retrieve"}),
+        name="cyclones-detail",
+    ),
+    path(
+        "within/",
+        views.CycloneViewSet.as_view({"get": "within"}),
+        name="cyclones-within",
+    ),
+    path(
+        "near/",
+        views.CycloneViewSet.as_view({"get": "near"}),
+        name="cyclones-near",
+    ),
+    path(
+        "current/",
+        views.CycloneViewSet.as_view({"get": "current"}),
+        name="cyclones-current",
+    ),
+    path(
+        "analytics/",
+        views.CycloneViewSet.as_view({"get": "analytics"}),
+        name="cyclones-analytics",
+    ),
+    path(
+        "export/<str:track>/",
+        views.TrackExportViewSet.as_view({"get": "retrieve"}),
+        name="cyclones-export",
+    ),
 ] + router.urls
@@ -1,36 +1,483 @@
 """Active cyclones in the last one hour."""
 
-from apps.cyclones.models import Cyclone
+from apps.cyclones.analytics import cyclone_analytics
+from apps.cyclones import export
+from apps.cyclones.cache import (
+    data_state,
+    list_cache_key,
+    list_etag,
+    list_query_digest,
+    time_bucket,
+)
+from apps.cyclones.models import Cyclone, CycloneState, Forecast, HistoricSnapshot
+from apps.cyclones.pagination import CycloneCursorPagination
+from apps.cyclones.renderers import GeoJSONRenderer, NDJSONRenderer
 from apps.cyclones.serializer import (
     CycloneSerializer,
+    CycloneStateValuesSerializer,
+    CycloneValuesSerializer,
 )
 import datetime as dt
-from django.db.models import Q
+import functools
+import operator
+from apps.cyclones import geo
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Case,
+    Exists,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Value,
+    When,
+)
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 from rest_framework import permissions
 from rest_framework import viewsets
-from rest_framework.decorators import permission_classes
+from rest_framework.decorators import action, permission_classes
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
 
 I = int
 
+# Query parameters of the time delta -> timedelta argument.
+TIME_DELTA_PARAMS = {"H": "hours", "M": "minutes", "S": "seconds", "d": "days"}
+# Track collection -> (model, ordering of its latest-N limit).
+TRACK_LATEST = {
+    "forecasts": (Forecast, ("-forecast_time", "forecast_hr")),
+    "snapshots": (HistoricSnapshot, ("-synoptic_time",)),
+}
+
+
+def time_delta(params):
+    """Time delta given by the H/M/S/d query parameters."""
+    return dt.timedelta(
+        **{
+            name: I(params.get(param, 0))
+            for param, name in TIME_DELTA_PARAMS.items()
+        }
+    )
+
+
+def csv_param(params, name, choices):
+    """Comma separated query parameter values.
+
+    Args:
+        params(QueryDict): Request query parameters.
+        name(str): Parameter name.
+        choices(Iterable): Allowed values.
+    Returns:
+        Set of values or None if the parameter is absent.
+    """
+    if name not in params:
+        return None
+    values = {value for value in params[name].split(",") if value}
+    if unknown := values - set(choices):
+        raise ValidationError(
+            {name: [f"Unknown values: {', '.join(sorted(unknown))}."]}
+        )
+    return values
+
+
+def limit_param(params, name):
+    """Positive integer query parameter or None if absent."""
+    if name not in params:
+        return None
+    try:
+        limit = I(params[name])
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValidationError({name: ["Expected a positive integer."]})
+    return limit
+
+
+def int_list_param(params, name):
+    """Comma separated integers of a query parameter or None if absent."""
+    if name not in params:
+        return None
+    try:
+        return [I(value) for value in params[name].split(",") if value]
+    except ValueError:
+        raise ValidationError({name: ["Expected comma separated integers."]})
+
+
+def datetime_param(params, name):
+    """ISO 8601 datetime query parameter, UTC if naive, or None if absent."""
+    if name not in params:
+        return None
+    try:
+        value = parse_datetime(params[name])
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({name: ["Expected an ISO 8601 datetime."]})
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt.timezone.utc)
+    return value
+
+
+def track_queryset(related_name, limit=None):
+    """Points of a track collection, optionally the latest `limit` ones.
+
+    Args:
+        related_name(str): forecasts or snapshots.
+        limit(int): Points kept per cyclone.
+    Returns:
+        Track queryset.
+    """
+    model, ordering = TRACK_LATEST[related_name]
+    if limit is None:
+        return model.objects.all()
+    latest = model.objects.filter(cyclone=OuterRef("cyclone")).order_by(*ordering)
+    return model.objects.filter(pk__in=latest.values("pk")[:limit]).order_by(
+        *ordering
+    )
+
+
+def latest_track_prefetch(related_name, limit=None):
+    """Prefetch of a track collection, optionally its latest `limit` points.
+
+    Args:
+        related_name(str): forecasts or snapshots.
+        limit(int): Points kept per cyclone.
+    Returns:
+        Prefetch or the plain related name.
+    """
+    if limit is None:
+        return related_name
+    return Prefetch(related_name, queryset=track_queryset(related_name, limit))
+
+
+def float_params(params, name, count):
+    """Comma separated floats of a required query parameter."""
+    try:
+        values = [float(value) for value in params[name].split(",")]
+    except KeyError:
+        raise ValidationError({name: ["This parameter is required."]})
+    except ValueError:
+        values = []
+    if len(values) != count:
+        raise ValidationError({name: [f"Expected {count} comma separated numbers."]})
+    return values
+
+
+def geo_matches(track_models, box, radius_center=None):
+    """Cyclones with a track point in a box, or a circle it encloses.
+
+    Candidate points come from the grid cells overlapping the box, read
+    from the geo cell index, then are checked exactly.
+
+    Args:
+        track_models(Iterable): Track models to search.
+        box(BoundingBox): Search box.
+        radius_center(tuple): Circle (lat, lng, radius_km) within the box.
+    Returns:
+        Dict of cyclone ids to the distance in km of their nearest point,
+        0 without a circle.
+    """
+    cells = functools.reduce(
+        operator.or_, (Q(geo_cell__range=cells) for cells in box.cell_ranges())
+    )
+    matches = {}
+    for model in track_models:
+        for cyclone_id, lat, lng in (
+            model.objects.filter(cells, cyclone__isnull=False)
+            .values_list("cyclone_id", "lat", "lng")
+            .iterator()
+        ):
+            if radius_center is None:
+                if box.contains(lat, lng):
+                    matches[cyclone_id] = 0.0
+                continue
+            center_lat, center_lng, radius_km = radius_center
+            distance = geo.haversine_km(center_lat, center_lng, lat, lng)
+            if distance <= radius_km and distance < matches.get(
+                cyclone_id, float("inf")
+            ):
+                matches[cyclone_id] = distance
+    return matches
+
+
 @permission_classes((permissions.AllowAny,))
 class CycloneViewSet(viewsets.ModelViewSet):
-    """Cyclone get only viewset."""
+    """Cyclone get only viewset.
+
+    Query parameters besides the time delta:
+        page_size, cursor: Keyset pagination, the full list when neither
+            is given.
+        include: Nested tracks to return, e.g. `include=snapshots` or
+            `include=` for cyclone metadata only.
+        fields: Cyclone fields to return, e.g. `fields=id,name`.
+        forecasts_limit, snapshots_limit: Latest points kept per track.
+
+    The within and near lists take the same parameters and are restricted
+    to cyclones with a track point in a bounding box or radius:
+        bbox: south,west,north,east in degrees, for within.
+        point, radius_km: lat,lng and a distance, for near, nearest first.
+        tracks: Tracks to search, forecasts and snapshots by default.
+
+    The analytics list returns the translation speed, heading and 24h
+    intensity change of the cyclones' historic snapshots instead:
+        ids: Comma separated cyclone ids, all listed cyclones by default.
+        series: `true` for every snapshot, the latest one only otherwise.
+
+    The current list returns the maintained current state of the cyclones,
+    their latest snapshot and forecast cycle, read from one table.
+    """
 
     serializer_class = CycloneSerializer
+    pagination_class = CycloneCursorPagination
     http_method_names = ["get", "list"]
     lookup_url_kwarg = "pk"
 
+    def get_serializer_context(self):
+        params = self.request.query_params
+        return {
+            **super().get_serializer_context(),
+            "include": csv_param(params, "include", CycloneSerializer.TRACKS),
+            "fields": csv_param(
+                params,
+                "fields",
+                set(CycloneSerializer().get_fields()) - set(CycloneSerializer.TRACKS),
+            ),
+        }
+
+    def get_track_querysets(self):
+        """Track querysets of the included collections by related name."""
+        params = self.request.query_params
+        include = csv_param(params, "include", CycloneSerializer.TRACKS)
+        return {
+            related_name: track_queryset(
+                related_name, limit_param(params, f"{related_name}_limit")
+            )
+            for related_name in CycloneSerializer.TRACKS
+            if include is None or related_name in include
+        }
+
+    def list(self, request, *args, **kwargs):
+        """List cyclones, cached per data version and normalized query.
+
+        Responses carry ETag and Last-Modified validators derived from the
+        data version, matching conditional requests get a 304 without any
+        database query.
+        """
+        params = request.query_params
+        version, modified = data_state()
+        digest = list_query_digest(
+            time_delta(params).total_seconds(),
+            {
+                name: value
+                for name, value in params.items()
+                if name not in TIME_DELTA_PARAMS
+            },
+            request.get_host() + request.path,
+        )
+        cache_key = list_cache_key(version, digest, time_bucket())
+        etag = list_etag(version, digest, request.accepted_renderer.format)
+        if (
+            not_modified := get_conditional_response(
+                request, etag=etag, last_modified=modified
+            )
+        ) is not None:
+            return not_modified
+        if (data := cache.get(cache_key)) is None:
+            data = self._list_data()
+            cache.set(
+                cache_key, data, timeout=settings.CYCLONE_LIST_CACHE_TIMEOUT
+            )
+        return Response(
+            data, headers={"ETag": etag, "Last-Modified": http_date(modified)}
+        )
+
+    @action(detail=False)
+    def within(self, request, *args, **kwargs):
+        """List cyclones with a track point in a bounding box."""
+        return self.list(request, *args, **kwargs)
+
+    @action(detail=False)
+    def near(self, request, *args, **kwargs):
+        """List cyclones with a track point within a radius, nearest first."""
+        return self.list(request, *args, **kwargs)
+
+    @action(detail=False)
+    def current(self, request, *args, **kwargs):
+        """List the current state of cyclones."""
+        return self.list(request, *args, **kwargs)
+
+    @action(detail=False)
+    def analytics(self, request, *args, **kwargs):
+        """List track analytics of cyclones."""
+        return self.list(request, *args, **kwargs)
+
+    def get_geo_matches(self):
+        """Cyclone ids to distances for the within and near lists."""
+        params = self.request.query_params
+        tracks = csv_param(params, "tracks", CycloneSerializer.TRACKS)
+        track_models = [
+            TRACK_LATEST[name][0]
+            for name in CycloneSerializer.TRACKS
+            if tracks is None or name in tracks
+        ]
+        if self.action == "within":
+            try:
+                box = geo.BoundingBox.parse(*float_params(params, "bbox", 4))
+            except ValueError as e:
+                raise ValidationError({"bbox": [str(e)]})
+            return geo_matches(track_models, box)
+        lat, lng = float_params(params, "point", 2)
+        (radius_km,) = float_params(params, "radius_km", 1)
+        if not -90 <= lat <= 90:
+            raise ValidationError({"point": ["Expected a latitude in [-90, 90]."]})
+        if not 0 < radius_km <= settings.CYCLONE_GEO_MAX_RADIUS_KM:
+            raise ValidationError(
+                {
+                    "radius_km": [
+                        "Expected a distance up to "
+                        f"{settings.CYCLONE_GEO_MAX_RADIUS_KM} km."
+                    ]
+                }
+            )
+        box = geo.BoundingBox.around(lat, lng, radius_km)
+        return geo_matches(track_models, box, (lat, lng, radius_km))
+
+    @property
+    def cursor_ordering(self):
+        """Order of the list as `get_queryset` sorts it, for keyset paging."""
+        if self.action == "current":
+            return ("forecast_time", "id")
+        if self.action == "near":
+            return ("distance_rank", "id")
+        return ("latest_forecast_time", "id")
+
+    def _list_data(self):
+        """List cyclones through the `.values()` serialization path."""
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        # The cursor position, not serialized.
+        position = self.cursor_ordering[0]
+        if self.action == "current":
+            queryset = CycloneStateValuesSerializer.values(queryset)
+            page = self.paginate_queryset(queryset)
+            data = CycloneStateValuesSerializer(queryset if page is None else page).data
+        elif self.action == "analytics":
+            queryset = queryset.values(*dict.fromkeys(("id", "name", position)))
+            page = self.paginate_queryset(queryset)
+            data = cyclone_analytics(
+                queryset if page is None else page,
+                series=self.request.query_params.get("series") == "true",
+            )
+        else:
+            context = self.get_serializer_context()
+            queryset = queryset.values(
+                *dict.fromkeys(
+                    CycloneValuesSerializer.value_fields(context) + [position]
+                )
+            )
+            page = self.paginate_queryset(queryset)
+            data = CycloneValuesSerializer(
+                queryset if page is None else page,
+                tracks=self.get_track_querysets(),
+                context=context,
+            ).data
+        if page is not None:
+            return self.get_paginated_response(data).data
+        return data
+
+    def paginate_queryset(self, queryset):
+        if not self.paginator.is_requested(self.request):
+            return None
+        return super().paginate_queryset(queryset)
+
     def get_queryset(self):
-        queryset = Cyclone.objects.prefetch_related("forecasts", "snapshots")
         params = self.request.query_params
-        tm_delta = dt.timedelta(
-            **dict(
-                hours=I(params.get("H", 0)),
-                minutes=I(params.get("M", 0)),
-                seconds=I(params.get("S", 0)),
-                days=I(params.get("d", 0)),
+        if self.action == "current":
+            return CycloneState.objects.filter(
+                forecast_time__lte=timezone.now() - time_delta(params)
+            ).order_by("forecast_time", "cyclone")
+        include = csv_param(params, "include", CycloneSerializer.TRACKS)
+        queryset = Cyclone.objects.prefetch_related(
+            *(
+                latest_track_prefetch(
+                    related_name, limit_param(params, f"{related_name}_limit")
+                )
+                for related_name in CycloneSerializer.TRACKS
+                if include is None or related_name in include
+            )
+        )
+        if self.action == "retrieve":
+            # Any storm has a detail, also without forecasts yet.
+            return queryset
+        tm_delta = time_delta(params)
+        # A semi-join per storm instead of joining every forecast row and
+        # de-duplicating, ordered by the denormalized latest forecast time.
+        queryset = queryset.filter(
+            Exists(
+                Forecast.objects.filter(
+                    cyclone=OuterRef("pk"),
+                    forecast_time__lte=timezone.now() - tm_delta,
+                )
             )
+        ).order_by("latest_forecast_time", "pk")
+        if self.action == "analytics" and "ids" in params:
+            queryset = queryset.filter(pk__in=int_list_param(params, "ids"))
+        if self.action not in ("within", "near"):
+            return queryset
+        matches = self.get_geo_matches()
+        queryset = queryset.filter(pk__in=list(matches))
+        if self.action == "near":
+            nearest = sorted(matches, key=matches.get)
+            queryset = queryset.annotate(
+                distance_rank=Case(
+                    *(When(pk=pk, then=Value(rank)) for rank, pk in enumerate(nearest)),
+                    default=Value(len(nearest)),
+                    output_field=IntegerField(),
+                )
+            ).order_by("distance_rank", "pk")
+        return queryset
+
+
+@permission_classes((permissions.AllowAny,))
+class TrackExportViewSet(viewsets.ViewSet):
+    """Streaming download of the forecasts or snapshots track points.
+
+    Points are written as NDJSON lines or a GeoJSON FeatureCollection, by
+    `format` or the Accept header, newest first per cyclone.
+
+    Query parameters:
+        cyclone: Comma separated cyclone ids.
+        region: Comma separated cyclone regions.
+        start, end: ISO 8601 bounds of the point times, end excluded.
+    """
+
+    renderer_classes = (NDJSONRenderer, GeoJSONRenderer)
+
+    def retrieve(self, request, track=None):
+        if track not in export.EXPORT_TRACKS:
+            raise NotFound(f"Unknown track {track}.")
+        params = request.query_params
+        regions = params.get("region")
+        points = export.track_points(
+            track,
+            cyclone_ids=int_list_param(params, "cyclone"),
+            regions=None if regions is None else regions.split(","),
+            start=datetime_param(params, "start"),
+            end=datetime_param(params, "end"),
+        )
+        chunk_size = settings.CYCLONE_EXPORT_CHUNK_SIZE
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            export.STREAMS[renderer.format](
+                export.point_records(track, points, chunk_size), chunk_size
+            ),
+            content_type=renderer.media_type,
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{track}.{renderer.format}"'
         )
-        return queryset.filter(
-            Q(forecasts__forecast_time__lte=dt.datetime.now() - tm_delta)
-        ).order_by('forecasts__forecast_time').distinct()
+        return response
@@ -11,4 +11,8 @@ if not settings.TEST:
     # Flush before start. No need in demo.
     redis_instance.flushdb()
 
+    # Queued scraped results must outlive restarts, never flushed.
+    results_redis = redis.StrictRedis(
+        host=settings.REDIS_HOST, db=settings.CYCLONE_RESULTS_REDIS_DB)
+
 __all__ = ['celery_app']
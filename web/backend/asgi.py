@@ -2,15 +2,41 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Storm update events are streamed by their own ASGI app, the cyclone list and
+detail are served by the async read path and everything else by Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 """
 
 import os
+import re
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+django_application = get_asgi_application()
+
+# Imported once Django is set up.
+from apps.cyclones.async_api import read_app  # noqa: E402
+from apps.cyclones.events import sse_app  # noqa: E402
+
+EVENTS_PATH = "/cyclones/events/"
+# Cyclone list and detail.
+READ_PATH = re.compile(r"/cyclones/(?:\d+/)?")
+
+
+async def application(scope, receive, send):
+    """Route the event stream to `sse_app`, the cyclone reads to `read_app`
+    and the rest to Django."""
+    if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+        await sse_app(scope, receive, send)
+    elif (
+        scope["type"] == "http"
+        and scope["method"] in ("GET", "HEAD")
+        and READ_PATH.fullmatch(scope["path"])
+    ):
+        await read_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,54 +1,237 @@
 """Celery tasks for cyclone scraper."""
 
+import datetime as dt
 import json
 
 import backend
-from apps.cyclones import models
-from apps.cyclones.scraper import scraper
+import msgpack
+import redis
+from apps.cyclones import columnar, models, partitions
+from apps.cyclones.scraper import async_scraper, scraper
 from backend.celery import app
 from django.conf import settings
+from django.utils import timezone
+
+RESULTS_CONSUMER = "saver"
+
+SCRAPER_ENGINES = {
+    "threaded": scraper.scrape_page,
+    "async": async_scraper.scrape_page,
+}
 
 
 @app.task(bind=True)
 def cyclone_scheduler(task_self: app.task):
     """Schedules cyclone scraper defined in cron settings."""
     fetch_sig_cb = fetch_result_cb.signature()
-    scraper.scrape_page(lambda result: fetch_sig_cb.delay(result))
+    scrape_page = SCRAPER_ENGINES[settings.CYCLONE_SCRAPER_ENGINE]
+    scrape_page(
+        lambda result: fetch_sig_cb.delay(result),
+        conditional=settings.CYCLONE_SCRAPER_CONDITIONAL,
+    )
 
 
-@app.task
+@app.task(ignore_result=True)
 def fetch_result_cb(scraped_data: dict):
-    """Schedules task that enqeueus  scrapped results.
+    """Appends a msgpack packed scrapped result to the results stream.
 
     Args:
-        scraped_data(dict): Scrapped cyclone data.
+        scraped_data(dict): Scrapped cyclone data with wire encoded tracks.
+    """
+    backend.results_redis.xadd(
+        settings.CYCLONE_RESULTS_STREAM, {"data": msgpack.packb(scraped_data)}
+    )
+
+
+def ensure_results_group():
+    """Create the saver consumer group and the stream if missing."""
+    try:
+        backend.results_redis.xgroup_create(
+            settings.CYCLONE_RESULTS_STREAM,
+            settings.CYCLONE_RESULTS_GROUP,
+            id="0",
+            mkstream=True,
+        )
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def read_results() -> list:
+    """Read a batch of results in one pipelined round trip.
+
+    New entries are read with a blocking read; entries delivered to a saver
+    that never acknowledged them within CYCLONE_RESULTS_CLAIM_MS are
+    claimed again.
+
     Returns:
-        Scrapped cyclone dictionary.
+        List of (entry id, fields) stream entries.
+    """
+    stream = settings.CYCLONE_RESULTS_STREAM
+    group = settings.CYCLONE_RESULTS_GROUP
+    pipe = backend.results_redis.pipeline(transaction=False)
+    pipe.xpending_range(stream, group, "-", "+", settings.CYCLONE_RESULTS_BATCH)
+    pipe.xreadgroup(
+        group,
+        RESULTS_CONSUMER,
+        {stream: ">"},
+        count=settings.CYCLONE_RESULTS_BATCH,
+        block=settings.CYCLONE_RESULTS_BLOCK_MS,
+    )
+    pending, new_entries = pipe.execute()
+    entries = [
+        entry for _, stream_entries in new_entries or [] for entry in stream_entries
+    ]
+    if deliveries := {
+        each_pending["message_id"]: each_pending["times_delivered"]
+        for each_pending in pending
+        if each_pending["time_since_delivered"] >= settings.CYCLONE_RESULTS_CLAIM_MS
+    }:
+        claimed = backend.results_redis.xclaim(
+            stream,
+            group,
+            RESULTS_CONSUMER,
+            settings.CYCLONE_RESULTS_CLAIM_MS,
+            list(deliveries),
+        )
+        dead = [
+            (entry_id, fields)
+            for entry_id, fields in claimed
+            if fields
+            and deliveries[entry_id] >= settings.CYCLONE_RESULTS_MAX_DELIVERIES
+        ]
+        dead_letter(dead)
+        entries += [entry for entry in claimed if entry not in dead]
+    # Entries deleted while pending come back without fields.
+    return [(entry_id, fields) for entry_id, fields in entries if fields]
+
+
+def dead_letter(entries: list) -> None:
+    """Move entries the saver keeps failing on to the dead letter stream.
+
+    Args:
+        entries(list): List of (entry id, fields) stream entries.
     """
-    return scraped_data
+    if not entries:
+        return
+    entry_ids = [entry_id for entry_id, _ in entries]
+    pipe = backend.results_redis.pipeline(transaction=True)
+    for entry_id, fields in entries:
+        pipe.xadd(
+            settings.CYCLONE_RESULTS_DEAD_STREAM, {**fields, b"entry_id": entry_id}
+        )
+    pipe.xack(
+        settings.CYCLONE_RESULTS_STREAM, settings.CYCLONE_RESULTS_GROUP, *entry_ids
+    )
+    pipe.xdel(settings.CYCLONE_RESULTS_STREAM, *entry_ids)
+    pipe.execute()
+    settings.LOGGER.error(
+        f"Moved results {', '.join(each.decode() for each in entry_ids)} to "
+        f"{settings.CYCLONE_RESULTS_DEAD_STREAM} after "
+        f"{settings.CYCLONE_RESULTS_MAX_DELIVERIES} deliveries"
+    )
+
+
+def split_batches(entries: list) -> list:
+    """Split entries into save batches bounded in count and packed size.
+
+    Args:
+        entries(list): List of (entry id, fields) stream entries.
+    Returns:
+        List of lists of entries.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for entry in entries:
+        size = len(entry[1][b"data"])
+        if batch and (
+            len(batch) == settings.CYCLONE_SAVE_BATCH_SIZE
+            or batch_bytes + size > settings.CYCLONE_SAVE_BATCH_BYTES
+        ):
+            batches += [batch]
+            batch = []
+            batch_bytes = 0
+        batch += [entry]
+        batch_bytes += size
+    if batch:
+        batches += [batch]
+    return batches
 
 
 @app.task
 def cycle_stale_results():
-    """Save in storage layer and delete stale data."""
-    data = []
-    pipe = backend.redis_instance.pipeline(transaction=True)
-    # Store to db and delete from redis.
-    # There can be only so many cyclones at one given point!
-    for key in backend.redis_instance.scan_iter("celery-task-meta*"):
-        data += [json.loads(backend.redis_instance.get(key))]
-        pipe.delete(key)
-    pipe.execute()
-    if data:
-        save_db_task.signature().delay(json.dumps(data))
+    """Hand batches of scraped results from the results stream to the saver.
+
+    Packed results are forwarded as is. Entries stay pending until
+    `save_db_task` acknowledges them, and are claimed again if it never does.
+    """
+    ensure_results_group()
+    for batch in split_batches(read_results()):
+        save_db_task.signature().delay(
+            [fields[b"data"] for _, fields in batch],
+            [entry_id.decode() for entry_id, _ in batch],
+        )
 
 
 @app.task
-def save_db_task(serialized_data: str):
+def prune_superseded_forecasts():
+    """Compact forecast cycles superseded for longer than the retention."""
+    deleted = models.prune_superseded_forecasts(
+        timezone.now() - dt.timedelta(days=settings.CYCLONE_FORECAST_RETENTION_DAYS),
+        batch_size=settings.CYCLONE_PRUNE_BATCH_SIZE,
+        max_batches=settings.CYCLONE_PRUNE_MAX_BATCHES,
+    )
+    settings.LOGGER.info(f"Pruned {deleted} superseded forecasts")
+
+
+@app.task(serializer="msgpack")
+def save_db_task(packed_results: list, entry_ids: list = None):
     """Task call to batch save cyclone data.
 
     Args:
-        serialized_data(str): Serialized string of list of cyclone data.
+        packed_results(list): msgpack packed cyclone data, or a JSON string
+            of the whole list as queued by earlier releases.
+        entry_ids(list): Results stream entries to acknowledge once saved.
     """
-    models.save_db(json.loads(serialized_data))
-    settings.LOGGER.info("Cyclone data stored")
+    if isinstance(packed_results, str):
+        data = json.loads(packed_results)
+    else:
+        data = [{"result": msgpack.unpackb(packed)} for packed in packed_results]
+    results = models.save_db(data)
+    settings.LOGGER.info(
+        "Cyclone data stored: "
+        + ", ".join(
+            f"{name} {result.inserted} inserted {result.skipped} skipped"
+            for name, result in results.items()
+        )
+    )
+    if entry_ids:
+        pipe = backend.results_redis.pipeline(transaction=True)
+        pipe.xack(
+            settings.CYCLONE_RESULTS_STREAM, settings.CYCLONE_RESULTS_GROUP, *entry_ids
+        )
+        pipe.xdel(settings.CYCLONE_RESULTS_STREAM, *entry_ids)
+        pipe.execute()
+
+
+@app.task
+def ensure_track_partitions():
+    """Keep monthly partitions ahead of time for partitioned track tables."""
+    if created := partitions.ensure_upcoming_partitions(
+        settings.CYCLONE_PARTITION_MONTHS_AHEAD
+    ):
+        settings.LOGGER.info(f"Created track partitions {', '.join(created)}")
+
+
+@app.task
+def export_columnar_dataset():
+    """Append newly ingested rows to the columnar dataset, when configured."""
+    if not settings.CYCLONE_COLUMNAR_EXPORT_DIR:
+        return
+    counts = columnar.export_dataset(
+        settings.CYCLONE_COLUMNAR_EXPORT_DIR,
+        lag=dt.timedelta(seconds=settings.CYCLONE_COLUMNAR_EXPORT_LAG_SECONDS),
+        chunk_size=settings.CYCLONE_COLUMNAR_EXPORT_CHUNK_SIZE,
+    )
+    settings.LOGGER.info(f"Exported columnar dataset {counts}")
@@ -0,0 +1,173 @@
+"""Tests for cyclone celery tasks."""
+
+import json
+from unittest import mock
+
+import backend
+import msgpack
+from apps.cyclones.scraper.test_scraper import MockPatcherTestCase
+from backend.cron import cyclone_task
+from django.conf import settings
+from django.test import override_settings
+
+RESULT = {"cyclone_name": "ETA-AL292020", "forecast_track": [[0, 24.5, 275.8, 60]]}
+PACKED = msgpack.packb(RESULT)
+
+
+class RedisPatcherTestCase(MockPatcherTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(backend, "results_redis", create=True)
+        self.redis = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pipe = self.redis.pipeline.return_value
+
+
+class ResultsStreamTest(RedisPatcherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mock_save_db_task = self._mock_patch_cleanup(cyclone_task, "save_db_task")
+        self.pending = [
+            {
+                "message_id": b"1-0",
+                "time_since_delivered": settings.CYCLONE_RESULTS_CLAIM_MS,
+                "times_delivered": 1,
+            },
+            {"message_id": b"2-0", "time_since_delivered": 10, "times_delivered": 1},
+        ]
+        self.new_entries = [
+            [
+                settings.CYCLONE_RESULTS_STREAM.encode(),
+                [(b"3-0", {b"data": PACKED}), (b"4-0", {b"data": PACKED})],
+            ]
+        ]
+        self.pipe.execute.return_value = [self.pending, self.new_entries]
+        self.redis.xclaim.return_value = [(b"1-0", {b"data": PACKED})]
+
+    def _delayed_batches(self):
+        return [
+            call[0]
+            for call in self.mock_save_db_task.signature.return_value.delay.call_args_list
+        ]
+
+    def test_fetch_result_cb_appends_to_stream(self):
+        cyclone_task.fetch_result_cb(RESULT)
+        self.redis.xadd.assert_called_once_with(
+            settings.CYCLONE_RESULTS_STREAM, {"data": PACKED}
+        )
+
+    def test_cycle_stale_results_claims_and_reads_batch(self):
+        cyclone_task.cycle_stale_results()
+        self.redis.scan_iter.assert_not_called()
+        self.redis.get.assert_not_called()
+        self.pipe.execute.assert_called_once()
+        self.redis.xclaim.assert_called_once_with(
+            settings.CYCLONE_RESULTS_STREAM,
+            settings.CYCLONE_RESULTS_GROUP,
+            cyclone_task.RESULTS_CONSUMER,
+            settings.CYCLONE_RESULTS_CLAIM_MS,
+            [b"1-0"],
+        )
+        self.assertEqual(
+            self._delayed_batches(), [([PACKED] * 3, ["3-0", "4-0", "1-0"])]
+        )
+
+    @override_settings(CYCLONE_SAVE_BATCH_SIZE=2)
+    def test_cycle_stale_results_splits_by_count(self):
+        cyclone_task.cycle_stale_results()
+        self.assertEqual(
+            self._delayed_batches(),
+            [([PACKED] * 2, ["3-0", "4-0"]), ([PACKED], ["1-0"])],
+        )
+
+    @override_settings(CYCLONE_SAVE_BATCH_BYTES=len(PACKED))
+    def test_cycle_stale_results_splits_by_size(self):
+        cyclone_task.cycle_stale_results()
+        self.assertEqual(len(self._delayed_batches()), 3)
+
+    def test_cycle_stale_results_dead_letters_undeliverable(self):
+        self.pending[0]["times_delivered"] = settings.CYCLONE_RESULTS_MAX_DELIVERIES
+        with mock.patch.object(settings, "LOGGER") as logger:
+            cyclone_task.cycle_stale_results()
+        self.pipe.xadd.assert_called_once_with(
+            settings.CYCLONE_RESULTS_DEAD_STREAM, {b"data": PACKED, b"entry_id": b"1-0"}
+        )
+        self.pipe.xack.assert_called_once_with(
+            settings.CYCLONE_RESULTS_STREAM, settings.CYCLONE_RESULTS_GROUP, b"1-0"
+        )
+        self.pipe.xdel.assert_called_once_with(settings.CYCLONE_RESULTS_STREAM, b"1-0")
+        logger.error.assert_called_once()
+        self.assertEqual(self._delayed_batches(), [([PACKED] * 2, ["3-0", "4-0"])])
+
+    def test_cycle_stale_results_idle_stream(self):
+        self.pipe.execute.return_value = [[], []]
+        cyclone_task.cycle_stale_results()
+        self.redis.xclaim.assert_not_called()
+        self.mock_save_db_task.signature.assert_not_called()
+
+
+class SaveDbTaskTest(RedisPatcherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.mock_save_db = self._mock_patch_cleanup(cyclone_task.models, "save_db")
+        self.mock_save_db.return_value = {}
+
+    def test_save_db_task_acknowledges_after_save(self):
+        cyclone_task.save_db_task([PACKED], ["1-0"])
+        self.mock_save_db.assert_called_once_with([{"result": RESULT}])
+        self.pipe.xack.assert_called_once_with(
+            settings.CYCLONE_RESULTS_STREAM, settings.CYCLONE_RESULTS_GROUP, "1-0"
+        )
+        self.pipe.xdel.assert_called_once_with(settings.CYCLONE_RESULTS_STREAM, "1-0")
+        self.pipe.execute.assert_called_once()
+
+    def test_save_db_task_accepts_json_payload(self):
+        cyclone_task.save_db_task(json.dumps([{"result": RESULT}]))
+        self.mock_save_db.assert_called_once_with([{"result": RESULT}])
+        self.pipe.execute.assert_not_called()
+
+
+class PruneSupersededForecastsTaskTest(MockPatcherTestCase):
+    @override_settings(
+        CYCLONE_FORECAST_RETENTION_DAYS=3,
+        CYCLONE_PRUNE_BATCH_SIZE=10,
+        CYCLONE_PRUNE_MAX_BATCHES=2,
+    )
+    def test_prunes_past_retention(self):
+        mock_prune = self._mock_patch_cleanup(
+            cyclone_task.models, "prune_superseded_forecasts"
+        )
+        mock_prune.return_value = 0
+        cyclone_task.prune_superseded_forecasts()
+        (cutoff,), options = mock_prune.call_args
+        self.assertAlmostEqual(
+            cutoff,
+            cyclone_task.timezone.now() - cyclone_task.dt.timedelta(days=3),
+            delta=cyclone_task.dt.timedelta(seconds=5),
+        )
+        self.assertEqual(options, {"batch_size": 10, "max_batches": 2})
+
+
+class ExportColumnarDatasetTaskTest(MockPatcherTestCase):
+    def setUp(self):
+        self.mock_export = self._mock_patch_cleanup(
+            cyclone_task.columnar, "export_dataset"
+        )
+        self.mock_export.return_value = {}
+
+    @override_settings(CYCLONE_COLUMNAR_EXPORT_DIR="")
+    def test_disabled_without_directory(self):
+        cyclone_task.export_columnar_dataset()
+        self.mock_export.assert_not_called()
+
+    @override_settings(
+        CYCLONE_COLUMNAR_EXPORT_DIR="/data/cyclones",
+        CYCLONE_COLUMNAR_EXPORT_LAG_SECONDS=60,
+        CYCLONE_COLUMNAR_EXPORT_CHUNK_SIZE=10,
+    )
+    def test_exports_to_directory(self):
+        cyclone_task.export_columnar_dataset()
+        self.mock_export.assert_called_once_with(
+            "/data/cyclones",
+            lag=cyclone_task.dt.timedelta(seconds=60),
+            chunk_size=10,
+        )
@@ -45,13 +45,6 @@ sys.path.extend(
 LOGGER.info(f"Starting {PROJECT_NAME} app")
 LOGGER.info(f"current working dir {os.getcwd()}")
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "TIMEOUT": 1800,
-    }
-}
-
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
 
@@ -127,6 +120,18 @@ DATABASES = {
         "NAME": os.getenv("DB_NAME"),
         "USER": os.getenv("DB_USER"),
         "PASSWORD": os.getenv("DB_USER_PWD"),
+        # Seconds a connection is reused across requests and tasks, 0 to
+        # close it after each. Leave at 0 for gevent workers, a connection
+        # per greenlet is never reused, pool them with PgBouncer instead.
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 0)),
+        # Ping reused connections when a request or task starts, see
+        # apps.apihealth.db.
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "1") == "1",
+        # Needed behind PgBouncer in transaction pooling mode.
+        "DISABLE_SERVER_SIDE_CURSORS": bool(
+            os.getenv("DB_DISABLE_SERVER_SIDE_CURSORS", None)
+        ),
+        "OPTIONS": {"connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", 10))},
     } if not TEST else {
         "ENGINE": "django.db.backends.postgresql_psycopg2",
         "HOST": "localhost",
@@ -137,6 +142,11 @@ DATABASES = {
     }
 }
 
+# libpq connection string of the PgBouncer admin console, e.g.
+# "host=pgbouncer dbname=pgbouncer user=postgres", for its pool metrics in
+# the database health check.
+DB_POOLER_ADMIN_DSN = os.getenv("DB_POOLER_ADMIN_DSN", "")
+DB_HEALTH_TIMEOUT_SECONDS = 5
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -198,6 +208,7 @@ REST_FRAMEWORK = {
     ),
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.BrowsableAPIRenderer",
+        "apps.cyclones.renderers.FastJSONRenderer",
         "rest_framework.renderers.JSONOpenAPIRenderer",
     ],
     # Sets the default test format to JSON for all requests.
@@ -213,9 +224,20 @@ if not os.path.exists(STATIC_ROOT):
 
 
 REDIS_HOST = "redis"
+# Shared by all workers; tests use a process local cache instead.
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"redis://{REDIS_HOST}:6379/1",
+        "TIMEOUT": 1800,
+    } if not TEST else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "TIMEOUT": 1800,
+    }
+}
 CELERY_BROKER_URL = "redis://redis:6379/"
 CELERY_RESULT_BACKEND = "redis://redis:6379/0"
-CELERY_ACCEPT_CONTENT = ["application/json"]
+CELERY_ACCEPT_CONTENT = ["application/json", "application/x-msgpack"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_ENABLE_UTC = True
@@ -223,6 +245,76 @@ CELERY_TIMEZONE = "America/Chicago"
 CELERY_IMPORTS = [
     "backend.cron.cyclone_task",
 ]
+# Only parse and dispatch storm pages that changed since the last crawl.
+CYCLONE_SCRAPER_CONDITIONAL = True
+# Storm page fetch pool size and (connect, read) timeouts in seconds.
+CYCLONE_SCRAPER_WORKERS = 8
+CYCLONE_SCRAPER_TIMEOUT = (3.05, 15)
+# Crawl engine, "threaded" or "async", and the async engine's per-host
+# connection limit.
+CYCLONE_SCRAPER_ENGINE = "threaded"
+CYCLONE_SCRAPER_HOST_CONNECTIONS = 16
+
+# Redis stream scraped results are queued on until the saver acknowledges
+# them, read in batches with a blocking read; unacknowledged entries are
+# claimed again after CYCLONE_RESULTS_CLAIM_MS. The stream lives in its own
+# Redis db, which unlike db 0 is not flushed on start. Entries delivered
+# CYCLONE_RESULTS_MAX_DELIVERIES times without being saved are moved to the
+# dead letter stream.
+CYCLONE_RESULTS_REDIS_DB = 2
+CYCLONE_RESULTS_STREAM = "cyclones:results"
+CYCLONE_RESULTS_DEAD_STREAM = "cyclones:results:dead"
+CYCLONE_RESULTS_MAX_DELIVERIES = 5
+CYCLONE_RESULTS_GROUP = "cyclone-savers"
+CYCLONE_RESULTS_BATCH = 200
+CYCLONE_RESULTS_BLOCK_MS = 1000
+CYCLONE_RESULTS_CLAIM_MS = 60000
+# Upper bounds of one save_db_task batch, in results and packed bytes.
+CYCLONE_SAVE_BATCH_SIZE = 50
+CYCLONE_SAVE_BATCH_BYTES = 1024 * 1024
+# Cursor pagination of the cyclone list, used once a client asks for a
+# page size or follows a cursor.
+CYCLONE_PAGE_SIZE = 50
+CYCLONE_MAX_PAGE_SIZE = 500
+# Cyclone list responses are cached per data version and query for at
+# most CYCLONE_LIST_CACHE_TIMEOUT seconds. The time delta cutoff moves
+# with the clock, so keys also carry a CYCLONE_LIST_CACHE_BUCKET seconds
+# time bucket.
+CYCLONE_LIST_CACHE_TIMEOUT = 300
+CYCLONE_LIST_CACHE_BUCKET = 60
+# Monthly partitions kept ahead of time once the track tables are
+# partitioned with the partitiontracks command.
+CYCLONE_PARTITION_MONTHS_AHEAD = 3
+# Superseded forecast cycles older than the retention keep only their
+# hour 0 point, pruned in batches of CYCLONE_PRUNE_BATCH_SIZE rows, at most
+# CYCLONE_PRUNE_MAX_BATCHES per run.
+CYCLONE_FORECAST_RETENTION_DAYS = 7
+CYCLONE_PRUNE_BATCH_SIZE = 5000
+CYCLONE_PRUNE_MAX_BATCHES = 20
+# Largest radius of the near cyclones query.
+CYCLONE_GEO_MAX_RADIUS_KM = 5000
+# Rows fetched from the server-side cursor and encoded per chunk of the
+# streaming track export.
+CYCLONE_EXPORT_CHUNK_SIZE = 2000
+# Directory of the Parquet dataset export, disabled when empty. Needs
+# pyarrow, see requirements_export.txt.
+CYCLONE_COLUMNAR_EXPORT_DIR = os.getenv("CYCLONE_COLUMNAR_EXPORT_DIR", "")
+# Rows are exported once ingested for that long, so that transactions
+# still in flight when the watermark moves are not skipped.
+CYCLONE_COLUMNAR_EXPORT_LAG_SECONDS = 300
+CYCLONE_COLUMNAR_EXPORT_CHUNK_SIZE = 50000
+# Redis pub/sub channel of the storm update events.
+CYCLONE_EVENTS_CHANNEL = "cyclones:events"
+# Idle seconds before an event stream keepalive comment.
+CYCLONE_EVENTS_KEEPALIVE_SECONDS = 15
+# Reconnection delay advised to event stream clients.
+CYCLONE_EVENTS_RETRY_MS = 5000
+# Events buffered per client before the oldest are dropped.
+CYCLONE_EVENTS_CLIENT_BACKLOG = 100
+# Threads running the views of the async read path, hence its database
+# connections per ASGI worker.
+CYCLONE_ASYNC_POOL_SIZE = int(os.getenv("CYCLONE_ASYNC_POOL_SIZE", 8))
+
 CELERY_BEAT_SCHEDULE = {
     "CYCLONE_DATA": {
         "task": "backend.cron.cyclone_task.cyclone_scheduler",
@@ -232,4 +324,16 @@ CELERY_BEAT_SCHEDULE = {
         "task": "backend.cron.cyclone_task.cycle_stale_results",
         "schedule": 11,
     },
+    "PRUNE_FORECASTS": {
+        "task": "backend.cron.cyclone_task.prune_superseded_forecasts",
+        "schedule": 60 * 60,
+    },
+    "TRACK_PARTITIONS": {
+        "task": "backend.cron.cyclone_task.ensure_track_partitions",
+        "schedule": 24 * 60 * 60,
+    },
+    "COLUMNAR_EXPORT": {
+        "task": "backend.cron.cyclone_task.export_columnar_dataset",
+        "schedule": 60 * 60,
+    },
 }
@@ -1,7 +1,6 @@
 """Misc utilities module."""
 
 import logging
-import functools
 from django.db.models import Q
 
 
@@ -39,33 +38,3 @@ def filter_existing_queryset(model, model_key_list, key_name):
     query = Q(**{f"{key_name}__in": model_key_list})
     return model.objects.filter(query).distinct()
 
-
-def check_unique_constraint(model):
-    """Check unique constraint in model.
-
-    Args:
-        model(django.db.models.Model): The model to check uniquess for.
-    Returns:
-        bool.
-    """
-    try:
-        model.validate_unique()
-    except Exception:
-        return False
-    return True
-
-
-def get_model_attr_value(m, attr):
-    """Get objects' attributes value."""
-    return functools.reduce(getattr, [m] + attr.split("__"))
-
-
-def filter_non_duplicate_entry(models, *constant_attrs, non_dup):
-    """Filter duplicate entries from given set as a generator."""
-    for m in models:
-        attr_vals = tuple(
-            [get_model_attr_value(m, attr) for attr in constant_attrs]
-        )
-        if attr_vals not in non_dup:
-            non_dup.add(attr_vals)
-            yield m